@@ -1,11 +1,9 @@
-import path from 'path';
-import { fileURLToPath } from 'url';
 import Response from '../utils/response.js';
 import logger from '../utils/logger.js';
-import { spawn } from 'child_process';
+import plannerPool from '../utils/plannerPool.js';
 
 export const plannerController = async(req,res)=>{
-    const {text}= req.body;
+    const {text,session}= req.body;
 
     console.log("Text from the frontend is",text);
 
@@ -21,25 +19,147 @@ export const plannerController = async(req,res)=>{
                 .json(new Response(400,"","Invalid request"));
     }
 
-    const currentFilePath = fileURLToPath(import.meta.url) ;
-    const currentDirectoryPath = path.dirname(currentFilePath);
-    const pythonFilePath = path.resolve(currentDirectoryPath,'..','services','main2.py');
+    if(session!==undefined && typeof(session)!=='string'){
+        logger.error("The session id is not a string");
+        return res.status(400)
+                .json(new Response(400,"","Invalid request"));
+    }
 
-    logger.info("Starting Process .......")
-    
-    const pythonProcess = spawn('python3',[pythonFilePath,text]);
+    logger.info("Dispatching to planner pool .......")
 
-    let result =''
+    try{
+        // With a session the result also lists the missing details the resume route can fill in
+        const result = await plannerPool.dispatch({type:'plan',text,session});
 
-    pythonProcess.stdout.on('data',(data)=>{
-        result += data.toString();
-    })
+        logger.info("Output is fetched successfully");
+        return res.status(200).json(new Response(200,result,"Data fetched successfully"));
+    }catch(err){
+        logger.error(`Planner failed: ${err.message}`);
+        return res.status(500).json(new Response(500,"","Failed to generate plan"));
+    }
+}
 
-    pythonProcess.on("close",()=>{
+// Answers the missing details of a session started with a plan request and continues its run;
+// agents that already finished are not run again
+export const plannerResumeController = async(req,res)=>{
+    const {session,answers}= req.body;
 
-        
-        logger.info("Output is fetched successfully");
-        logger.info("Process Ended .....")
+    if(!session || typeof(session)!=='string' || !answers || typeof(answers)!=='object' || Array.isArray(answers)){
+        logger.error("Session or answers for the resumed plan are missing");
+        return res.status(400)
+                .json(new Response(400,"","Invalid request"));
+    }
+
+    logger.info(`Resuming planner session ${session} .......`)
+
+    try{
+        const result = await plannerPool.dispatch({type:'resume',session,answers});
+        return res.status(200).json(new Response(200,result,"Data fetched successfully"));
+    }catch(err){
+        logger.error(`Resuming planner session failed: ${err.message}`);
+        if(err.message.includes('nothing to resume')){
+            return res.status(404).json(new Response(404,"","Unknown or finished session"));
+        }
+        return res.status(500).json(new Response(500,"","Failed to generate plan"));
+    }
+}
+
+// Plans a session again with changed trip details; node_report in the result tells which
+// agents were reused because their inputs did not change
+export const plannerReplanController = async(req,res)=>{
+    const {session,changes}= req.body;
+
+    if(!session || typeof(session)!=='string' || !changes || typeof(changes)!=='object' || Array.isArray(changes)){
+        logger.error("Session or changes for the re-plan are missing");
+        return res.status(400)
+                .json(new Response(400,"","Invalid request"));
+    }
+
+    logger.info(`Re-planning planner session ${session} .......`)
+
+    try{
+        const result = await plannerPool.dispatch({type:'replan',session,changes});
         return res.status(200).json(new Response(200,result,"Data fetched successfully"));
-    })
-}
\ No newline at end of file
+    }catch(err){
+        logger.error(`Re-planning planner session failed: ${err.message}`);
+        if(err.message.includes('no trip to re-plan')){
+            return res.status(404).json(new Response(404,"","Unknown session"));
+        }
+        return res.status(500).json(new Response(500,"","Failed to generate plan"));
+    }
+}
+
+// Same plan, delivered as Server-Sent Events: a "step" event per finished agent,
+// "token" events for the final summary, then "done" (or "failed").
+export const plannerStreamController = async(req,res)=>{
+    const {text,session}= req.query;
+
+    if(!text || typeof(text)!=='string'){
+        logger.error("Text for the streaming planner is missing");
+        return res.status(400)
+                .json(new Response(400,"","Invalid request"));
+    }
+
+    res.set({
+        'Content-Type':'text/event-stream',
+        'Cache-Control':'no-cache',
+        'Connection':'keep-alive',
+        'X-Accel-Buffering':'no'
+    });
+    res.flushHeaders();
+
+    let open = true;
+    const sendEvent = (event,data)=>{
+        if(open){
+            res.write(`event: ${event}\ndata: ${JSON.stringify(data)}\n\n`);
+        }
+    };
+    // Comment lines keep proxies from closing an idle connection while agents work
+    const heartbeat = setInterval(()=>{
+        if(open){
+            res.write(': keep-alive\n\n');
+        }
+    },15000);
+    // A client that went away cancels the plan, so its worker is freed for the next request
+    const cancel = new AbortController();
+    req.on('close',()=>{
+        open = false;
+        clearInterval(heartbeat);
+        cancel.abort();
+    });
+
+    logger.info("Dispatching streaming plan to planner pool .......")
+
+    try{
+        const result = await plannerPool.dispatch({type:'plan',text,stream:true,
+            session:typeof(session)==='string' ? session : undefined},{
+            onEvent:(event)=>sendEvent(event.type,event),
+            signal:cancel.signal
+        });
+        logger.info("Streaming plan finished");
+        sendEvent('done',{result});
+    }catch(err){
+        if(!open){
+            logger.info("Streaming plan cancelled, the client disconnected");
+            return;
+        }
+        logger.error(`Streaming planner failed: ${err.message}`);
+        sendEvent('failed',{message:"Failed to generate plan"});
+    }finally{
+        clearInterval(heartbeat);
+        if(open){
+            res.end();
+        }
+    }
+}
+
+// Latency histograms and token counters of all planner workers, in the Prometheus text format
+export const metricsController = async(req,res)=>{
+    try{
+        const metrics = await plannerPool.collectMetrics();
+        return res.status(200).type('text/plain; version=0.0.4').send(metrics);
+    }catch(err){
+        logger.error(`Collecting planner metrics failed: ${err.message}`);
+        return res.status(500).json(new Response(500,"","Failed to collect metrics"));
+    }
+}
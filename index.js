@@ -1,8 +1,12 @@
 import app from './api/app.js'
 import logger from './utils/logger.js'
+import plannerPool from './utils/plannerPool.js'
 
 const port = process.env.PORT || 8081
 
+// Pre-fork the planner workers so the first request doesn't pay for Python imports
+plannerPool.start()
+
 app.listen(port , ()=>{
     logger.info(`Server is running on port: ${port}`)
-})
\ No newline at end of file
+})
@@ -1,8 +1,12 @@
 import express from 'express';
-import {plannerController} from '../controllers/planner.controller.js'
+import {metricsController, plannerController, plannerReplanController, plannerResumeController, plannerStreamController} from '../controllers/planner.controller.js'
 
 const router = express.Router();
 
 router.post('/generate-plan',plannerController);
+router.post('/generate-plan/resume',plannerResumeController);
+router.post('/generate-plan/replan',plannerReplanController);
+router.get('/generate-plan/stream',plannerStreamController);
+router.get('/metrics',metricsController);
 
 export default router;
\ No newline at end of file
@@ -1,34 +1,112 @@
-from typing import Dict
+import settings
+from typing import Dict, Annotated
 from typing_extensions import Literal
-from langchain_core.prompts import ChatPromptTemplate
-from langgraph.graph import StateGraph, END, MessagesState
-from langchain.chat_models import init_chat_model
+from langgraph.graph import StateGraph, START, END, MessagesState
+from langgraph.config import get_config, get_stream_writer
 from langchain_core.messages import HumanMessage, AIMessage
-from langchain_google_genai import ChatGoogleGenerativeAI
-from dateutil.parser import parse
 from tools import (
     get_flights_data,
+    get_flight_calendar,
     get_hotels_data,
+    prefetch_hotels,
+    take_hotel_prefetch,
+    discard_hotel_prefetch,
     get_city_coordinates,
     get_restaurants_data
 )
-import os, json, re
+from trip_params import TripParams
+from records import FlightOffer, HotelOffer, format_price, load_calendar, load_offers, render_flights, render_hotels, to_rows
+from query_parser import parse_query, is_confident, record_fast_path
+from gazetteer import find_city, normalize
+from cache import CACHE_DIR, make_cache
+from climate import climate_report, trip_months
+from token_budget import ACTIVITY_PROMPT_BUDGET, FINAL_PROMPT_BUDGET, compact_slots, record_usage
+from tracing import span, traced_node
+import os, json, re, hashlib
+from functools import lru_cache
+from threading import Lock
 from datetime import datetime
 CURRENT_YEAR = datetime.today().year
 
-from dotenv import load_dotenv
-load_dotenv()
-os.environ["GROQ_API_KEY"] = os.getenv("GROQ_API_KEY")
-os.environ["GOOGLE_API_KEY"] = os.getenv("GOOGLE_API_KEY")
+# Models are built on first use: their SDK imports dominate cold start, and requests
+# that stop early (e.g. on missing trip details) never touch them.
+@lru_cache(maxsize=1)
+def get_llm():
+    """Groq model used for extraction, weather and activities."""
+    from langchain.chat_models import init_chat_model
+    return init_chat_model("groq:llama-3.1-8b-instant")
 
-llm = init_chat_model("groq:llama-3.1-8b-instant")
-llm2 = ChatGoogleGenerativeAI(model="gemini-2.5-flash")
+@lru_cache(maxsize=1)
+def get_llm2():
+    """Gemini model used for LLM routing and the final plan."""
+    from langchain_google_genai import ChatGoogleGenerativeAI
+    return ChatGoogleGenerativeAI(model="gemini-2.5-flash")
+
+# Weather for "Paris in October" is the same for everyone: summaries are cached per
+# (destination, travel month, trip length bucket) instead of per query
+weather_cache = make_cache(
+    "weather_summaries",
+    ttl=float(os.getenv("PLANNER_WEATHER_CACHE_TTL", str(30 * 24 * 3600))),
+    maxsize=int(os.getenv("PLANNER_WEATHER_CACHE_SIZE", "5000")),
+)
+WEATHER_LENGTH_BUCKETS = [(3, "weekend"), (8, "one_week"), (15, "two_week")]
+# "climate" answers from the bundled monthly normals (LLM only for unknown places), "llm" always asks the model
+WEATHER_MODE = os.getenv("PLANNER_WEATHER_MODE", "climate").lower()
+
+# Start the hotel search as soon as ExtractAgent knows the city code and dates
+HOTEL_PREFETCH = os.getenv("PLANNER_HOTEL_PREFETCH", "1") == "1"
+
+# "parallel" fans Flight/Hotel/Weather/Restaurant out at once, "sequential" keeps the TripAgent loop
+GRAPH_MODE = os.getenv("PLANNER_GRAPH_MODE", "parallel").lower()
+FAN_OUT_AGENTS = ["FlightAgent", "HotelAgent", "WeatherAgent", "RestaurantAgent"]
+# "rules" routes TripAgent from ROUTING_TABLE, "llm" asks Gemini on every hop (the old behaviour)
+ROUTER_MODE = os.getenv("PLANNER_ROUTER_MODE", "rules").lower()
+
+# Sessions: "memory" keeps checkpoints in this process, "sqlite" shares them between worker processes
+CHECKPOINTER = os.getenv("PLANNER_CHECKPOINTER", "memory").lower()
+CHECKPOINT_PATH = os.getenv("PLANNER_CHECKPOINT_PATH", os.path.join(CACHE_DIR, "checkpoints.sqlite"))
+# Sessions kept in the checkpoint store (shared by every worker with sqlite); the least recently written go first
+SESSION_LIMIT = int(os.getenv("PLANNER_SESSION_LIMIT", "1000"))
+
+# Re-plans reuse an agent's output while its inputs are unchanged (see NODE_INPUTS)
+NODE_MEMO = os.getenv("PLANNER_NODE_MEMO", "1") == "1"
+node_memo = make_cache(
+    "node_outputs",
+    ttl=float(os.getenv("PLANNER_NODE_MEMO_TTL", "900")),
+    maxsize=int(os.getenv("PLANNER_NODE_MEMO_SIZE", "5000")),
+)
+
+# Routing order: agent -> (state slot it fills, slots it needs first, hand-off message)
+ROUTING_TABLE = {
+    "FlightAgent": ("flight_data", [], "Let's book your flight. Assigning to Flight Agent🛫"),
+    "HotelAgent": ("hotel_data", [], "We'll look for hotels. Assigning to Hotel Agent🏨"),
+    "WeatherAgent": ("weather_data", [], "Let me check the weather for your destination. Assigning to Weather Agent🌤"),
+    "RestaurantAgent": ("restaurant_data", [], "Let me find some restaurants you'll love. Assigning to Restaurant Agent🍽️"),
+    "ActivityAgent": ("activities_data", ["flight_data", "hotel_data", "weather_data", "restaurant_data"],
+                      "Final step - let's plan your activities! Assigning to Activities Agent🎡"),
+}
+
+def merge_unique(current: list, update: list) -> list:
+    """Reducer for list slots that parallel branches may write in the same step; None clears the slot."""
+    if update is None:
+        return []
+    current = current or []
+    return current + [item for item in (update or []) if item not in current]
+
+def merge_dict(current: dict, update: dict) -> dict:
+    """Reducer for dict slots that parallel branches may write in the same step; None clears the slot."""
+    if update is None:
+        return {}
+    return {**(current or {}), **(update or {})}
 
 class State(MessagesState):
     """State for the multi-agent system."""
     next_agent: str = ""
     flight_data: str = ""
     hotel_data: str = ""
+    flight_offers: list = []      # FlightOffer records, cheapest first
+    fare_calendar: dict = {}      # departure day -> cheapest FlightOffer or None
+    hotel_offers: list = []       # HotelOffer records, cheapest first
     weather_data: str = ""
     restaurant_data: str = ""
     activities_data: str = ""
@@ -36,11 +114,19 @@ class State(MessagesState):
     task_complete: bool = False
     current_task: str = ""
     user_query: str = ""
-    missing_info: list = []
-    extracted_info: dict = {}
+    trip_params: TripParams = None
+    planned_query: str = ""       # user_query and trip_params as first planned; re-plans note changes against them
+    planned_params: TripParams = None
+    hotel_prefetch: str = ""
+    missing_info: Annotated[list, merge_unique] = []
+    extracted_info: Annotated[dict, merge_dict] = {}
+    halted: Annotated[list, merge_unique] = []
+    node_report: Annotated[dict, merge_dict] = {}
     
+@lru_cache(maxsize=1)
 def create_TripAgent_Chain():
-    """Creates the TripAgent Decision chain."""
+    """Creates the TripAgent Decision chain (built once and reused)."""
+    from langchain_core.prompts import ChatPromptTemplate
     TripAgent_prompt = ChatPromptTemplate.from_messages([
         ("system", """You are a Trip Agent that manages a team of agents to plan a trip:
         1. Flight Agent: Gather information on flights.
@@ -64,18 +150,114 @@ def create_TripAgent_Chain():
          """),
         ("human", "{task}"),
     ])
-    return TripAgent_prompt | llm2
+    return TripAgent_prompt | get_llm2()
     
 
-def TripAgent(State)-> Dict:
-    """TripAgent decides next agent"""
-    
+def parse_json_reply(content: str) -> dict:
+    """Pulls the JSON object out of an LLM reply."""
+    match = re.search(r"\{[\s\S]*\}", content.strip())
+    if not match:
+        raise ValueError("No JSON found in LLM response")
+    return json.loads(match.group(0))
 
-    
+def ExtractAgent(State) -> Dict:
+    """Extracts the trip parameters once, up front, for every downstream agent."""
     messages = State["messages"]
     task = messages[-1].content if messages else "No Task"
-    query = State.get("user_query", messages[-1].content if messages else "No Task")
-    
+    query = State.get("user_query") or task
+
+    # Common phrasings are parsed deterministically; the LLM is only the fallback
+    parsed = parse_query(query)
+    record_fast_path(is_confident(parsed))
+    if is_confident(parsed):
+        return trip_params_update(parsed.params, task, query)
+
+    prompt = f"""
+        You are a travel planning assistant. Extract the key trip parameters from the user's travel plan.
+
+        **Travel Plan:** {query}
+
+        **Extract the following fields:**
+        - **origin_city**: The city the user departs from (e.g., "Mumbai").
+        - **origin_iata**: The 3-letter IATA code of the departure airport (e.g., "BOM", "JFK").
+        - **destination_city**: The city the user is travelling to (e.g., "Paris").
+        - **destination_iata**: The 3-letter IATA code of the arrival airport (e.g., "CDG", "NRT").
+        - **destination_city_code**: The 3-letter IATA code of the *city* used for hotel searches (e.g., "PAR" for Paris, "TYO" for Tokyo), not an airport code.
+        - **travel_date**: The departure date in 'YYYY-MM-DD' format.
+        - **checkin_date**: The hotel check-in date in 'YYYY-MM-DD' format (usually the travel date).
+        - **checkout_date**: The hotel check-out date in 'YYYY-MM-DD' format.
+        - **adults**: The number of adult travellers.
+        - **duration_days**: The length of the trip in days.
+        - **flex_days**: How many days either way the departure may move (e.g., "±2 days" → 2, "my dates are flexible" → 3).
+
+        **Rules:**
+        - Use the current year ({CURRENT_YEAR}) if the year is not specified.
+        - If the check-out date is not given but a duration is (e.g., "for 5 days", "for a week"), add the duration to the check-in date.
+        - If neither the check-out date nor the duration is given, leave "checkout_date" and "duration_days" as `null`. Do NOT guess.
+        - If the number of adults is not specified, use 1.
+        - If the user does not mention flexible dates, use 0 for "flex_days".
+        - If a piece of information is not found, its value must be `null`.
+
+        **Example of Expected JSON Output:**
+        ```json
+        {{
+        "origin_city": "Mumbai",
+        "origin_iata": "BOM",
+        "destination_city": "Paris",
+        "destination_iata": "CDG",
+        "destination_city_code": "PAR",
+        "travel_date": "2025-10-10",
+        "checkin_date": "2025-10-10",
+        "checkout_date": "2025-10-31",
+        "adults": 1,
+        "duration_days": 21,
+        "flex_days": 0
+        }}
+        **Strictly** return only the JSON do not include any other text or explanation."""
+
+    try:
+        params = TripParams.from_dict(parse_json_reply(_invoke_llm("ExtractAgent", get_llm(), prompt)))
+    except Exception as e:
+        return {
+            "messages": [AIMessage(content="⚠️ Could not extract your trip details. Please try again.")],
+            "next_agent": "end",
+            "current_task": task,
+            "user_query": query,
+        }
+    return trip_params_update(params, task, query)
+
+def trip_params_update(params: TripParams, task: str, query: str, session: str = None) -> Dict:
+    """State update published by ExtractAgent once the parameters are known (for session, if given)."""
+    route = " → ".join(filter(None, [params.origin_city or params.origin_iata,
+                                      params.destination_city or params.destination_iata]))
+    update = {
+        "messages": [AIMessage(content=f"Trip Agent: Planning your trip {route}".rstrip())],
+        "trip_params": params,
+        "next_agent": "TripAgent",
+        "current_task": task,
+        "user_query": query,
+    }
+    if (HOTEL_PREFETCH and params.destination_city_code and params.checkin_date and params.checkout_date
+            and not memo_has("HotelAgent", {"trip_params": params},
+                             current_session() if session is None else session)):
+        # Speculative: HotelAgent uses it if the parameters still match when it runs
+        update["hotel_prefetch"] = prefetch_hotels(params.destination_city_code, params.checkin_date,
+                                                   params.checkout_date, params.adults)
+    return update
+
+def plan_next_agent(State) -> str:
+    """Rule-based routing: the first agent whose slot is empty and whose inputs are ready."""
+    if State.get("final_data", ""):
+        return "end"
+    for agent, (slot, needs, _) in ROUTING_TABLE.items():
+        if State.get(slot, ""):
+            continue
+        if all(State.get(need, "") for need in needs):
+            return agent
+    return "end"
+
+def llm_next_agent(State, task: str):
+    """LLM routing (opt-in): Gemini suggests the next agent, the filled slots keep it honest."""
     # Check if tasks are already completed
     has_flight = bool(State.get("flight_data",""))
     has_hotel = bool(State.get("hotel_data",""))
@@ -86,19 +268,48 @@ def TripAgent(State)-> Dict:
     
     # LLM decision based on current task & filled slots
     chain = create_TripAgent_Chain()
-    decision = chain.invoke({
-        "task": task,
-        "has_flight": has_flight,
-        "has_hotel": has_hotel,
-        "has_weather": has_weather, 
-        "has_restaurant": has_restaurant,
-        "has_activities": has_activities,
-        "has_final_data": has_final_data,
-    })
+    with span("llm", "TripAgent", model=model_name(get_llm2())) as call:
+        decision = chain.invoke({
+            "task": task,
+            "has_flight": has_flight,
+            "has_hotel": has_hotel,
+            "has_weather": has_weather, 
+            "has_restaurant": has_restaurant,
+            "has_activities": has_activities,
+            "has_final_data": has_final_data,
+        })
+        usage = getattr(decision, "usage_metadata", None) or {}
+        call.set(prompt_tokens=usage.get("input_tokens"), completion_tokens=usage.get("output_tokens"))
     
     decision_next = decision.content.strip().lower()
     #print(f"TripAgent Decision: {decision_next}")
     
+    # Check if all tasks are complete first
+    all_tasks_complete = has_flight and has_hotel and has_weather and has_restaurant and has_activities
+    
+    # Routing decision
+    if "done" in decision_next or has_final_data or all_tasks_complete:
+        return "end", "All tasks are complete! Finalizing your trip. ✈️🏨☀️"
+    elif ("flight" in decision_next and not has_flight) or (not has_flight and not any([has_hotel, has_weather, has_restaurant, has_activities])):
+        return "FlightAgent", ROUTING_TABLE["FlightAgent"][2]
+    elif ("hotel" in decision_next and not has_hotel) or (has_flight and not has_hotel):
+        return "HotelAgent", ROUTING_TABLE["HotelAgent"][2]
+    elif ("weather" in decision_next and not has_weather) or (has_flight and has_hotel and not has_weather):
+        return "WeatherAgent", ROUTING_TABLE["WeatherAgent"][2]
+    elif ("restaurant" in decision_next and not has_restaurant) or (has_flight and has_hotel and has_weather and not has_restaurant):
+        return "RestaurantAgent", ROUTING_TABLE["RestaurantAgent"][2]
+    elif ("activity" in decision_next or "activities" in decision_next) and not has_activities:
+        return "ActivityAgent", "Let's explore activities you can do! Assigning to Activities Agent🎡"
+    elif not has_activities and has_flight and has_hotel and has_weather and has_restaurant:
+        return "ActivityAgent", ROUTING_TABLE["ActivityAgent"][2]
+    return "end", "✅ Trip Agent: All tasks complete, ending workflow."
+
+def TripAgent(State)-> Dict:
+    """TripAgent decides next agent"""
+    messages = State["messages"]
+    task = messages[-1].content if messages else "No Task"
+    query = State.get("user_query", messages[-1].content if messages else "No Task")
+    
     # Check if we have missing information from previous agents
     missing_info = State.get("missing_info")
     if missing_info:
@@ -114,36 +325,14 @@ def TripAgent(State)-> Dict:
             "extracted_info": State.get("extracted_info", {})
         }
     
-    # Check if all tasks are complete first
-    all_tasks_complete = has_flight and has_hotel and has_weather and has_restaurant and has_activities
-    
-    # Routing decision
-    if "done" in decision_next or has_final_data or all_tasks_complete:
-        next_agent = "end"
-        TripAgent_message = "All tasks are complete! Finalizing your trip. ✈️🏨☀️"
-    elif ("flight" in decision_next and not has_flight) or (not has_flight and not any([has_hotel, has_weather, has_restaurant, has_activities])):
-        next_agent = "FlightAgent"  
-        TripAgent_message = "Let's book your flight. Assigning to Flight Agent🛫"
-    elif ("hotel" in decision_next and not has_hotel) or (has_flight and not has_hotel):
-        next_agent = "HotelAgent"  
-        TripAgent_message = "We'll look for hotels. Assigning to Hotel Agent🏨"
-    elif ("weather" in decision_next and not has_weather) or (has_flight and has_hotel and not has_weather):
-        next_agent = "WeatherAgent"  
-        TripAgent_message = "Let me check the weather for your destination. Assigning to Weather Agent🌤"
-    elif ("restaurant" in decision_next and not has_restaurant) or (has_flight and has_hotel and has_weather and not has_restaurant):
-        next_agent = "RestaurantAgent"  
-        TripAgent_message = "Let me find some restaurants you'll love. Assigning to Restaurant Agent🍽️"
-    elif ("activity" in decision_next or "activities" in decision_next) and not has_activities:
-        next_agent = "ActivityAgent"  
-        TripAgent_message = "Let's explore activities you can do! Assigning to Activities Agent🎡"
-    elif not has_activities and has_flight and has_hotel and has_weather and has_restaurant:
-        next_agent = "ActivityAgent"  
-        TripAgent_message = "Final step - let's plan your activities! Assigning to Activities Agent🎡"
+    if ROUTER_MODE == "llm":
+        next_agent, TripAgent_message = llm_next_agent(State, task)
     else:
-        next_agent = "end"
-        TripAgent_message = "✅ Trip Agent: All tasks complete, ending workflow."
-    
-
+        next_agent = plan_next_agent(State)
+        if next_agent == "end":
+            TripAgent_message = "✅ Trip Agent: All tasks complete, ending workflow."
+        else:
+            TripAgent_message = ROUTING_TABLE[next_agent][2]
         
     return {
         "messages": [AIMessage(content=TripAgent_message)],
@@ -154,63 +343,10 @@ def TripAgent(State)-> Dict:
 
 def FlightAgent(State):
     """Agent responsible for booking flights."""
-    flight_data = State.get("flight_data", "")
-    task = State.get("user_query", "")
-    # print("*TASK*\n",task)
-    prompt = f"""
-        You are an intelligent flight booking assistant, designed to extract crucial flight details from user travel plans. Your goal is to accurately identify the departure city, arrival city, and travel date.
-
-        Here's the user's **Travel Plan**:
-        {task}
-
-        Here's any **Previous Known Data** that might be relevant:
-        {flight_data}
-        Use the current year ({CURRENT_YEAR}) if the Year is not specified.
-
-        **Your task is to extract the following information, if available:**
-        - **departure_city_code**: The IATA code for the departure city (e.g., "JFK", "LAX").
-        - **arrival_city_code**: The IATA code for the arrival city (e.g., "LHR", "NRT").
-        - **travel_date**: The specific date of travel in 'YYYY-MM-DD' format (e.g., "2025-08-15").
-
-        **Important:**
-        - **Respond ONLY with a valid JSON object.**
-        - **Do NOT include any additional text, explanations, or conversational filler.**
-        - **If a piece of information is not found, its corresponding value in the JSON should be `null`.**
-
-        **Example of Expected JSON Output:**
-        ```json
-        {{
-        "departure_city_code": "NYC",
-        "arrival_city_code": "SFO",
-        "travel_date": "2025-08-15"
-        }}
-        **Strictly** return only the JSON do not include any other text or explanation."""
-
-    try:
-        parsed = llm.invoke([HumanMessage(content=prompt)])
-        match = re.search(r"\{[\s\S]*\}", parsed.content.strip())
-        if not match:
-            raise ValueError("No JSON found in LLM response")
-        extracted = json.loads(match.group(0))
-        #extracted = json.loads(parsed.content)  
-        departure = (extracted.get("departure_city_code") or "").strip()
-        arrival = (extracted.get("arrival_city_code") or "").strip()
-        date = extracted.get("travel_date") or ""
-        
-        # Handle null/empty date
-        if date and date.lower() != "null":
-            try:
-                date = parse(date, fuzzy=True).strftime("%Y-%m-%d")
-            except Exception:
-                date = ""
-        else:
-            date = ""
-    except Exception as e:
-
-        return {
-            "messages": [AIMessage(content="⚠️ Could not extract flight info. Please try again.")],
-            "next_agent": "end"
-        }
+    params = State.get("trip_params") or TripParams()
+    departure = params.origin_iata
+    arrival = params.destination_iata
+    date = params.travel_date
 
     missing = []
     if not departure:
@@ -234,12 +370,14 @@ def FlightAgent(State):
             }
         }
     #print(f"Flight Agent: Extracted - Departure: {departure}, Arrival: {arrival}, Date: {date}")
-    api_results = get_flights_data(departure, arrival, date)
+    # The calendar searches the exact date too, so the lookup below is a cache hit
+    calendar = get_flight_calendar(departure, arrival, date, params.flex_days, adults=params.adults) if params.flex_days else {}
+    api_results = get_flights_data(departure, arrival, date, adults=params.adults)
 
     # Check if API returned an error
-    if api_results and 'error' in api_results[0]:
+    if api_results and isinstance(api_results[0], dict):
         return {
-            "messages": [AIMessage(content=f"⚠️ Flight search error: {api_results[0]['error']}")],
+            "messages": [AIMessage(content=f"⚠️ Flight search error: {api_results[0].get('error')}")],
             "next_agent": "end"
         }
 
@@ -250,106 +388,23 @@ def FlightAgent(State):
             "next_agent": "end"
         }
 
-    # format_prompt = f"""
-    # You're a helpful agent. Format this flight API result into 2-3 line summary for user:\n{api_results}
-    # """
-    # formatted = llm.invoke([HumanMessage(content=format_prompt)])
-    summary = "\n\n".join(
-    [
-        f"✈️ Price: {r['price']}\n"
-        f"🕒 Total Duration: {r['duration']}\n"
-        f"🛬 Flight Segments:\n" +
-        "\n".join(
-            [
-                f"  • {seg['from']} → {seg['to']} | Airline: {seg['airline']} {seg['flightNumber']} | "
-                f"Departs: {datetime.fromisoformat(seg['departureTime']).strftime('%b %d, %I:%M %p')} | "
-                f"Arrives: {datetime.fromisoformat(seg['arrivalTime']).strftime('%b %d, %I:%M %p')}"
-                for seg in r['segments']
-            ]
-        )
-        for r in api_results if 'price' in r and 'duration' in r and 'segments' in r
-    ]
-    )   
-
+    # The offers stay records in the state; slot_text renders them where they are shown
     return {
         "messages": [AIMessage(content="Flight Agent: Here are your flight options:")],
-        "flight_data": summary,
+        "flight_data": f"{len(api_results)} flight offers from {format_price(api_results[0].price, api_results[0].currency)}",
+        "flight_offers": api_results,
+        "fare_calendar": calendar if calendar and 'error' not in calendar else {},
         "next_agent": "TripAgent"
     }
 
 def HotelAgent(State):
     """Agent responsible for booking hotels."""
-    hotel_data = State.get("hotel_data", "")
-    task = State.get("user_query", "")
-    # print("*TASK*\n",task)
-    prompt = f"""
-        You are an intelligent Hotel Booking Agent, specializing in extracting crucial details for hotel reservations using the Amadeus API.
-
-        **Your primary task is to extract the following information from the user's travel plan:**
-
-        * **destination_city_code (IATA):** The 3-letter IATA code for the *city center or general city area* where the hotel is desired (e.g., "TYO" for Tokyo, "PAR" for Paris, not airport codes like "NRT" or "CDG" unless explicitly requested by the user for airport hotels).
-        * **Check-in Date:** The desired check-in date in 'YYYY-MM-DD' format.
-        * **Check-out Date:** The desired check-out date in 'YYYY-MM-DD' format.
-        * **Number of Adults:** The number of adult guests.
-
-        **Here's the current context:**
-
-        * **User Travel Plan (Task):** {task}
-        * **Previous Known Hotel Data:** {hotel_data}
-
-        **Key Extraction Rules and Logic:**
-
-        1.  **Destination City Code:** Extract the IATA city code for the hotel destination.
-        2.  **Year Handling:** If a year is not explicitly mentioned for the check-in or check-out date, **always assume the current year is {CURRENT_YEAR}**. 
-        3.  **Check-out Date Calculation:**
-            * If the check-out date is **NOT** explicitly provided, but a **duration of stay** (e.g., "for 5 days", "for a week") is mentioned, calculate the check-out date by adding the duration to the check-in date.
-            * If neither the check-out date nor the duration is specified, you **MUST leave "checkout_date" as `null`**. Do NOT guess or default to a single night unless explicitly told to.
-        4.  **Number of Adults:**
-            * Extract the specified number of adults.
-            * If the number of adults is **NOT** specified in the `task`, **default to `1` adult**.
+    params = State.get("trip_params") or TripParams()
+    city_code = params.destination_city_code
+    checkin_date = params.checkin_date
+    checkout_date = params.checkout_date
+    adults = params.adults
 
-        **Example of Expected JSON Output:**
-        ```json
-        {{
-        "city_code": "CDG",
-        "checkin_date": "2025-12-19",
-        "checkout_date": "2026-01-08",
-        "adults": 1
-        }}
-        **Strictly** return only the JSON do not include any other text or explanation."""
-    try:
-        parsed = llm.invoke([HumanMessage(content=prompt)])
-        match = re.search(r"\{[\s\S]*\}", parsed.content.strip())
-        if not match:
-            raise ValueError("No JSON found in LLM response")
-        extracted = json.loads(match.group(0))
-        #extracted = json.loads(parsed.content)  
-        city_code = extracted.get("city_code", "").strip()
-        checkin_date = extracted.get("checkin_date", "")
-        checkout_date = extracted.get("checkout_date", "")
-        adults = extracted.get("adults", 1)
-        
-        # Handle null/empty dates
-        if checkin_date and checkin_date.lower() != "null":
-            try:
-                checkin_date = parse(checkin_date, fuzzy=True).strftime("%Y-%m-%d")
-            except Exception:
-                checkin_date = ""
-        else:
-            checkin_date = ""
-            
-        if checkout_date and checkout_date.lower() != "null":
-            try:
-                checkout_date = parse(checkout_date, fuzzy=True).strftime("%Y-%m-%d")
-            except Exception:
-                checkout_date = ""
-        else:
-            checkout_date = ""
-    except Exception as e:
-        return {
-            "messages": [AIMessage(content="⚠️ Could not extract hotel info. Please try again.")],
-            "next_agent": "end"
-        }
     missing = []
     if not city_code:
         missing.append("City code ")
@@ -359,6 +414,7 @@ def HotelAgent(State):
         missing.append("Checkout date")
 
     if missing:
+        discard_hotel_prefetch(State.get("hotel_prefetch", ""))
         msg = f"🏨 I need more information to help you with your hotel booking. Please provide: {', '.join(missing)}"
         return {
             "messages": [AIMessage(content=msg)],
@@ -372,10 +428,13 @@ def HotelAgent(State):
             }
         }
     #print(f"Hotel Agent: Extracted - City: {city_code}, Checkin: {checkin_date}, Checkout: {checkout_date}, Adults: {adults}")
-    api_results = get_hotels_data(city_code, checkin_date,checkout_date, adults)
+    api_results = take_hotel_prefetch(State.get("hotel_prefetch", ""), city_code, checkin_date, checkout_date, adults)
+    if api_results is None:
+        api_results = get_hotels_data(city_code, checkin_date,checkout_date, adults)
     
-    # Check if API returned an error or no results
-    if not api_results or (isinstance(api_results, list) and len(api_results) == 1 and 'error' in api_results[0]):
+    # Check if API returned an error or no results (failures come back as a single dict, offers as records)
+    failure = api_results[0] if api_results and isinstance(api_results[0], dict) else None
+    if not api_results or (failure is not None and 'error' in failure):
         return {
             "messages": [AIMessage(content="⚠️ Hotel search encountered an issue. Continuing with trip planning...")],
             "hotel_data": "Hotel search completed (API issue encountered)",
@@ -383,66 +442,105 @@ def HotelAgent(State):
         }
     
     # Check for message responses (no hotels found)
-    if isinstance(api_results, list) and len(api_results) == 1 and 'message' in api_results[0]:
+    if failure is not None and 'message' in failure:
         return {
-            "messages": [AIMessage(content=f"🏨 {api_results[0]['message']}")],
+            "messages": [AIMessage(content=f"🏨 {failure['message']}")],
             "hotel_data": "Hotel search completed (no hotels found)",
             "next_agent": "TripAgent"
         }
     
-    # Format successful results
-    summary = "\n".join(
-        [
-            f"🏨 {r['hotel']['name']} - {r['offers'][0]['price']['total']} {r['offers'][0]['price']['currency']}"
-            for r in api_results if 'hotel' in r and 'offers' in r and r['offers']
-        ]
-    )
-    
-    # Ensure hotel_data is set even if no formatted results
-    if not summary:
-        summary = "Hotel search completed (no available offers)"
+    offers = [offer for offer in api_results if isinstance(offer, HotelOffer)]
+    # Ensure hotel_data is set even if no offers came back
+    if not offers:
+        return {"messages": [AIMessage(content="Hotel Agent: Hotel Information:")],
+                "hotel_data": "Hotel search completed (no available offers)",
+                "next_agent": "TripAgent"}
     
     return {"messages": [AIMessage(content="Hotel Agent: Hotel Information:")],
-            "hotel_data": summary,
+            "hotel_data": f"{len(offers)} hotel offers from {format_price(offers[0].price, offers[0].currency)}",
+            "hotel_offers": offers,
             "next_agent": "TripAgent"}
 
-def WeatherAgent(State):
-    """Agent responsible for checking the weather."""
-    task = State.get("user_query", "")
-    # print("*TASK*\n",task)
-    weather_prompt = f"""You are a Weather Agent. 
+def trip_length_bucket(days: int) -> str:
+    """Coarse trip length used in the weather cache key; the outlook barely changes within a bucket."""
+    if not days:
+        return "unknown"
+    for limit, bucket in WEATHER_LENGTH_BUCKETS:
+        if days <= limit:
+            return bucket
+    return "extended"
+
+def weather_cache_key(params: TripParams):
+    """(destination, month, length bucket), or None when the destination or month is unknown."""
+    destination = normalize(params.destination_city) or params.destination_iata
+    if not destination or not params.travel_date:
+        return None
+    month = datetime.strptime(params.travel_date, "%Y-%m-%d").month
+    return destination, month, trip_length_bucket(params.duration_days)
+
+def climate_weather(params: TripParams):
+    """Weather from the bundled climate normals, or None when the place or dates aren't covered."""
+    if WEATHER_MODE != "climate" or not params.destination_city or not params.travel_date:
+        return None
+    return climate_report(params.destination_city, params.checkin_date or params.travel_date,
+                          params.checkout_date, params.duration_days)
+
+def llm_weather(task: str, params: TripParams):
+    """Weather summary from the LLM, shared across queries through weather_cache when possible."""
+    cache_key = weather_cache_key(params)
+    if cache_key is None:
+        # Not enough structure to share the answer; let the LLM read the whole query
+        weather_prompt = f"""You are a Weather Agent. 
     Your task is to gather information and provide weather updates based on the following data:
     Extract the desitation from the task and forecast the weather for the whole trip.
     task: {task}
     return the response in a concise and readable format."""
-    report_response = llm.invoke([HumanMessage(content=weather_prompt)])
-    response = report_response.content
+        return _invoke_llm("WeatherAgent", get_llm(), weather_prompt)
+
+    response = weather_cache.get(cache_key)
+    if response is None:
+        destination = params.destination_city or params.destination_iata
+        month_name = datetime(2000, cache_key[1], 1).strftime("%B")
+        length = "" if cache_key[2] == "unknown" else f" for a {cache_key[2].replace('_', ' ')} trip"
+        weather_prompt = f"""You are a Weather Agent.
+    Describe the typical weather in {destination} during {month_name}{length}:
+    expected temperature range, rain and humidity, daylight, and what to pack.
+    return the response in a concise and readable format."""
+        response = _invoke_llm("WeatherAgent", get_llm(), weather_prompt)
+        if response:
+            weather_cache.set(cache_key, response)
+    return response
+
+def weather_inputs(params: TripParams):
+    """
+    What the weather answer varies with besides the place (the node memo's key): the months of
+    the trip for the climate normals, or weather_cache_key when the LLM answers.
+    """
+    if climate_weather(params) is not None:
+        start = params.checkin_date or params.travel_date
+        return [month.month for month in trip_months(start, params.checkout_date, params.duration_days)]
+    return weather_cache_key(params)
+
+def WeatherAgent(State):
+    """Agent responsible for checking the weather."""
+    params = State.get("trip_params") or TripParams()
+    response = climate_weather(params)
+    if response is None:
+        response = llm_weather(State.get("user_query", ""), params)
+
     return {"messages": [AIMessage(content="Weather Agent: Weather Information:")],
             "weather_data": response,
             "next_agent": "TripAgent"}
     
 def RestaurantAgent(State):
     """Agent responsible for finding restaurants."""
-    task = State.get("user_query", "")
-    # print("*TASK*\n",task)
-    prompt = f"""
-    You are a Restaurant Agent. Extract the **destination city** from the user's travel plan.
-
-    Return only the **destination city name** (e.g., Paris). Do not include the origin or any other text.
-    e.g input: Plan a trip from mumbai to Paris for 5 days. output: Paris
-    
-    STRICTLY MUST Return just the city name (like: Paris, Rome, Tokyo). No other words or explanation.
-
-    If no destination city is found, return just this word: None
-    Travel Plan: {task}
-    """
-
-    city = llm.invoke([HumanMessage(content=prompt)]).content.strip()
+    params = State.get("trip_params") or TripParams()
+    city = params.destination_city or "your destination"
     
     try:
-        lat, lon = get_city_coordinates(city)
+        lat, lon = get_city_coordinates(params.destination_city) if params.destination_city else (None, None)
         
-        if not lat or not lon:
+        if lat is None or lon is None:
             return {
                 "messages": [AIMessage(content=f"⚠️ Could not get coordinates for {city}. Continuing with trip planning...")],
                 "restaurant_data": "Restaurant search completed (geocoding failed)",
@@ -478,23 +576,26 @@ def RestaurantAgent(State):
     }
 
 
+def slot_text(State, slot: str) -> str:
+    """A slot as shown to the user and the prompts: flights and hotels are rendered from their records."""
+    if slot == "flight_data" and State.get("flight_offers"):
+        return render_flights(State["flight_offers"], State.get("fare_calendar"))
+    if slot == "hotel_data" and State.get("hotel_offers"):
+        return render_hotels(State["hotel_offers"])
+    return State.get(slot, "") or ""
+
 def ActivityAgent(State):
     """Agent responsible for finding activities."""
     task = State.get("user_query", "")
-    flight_data = State.get("flight_data", "")
-    activities_data = State.get("activities_data", "")
-    hotel_data = State.get("hotel_data", "")
-    restaurant_data = State.get("restaurant_data", "")
-    weather_data = State.get("weather_data", "")
-    activity_prompt = f"""You are an Activities Agent.
-    Your task is to gather information and recommend activities that can be done around the destination based on the following data:
-    task: {task}
-    activities_data: {activities_data}
-    consider the following data for better recommendations:
-    hotel_data: {hotel_data}
-    restaurant_data: {restaurant_data}
-    weather_data: {weather_data}
-    return the response in a concise and readable format."""
+    # Long trips and many offers would otherwise be pasted into the prompts verbatim
+    context = compact_slots({
+        "activities_data": State.get("activities_data", ""),
+        "weather_data": State.get("weather_data", ""),
+        "hotel_data": slot_text(State, "hotel_data"),
+        "restaurant_data": State.get("restaurant_data", ""),
+    }, ACTIVITY_PROMPT_BUDGET)
+    activities_data, weather_data = context["activities_data"], context["weather_data"]
+    hotel_data, restaurant_data = context["hotel_data"], context["restaurant_data"]
 
     activity_prompt = f"""You are an expert local guide and itinerary planner AI. Your goal is to create a personalized, practical, and enjoyable itinerary based on the user's profile and real-time data.
 
@@ -521,19 +622,25 @@ def ActivityAgent(State):
     * Format the response using Markdown for clear, readable sections.
     """
 
-    report_response = llm.invoke([HumanMessage(content=activity_prompt)])
-    response = report_response.content
-    
+    response = _invoke_llm("ActivityAgent", get_llm(), activity_prompt)
+
+    trip = compact_slots({
+        "flight_data": slot_text(State, "flight_data"),
+        "hotel_data": slot_text(State, "hotel_data"),
+        "restaurant_data": State.get("restaurant_data", ""),
+        "weather_data": State.get("weather_data", ""),
+        "activities": response,
+    }, FINAL_PROMPT_BUDGET)
     final_prompt = f"""
         You are a highly efficient trip planning assistant. Your task is to synthesize all available travel information into a clear, concise, and easy-to-read summary for the user.
 
         **Here is the complete trip data you have gathered:**
 
-        * **Flight Details:** {flight_data}
-        * **Hotel Accommodation:** {hotel_data}
-        * **Restaurant Reservations:** {restaurant_data}
-        * **Weather Forecast:** {weather_data}
-        * **Planned Activities:** {response}
+        * **Flight Details:** {trip["flight_data"]}
+        * **Hotel Accommodation:** {trip["hotel_data"]}
+        * **Restaurant Reservations:** {trip["restaurant_data"]}
+        * **Weather Forecast:** {trip["weather_data"]}
+        * **Planned Activities:** {trip["activities"]}
 
         **Your goal is to generate a comprehensive trip itinerary summary. Ensure the summary is:**
 
@@ -553,13 +660,56 @@ def ActivityAgent(State):
 
         **Focus on presenting the information in a logical flow, making it easy for the user to quickly grasp their entire trip at a glance.**
         """
-    final_data = llm2.invoke([HumanMessage(content=final_prompt)]).content
+    final_data = stream_reply("ActivityAgent", get_llm2(), final_prompt)
     return {"messages": [AIMessage(content=f"\n {final_data}")],
             "activities_data": response,
             "next_agent": "TripAgent",
             "final_data": final_data,
             "task_complete": True}
     
+def _chunk_text(chunk) -> str:
+    """Text of a streamed message chunk (Gemini may send a list of content parts)."""
+    if isinstance(chunk.content, str):
+        return chunk.content
+    return "".join(part.get("text", "") if isinstance(part, dict) else str(part) for part in chunk.content)
+
+def model_name(model) -> str:
+    """The model id a chat model calls (Groq and Gemini name the field differently)."""
+    return getattr(model, "model_name", None) or getattr(model, "model", None) or type(model).__name__
+
+def _invoke_llm(node: str, model, prompt: str) -> str:
+    """Calls the model with one human message, logging the node's tokens in and out."""
+    with span("llm", node, model=model_name(model)) as call:
+        reply = model.invoke([HumanMessage(content=prompt)])
+        tokens_in, tokens_out = record_usage(node, prompt, reply.content, getattr(reply, "usage_metadata", None))
+        call.set(prompt_tokens=tokens_in, completion_tokens=tokens_out)
+    return reply.content
+
+def stream_reply(node: str, model, prompt: str) -> str:
+    """
+    Calls the model with streaming and returns the whole reply. Inside a graph run each
+    chunk is also emitted as a {"type": "token"} event to stream_mode="custom" listeners.
+    """
+    try:
+        writer = get_stream_writer()
+    except RuntimeError:
+        writer = None  # Called outside a graph run
+    parts, usage = [], {}
+    with span("llm", node, model=model_name(model), stream=True) as call:
+        for chunk in model.stream([HumanMessage(content=prompt)]):
+            for key, value in (getattr(chunk, "usage_metadata", None) or {}).items():
+                if key in ("input_tokens", "output_tokens"):
+                    usage[key] = usage.get(key, 0) + value
+            text = _chunk_text(chunk)
+            if text:
+                parts.append(text)
+                if writer:
+                    writer({"type": "token", "text": text})
+        reply = "".join(parts)
+        tokens_in, tokens_out = record_usage(node, prompt, reply, usage)
+        call.set(prompt_tokens=tokens_in, completion_tokens=tokens_out)
+    return reply
+
 def router(State) -> Literal["TripAgent", "FlightAgent", "HotelAgent", "WeatherAgent", "RestaurantAgent", "ActivityAgent", "_end_"]:
     """Routes to next agent based on state."""
     
@@ -578,32 +728,344 @@ def router(State) -> Literal["TripAgent", "FlightAgent", "HotelAgent", "WeatherA
     # Default fallback to TripAgent
     return "TripAgent"
 
-workflow = StateGraph(State)
-#nodes
-workflow.add_node("TripAgent", TripAgent)
-workflow.add_node("FlightAgent", FlightAgent)
-workflow.add_node("HotelAgent", HotelAgent) 
-workflow.add_node("WeatherAgent", WeatherAgent)
-workflow.add_node("RestaurantAgent", RestaurantAgent)
-workflow.add_node("ActivityAgent", ActivityAgent)
-#edges
-workflow.set_entry_point("TripAgent")
-for node in ["TripAgent", "FlightAgent", "HotelAgent", "WeatherAgent", "RestaurantAgent", "ActivityAgent"]:
-    workflow.add_conditional_edges(
-        node, 
-        router,
-        {
-            "TripAgent":"TripAgent",
-            "FlightAgent": "FlightAgent",
-            "HotelAgent": "HotelAgent",
-            "WeatherAgent": "WeatherAgent",
-            "RestaurantAgent": "RestaurantAgent",
-            "ActivityAgent": "ActivityAgent",
-            END: END
-        } 
-        )
-# Set a reasonable recursion limit as a safety measure
-graph = workflow.compile()
+def fan_out_router(State):
+    """
+    Routes out of ExtractAgent in the parallel graph: every independent agent at once. A resumed
+    session only runs the agents whose slot is still empty.
+    """
+    if State.get("next_agent") == "end":
+        return END
+    pending = [agent for agent in FAN_OUT_AGENTS if not State.get(ROUTING_TABLE[agent][0], "")]
+    return pending or "TripJoin"
+
+def TripJoin(State) -> Dict:
+    """Joins the parallel branches and decides whether the Activity Agent can run."""
+    missing_info = State.get("missing_info")
+    if missing_info:
+        return {
+            "messages": [AIMessage(content=f"Need more information: {', '.join(missing_info)}")],
+            "next_agent": "end",
+            "missing_info": missing_info,
+            "extracted_info": State.get("extracted_info", {})
+        }
+
+    if State.get("halted"):
+        return {
+            "messages": [AIMessage(content=f"⚠️ Stopping: {', '.join(State['halted'])} could not complete.")],
+            "next_agent": "end"
+        }
+
+    return {
+        "messages": [AIMessage(content="Final step - let's plan your activities! Assigning to Activities Agent🎡")],
+        "next_agent": "ActivityAgent"
+    }
+
+def join_router(State) -> Literal["ActivityAgent", "_end_"]:
+    """Routes out of TripJoin."""
+    return "ActivityAgent" if State.get("next_agent") == "ActivityAgent" else END
+
+# --------- NODE MEMO ----------
+# What each agent's output depends on: (TripParams fields or functions of the params, state
+# slots). Within a session its output is memoized under a hash of these values, so a re-plan
+# only reruns the agents whose inputs changed (and, through the slots, the ones downstream of
+# them). One-shot runs and other sessions never see each other's outputs.
+NODE_INPUTS = {
+    "FlightAgent": (["origin_iata", "destination_iata", "travel_date", "adults", "flex_days"], []),
+    "HotelAgent": (["destination_city_code", "checkin_date", "checkout_date", "adults"], []),
+    "WeatherAgent": (["destination_city", "destination_iata", weather_inputs], []),
+    "RestaurantAgent": (["destination_city"], []),
+    "ActivityAgent": ([], ["user_query", "flight_data", "flight_offers", "fare_calendar", "hotel_data", "hotel_offers",
+                           "weather_data", "restaurant_data"]),
+}
+# Record slots an agent fills next to its text slot, with their empty values
+AGENT_RECORD_SLOTS = {
+    "FlightAgent": {"flight_offers": [], "fare_calendar": {}},
+    "HotelAgent": {"hotel_offers": []},
+}
+# Slots holding records: the memo stores their rows and restores them with these
+RECORD_SLOTS = {
+    "flight_offers": lambda rows: load_offers(FlightOffer, rows),
+    "fare_calendar": load_calendar,
+    "hotel_offers": lambda rows: load_offers(HotelOffer, rows),
+}
+# Messages of degraded results (API errors, geocoding failures) start with this; they aren't memoized
+DEGRADED_PREFIX = "⚠️"
+
+_memo_counts = {}
+_memo_lock = Lock()
+
+def current_session() -> str:
+    """thread_id of the checkpointed run the calling node belongs to, or "" for a one-shot run."""
+    try:
+        return get_config().get("configurable", {}).get("thread_id") or ""
+    except RuntimeError:
+        return ""
+
+def memo_key(node: str, State, session: str) -> str:
+    """Hash of the session and the node's declared inputs in this state."""
+    fields, slots = NODE_INPUTS[node]
+    params = State.get("trip_params") or TripParams()
+    inputs = ([session, node] + [field(params) if callable(field) else getattr(params, field) for field in fields]
+              + [State.get(slot, "") for slot in slots])
+    return hashlib.blake2b(json.dumps(to_rows(inputs)).encode("utf-8"), digest_size=16).hexdigest()
+
+def memo_has(node: str, State, session: str) -> bool:
+    """Whether the session has a memoized output for the node's inputs in this state."""
+    return bool(NODE_MEMO and session) and node_memo.get(memo_key(node, State, session)) is not None
+
+def _memoizable(node: str, update: Dict) -> bool:
+    messages = update.get("messages") or []
+    return (update.get(ROUTING_TABLE[node][0]) and update.get("next_agent") != "end"
+            and not update.get("missing_info")
+            and not any(str(m.content).startswith(DEGRADED_PREFIX) for m in messages))
+
+def _count_memo(node: str, outcome: str):
+    with _memo_lock:
+        counts = _memo_counts.setdefault(node, {"reused": 0, "computed": 0})
+        counts[outcome] += 1
+
+def memoized(node: str, agent):
+    """Wraps an agent in NODE_INPUTS so, within a session, an unchanged input set returns its memoized update."""
+    if node not in NODE_INPUTS:
+        return agent
+
+    def run(State):
+        session = current_session() if NODE_MEMO else ""
+        if not session:
+            return agent(State)
+        key = memo_key(node, State, session)
+        stored = node_memo.get(key)
+        if stored is not None:
+            _count_memo(node, "reused")
+            update = dict(stored["update"], messages=[AIMessage(content=text) for text in stored["messages"]])
+            update.update({slot: RECORD_SLOTS[slot](update[slot]) for slot in RECORD_SLOTS if slot in update})
+            if node == "HotelAgent":
+                discard_hotel_prefetch(State.get("hotel_prefetch", ""))
+            if update.get("final_data"):
+                # Streaming clients still receive the summary, in one piece
+                try:
+                    get_stream_writer()({"type": "token", "text": update["final_data"]})
+                except RuntimeError:
+                    pass
+            update["node_report"] = {node: "reused"}
+            return update
+
+        update = agent(State)
+        _count_memo(node, "computed")
+        if _memoizable(node, update):
+            slots = {slot: to_rows(value) for slot, value in update.items() if slot != "messages"}
+            node_memo.set(key, {"update": slots, "messages": [m.content for m in update.get("messages") or []]})
+        return {**update, "node_report": {node: "computed"}}
+
+    run.__name__ = agent.__name__
+    run.__doc__ = agent.__doc__
+    return run
+
+def node_memo_stats() -> dict:
+    """Reused and computed runs per memoized agent since the process started."""
+    with _memo_lock:
+        return {node: dict(counts) for node, counts in _memo_counts.items()}
+
+def as_branch(agent):
+    """Adapts an agent for the fan-out: TripJoin does the routing, so a request to end becomes a halt."""
+    def branch(State):
+        update = agent(State)
+        if update.pop("next_agent", None) == "end":
+            update["halted"] = [agent.__name__]
+        return update
+    branch.__name__ = agent.__name__
+    branch.__doc__ = agent.__doc__
+    return branch
+
+def build_graph(mode: str = GRAPH_MODE, checkpointer=None):
+    """Compiles the workflow in either "parallel" or "sequential" mode, optionally checkpointed."""
+    workflow = StateGraph(State)
+
+    def add_node(name, node):
+        # Every node call is a tracing span (and a sample in the node latency histogram)
+        workflow.add_node(name, traced_node(name, node))
+
+    def memo(agent):
+        return memoized(agent.__name__, agent)
+
+    if mode == "sequential":
+        #nodes
+        add_node("ExtractAgent", ExtractAgent)
+        add_node("TripAgent", TripAgent)
+        add_node("FlightAgent", memo(FlightAgent))
+        add_node("HotelAgent", memo(HotelAgent)) 
+        add_node("WeatherAgent", memo(WeatherAgent))
+        add_node("RestaurantAgent", memo(RestaurantAgent))
+        add_node("ActivityAgent", memo(ActivityAgent))
+        #edges
+        workflow.set_entry_point("ExtractAgent")
+        for node in ["ExtractAgent", "TripAgent", "FlightAgent", "HotelAgent", "WeatherAgent", "RestaurantAgent", "ActivityAgent"]:
+            workflow.add_conditional_edges(
+                node, 
+                router,
+                {
+                    "TripAgent":"TripAgent",
+                    "FlightAgent": "FlightAgent",
+                    "HotelAgent": "HotelAgent",
+                    "WeatherAgent": "WeatherAgent",
+                    "RestaurantAgent": "RestaurantAgent",
+                    "ActivityAgent": "ActivityAgent",
+                    END: END
+                } 
+                )
+        return workflow.compile(checkpointer=checkpointer)
+
+    #nodes
+    add_node("ExtractAgent", ExtractAgent)
+    add_node("FlightAgent", as_branch(memo(FlightAgent)))
+    add_node("HotelAgent", as_branch(memo(HotelAgent)))
+    add_node("WeatherAgent", as_branch(memo(WeatherAgent)))
+    add_node("RestaurantAgent", as_branch(memo(RestaurantAgent)))
+    add_node("TripJoin", TripJoin)
+    add_node("ActivityAgent", memo(ActivityAgent))
+    #edges
+    workflow.add_edge(START, "ExtractAgent")
+    workflow.add_conditional_edges("ExtractAgent", fan_out_router, FAN_OUT_AGENTS + ["TripJoin", END])
+    for node in FAN_OUT_AGENTS:
+        # Branches finish in the same superstep, so TripJoin runs once after all of them
+        workflow.add_edge(node, "TripJoin")
+    workflow.add_conditional_edges("TripJoin", join_router, {"ActivityAgent": "ActivityAgent", END: END})
+    workflow.add_edge("ActivityAgent", END)
+    return workflow.compile(checkpointer=checkpointer)
+
+@lru_cache(maxsize=1)
+def get_graph():
+    """The compiled graph for GRAPH_MODE, built on first use."""
+    return build_graph()
+
+# --------- SESSIONS ----------
+@lru_cache(maxsize=1)
+def get_checkpointer():
+    """The checkpoint store for CHECKPOINTER, opened on first use."""
+    from langgraph.checkpoint.serde.jsonplus import JsonPlusSerializer
+    # TripParams and the offer records are restored from checkpoints, so they have to be allowed explicitly
+    serde = JsonPlusSerializer(allowed_msgpack_modules=[
+        ("trip_params", "TripParams"),
+        ("records", "FlightOffer"), ("records", "Segment"), ("records", "HotelOffer"),
+    ])
+    if CHECKPOINTER == "sqlite":
+        import sqlite3
+        from langgraph.checkpoint.sqlite import SqliteSaver
+        os.makedirs(os.path.dirname(CHECKPOINT_PATH) or ".", exist_ok=True)
+        conn = sqlite3.connect(CHECKPOINT_PATH, timeout=10, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        return SqliteSaver(conn, serde=serde)
+    from langgraph.checkpoint.memory import InMemorySaver
+    return InMemorySaver(serde=serde)
+
+@lru_cache(maxsize=1)
+def get_session_graph():
+    """The GRAPH_MODE graph with checkpoints per session (the thread_id in the run config)."""
+    return build_graph(checkpointer=get_checkpointer())
+
+def stored_sessions() -> list:
+    """thread_ids in the checkpoint store, least recently written first (checkpoint ids grow over time)."""
+    saver = get_checkpointer()
+    if CHECKPOINTER == "sqlite":
+        with saver.cursor(transaction=False) as cur:
+            cur.execute("SELECT thread_id FROM checkpoints GROUP BY thread_id ORDER BY MAX(checkpoint_id)")
+            return [row[0] for row in cur.fetchall()]
+    latest = {thread_id: max((checkpoint_id for checkpoints in namespaces.values() for checkpoint_id in checkpoints), default="")
+              for thread_id, namespaces in list(saver.storage.items())}
+    return sorted(latest, key=latest.get)
+
+def open_session(thread_id: str):
+    """Starts a session from scratch, deleting the oldest stored ones beyond SESSION_LIMIT."""
+    close_session(thread_id)
+    # The new session has no checkpoint yet, so it needs one place
+    stored = stored_sessions()
+    for old in stored[:max(len(stored) - SESSION_LIMIT + 1, 0)]:
+        get_checkpointer().delete_thread(old)
+
+def close_session(thread_id: str):
+    """Deletes a session's checkpoints once nothing is left to resume."""
+    get_checkpointer().delete_thread(thread_id)
+
+# Follow-up answers are keyed like extracted_info (or by TripParams field)
+ANSWER_FIELDS = {
+    "departure": "origin_iata", "arrival": "destination_iata", "date": "travel_date",
+    "city_code": "destination_city_code", "checkin_date": "checkin_date",
+    "checkout_date": "checkout_date", "adults": "adults",
+}
+# Code fields a city name can be given for: field -> (City attribute, city name field)
+PLACE_FIELDS = {
+    "origin_iata": ("airport", "origin_city"),
+    "destination_iata": ("airport", "destination_city"),
+    "destination_city_code": ("city_code", "destination_city"),
+}
+
+def answer_params(answers: dict) -> dict:
+    """TripParams fields for follow-up answers; city names are turned into their codes via the gazetteer."""
+    fields = {}
+    for key, value in (answers or {}).items():
+        field = ANSWER_FIELDS.get(key, key)
+        if field in PLACE_FIELDS and isinstance(value, str) and not re.fullmatch(r"[A-Za-z]{3}", value.strip()):
+            attribute, name_field = PLACE_FIELDS[field]
+            city = find_city(value, fuzzy=True)
+            # Cities known only from GeoNames have no codes to fill in
+            if city and getattr(city, attribute):
+                value = getattr(city, attribute)
+                fields.setdefault(name_field, city.name)
+        fields[field] = value
+    return fields
+
+def resume_update(values: Dict, answers: dict, session: str = "") -> Dict:
+    """
+    State update that resumes a session stopped on missing details, written as ExtractAgent's
+    output: the answers are merged into the trip parameters and extracted_info, missing_info is
+    cleared, and the slots earlier agents already filled are kept unless the answers changed
+    that agent's NODE_INPUTS (a WeatherAgent answer given without dates is redone once they arrive).
+    """
+    params = (values.get("trip_params") or TripParams()).merge(answer_params(answers))
+    query = values.get("user_query", "")
+    update = trip_params_update(params, values.get("current_task") or query, query, session)
+    update.update(missing_info=None, halted=None, node_report=None, extracted_info=dict(answers or {}))
+    update.update(stale_slots(values, update))
+    return update
+
+def stale_slots(values: Dict, update: Dict) -> Dict:
+    """Cleared slots of the agents whose NODE_INPUTS the update changes, including those downstream of them."""
+    state, cleared = {**values, **update}, {}
+    for node in NODE_INPUTS:
+        if memo_key(node, values, "") != memo_key(node, state, ""):
+            slots = {ROUTING_TABLE[node][0]: "", **AGENT_RECORD_SLOTS.get(node, {})}
+            cleared.update(slots)
+            state.update(slots)
+    return cleared
+
+def replan_update(values: Dict, changes: dict, session: str = "") -> Dict:
+    """
+    State update that re-plans a session with changed trip details. Every slot is cleared so
+    every agent runs again, but agents whose NODE_INPUTS did not change answer from the memo;
+    node_report then tells which ones were reused and which were computed.
+    """
+    update = resume_update(values, changes, session)
+    update.update({slot: "" for slot, _, _ in ROUTING_TABLE.values()})
+    for slots in AGENT_RECORD_SLOTS.values():
+        update.update(slots)
+    update.update(final_data="", task_complete=False)
+    # The itinerary prompts read the query, so it has to mention what changed since the first plan;
+    # the note is rebuilt from that query each time instead of piling up
+    query = values.get("planned_query") or values.get("user_query", "")
+    planned = values.get("planned_params") or values.get("trip_params") or TripParams()
+    before, after = planned.to_dict(), update["trip_params"].to_dict()
+    changed = ", ".join(f"{field}: {after[field]}" for field in after if after[field] != before[field])
+    update.update(planned_query=query, planned_params=planned,
+                  user_query=f"{query}\n(Updated trip details: {changed})" if changed else query)
+    return update
+
+_LAZY_ATTRIBUTES = {"llm": get_llm, "llm2": get_llm2, "graph": get_graph}
+
+def __getattr__(name):
+    """Keeps `agent.llm`, `agent.llm2` and `from agent import graph` working without building them at import."""
+    if name in _LAZY_ATTRIBUTES:
+        return _LAZY_ATTRIBUTES[name]()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 
 # from PIL import Image
@@ -0,0 +1,162 @@
+"""
+Batch planner: runs many queries through the graph and writes one JSON result per line.
+
+Input is JSONL with a "text" (or "query") field and an optional "id"; plain
+text lines are accepted too. Queries run concurrently, either as threads in
+this process (default) or in a pool of worker processes:
+
+    python batch.py queries.jsonl -o plans.jsonl --concurrency 8
+    python batch.py queries.jsonl -o plans.jsonl --executor process --concurrency 4
+
+In thread mode every query shares one event loop for its API calls, so
+identical flight/hotel/geocode/restaurant lookups that are in flight at the
+same time are made once (see cache.single_flight) and finished ones are
+served from the caches. Process mode shares only the SQLite cache.
+
+Each output line is {"id", "text", "status", "result", "latency_s"}, where status is
+"complete", "missing_info" or "failed"; a throughput and latency report goes to
+stderr (and to --report as JSON).
+"""
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed
+import argparse, json, os, statistics, sys, time
+
+RECURSION_LIMIT = 15
+
+
+def read_queries(path: str) -> list:
+    """Loads the batch; every query gets an id (its line number unless given)."""
+    queries = []
+    with open(path, encoding="utf-8") as f:
+        for line_number, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                record = line
+            if isinstance(record, str):
+                record = {"text": record}
+            text = record.get("text") or record.get("query")
+            if not isinstance(text, str) or not text.strip():
+                print(f"{path}:{line_number}: no query text, skipped", file=sys.stderr)
+                continue
+            queries.append({"id": record.get("id", line_number), "text": text.strip()})
+    return queries
+
+
+def plan_one(query: dict) -> dict:
+    """Runs one query through the graph and times it."""
+    from agent import get_graph
+    from langchain_core.messages import HumanMessage
+    from main2 import final_text
+    from tracing import trace_run
+
+    started = time.perf_counter()
+    final_step = {}
+    try:
+        with trace_run("batch", query_id=query["id"]):
+            for step in get_graph().stream(
+                {"messages": [HumanMessage(content=query["text"])]},
+                config={"recursion_limit": RECURSION_LIMIT},
+            ):
+                final_step = step
+        final_state = (list(final_step.values())[0] or {}) if final_step else {}
+        status = ("complete" if final_state.get("final_data")
+                  else "missing_info" if final_state.get("missing_info") else "failed")
+        result = final_text(final_step)
+    except Exception as e:
+        status, result = "failed", f"{type(e).__name__}: {e}"
+    return {**query, "status": status, "result": result,
+            "latency_s": round(time.perf_counter() - started, 3)}
+
+
+def _preload():
+    """Process-pool initializer: build the graph and load the gazetteer before the first query arrives."""
+    from agent import get_graph
+    from gazetteer import load as load_gazetteer
+    get_graph()
+    load_gazetteer()
+
+
+def percentile(values: list, fraction: float) -> float:
+    """Nearest-rank percentile of a non-empty list."""
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, round(fraction * len(ordered)) - 1))]
+
+
+def run_batch(queries: list, out, concurrency: int = 4, executor: str = "thread") -> dict:
+    """Plans every query, writing results to `out` as they finish; returns the report."""
+    if executor == "process":
+        pool = ProcessPoolExecutor(max_workers=concurrency, initializer=_preload)
+    else:
+        _preload()
+        pool = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="planner-batch")
+
+    started = time.perf_counter()
+    latencies, statuses = [], {}
+    with pool:
+        futures = [pool.submit(plan_one, query) for query in queries]
+        for done, future in enumerate(as_completed(futures), 1):
+            result = future.result()
+            out.write(json.dumps(result, ensure_ascii=False) + "\n")
+            out.flush()
+            latencies.append(result["latency_s"])
+            statuses[result["status"]] = statuses.get(result["status"], 0) + 1
+            print(f"[{done}/{len(queries)}] {result['id']}: {result['status']} in {result['latency_s']}s",
+                  file=sys.stderr)
+    wall = time.perf_counter() - started
+
+    report = {
+        "queries": len(queries),
+        "executor": executor,
+        "concurrency": concurrency,
+        "wall_s": round(wall, 3),
+        "throughput_qps": round(len(queries) / wall, 3) if wall else 0.0,
+        "statuses": statuses,
+    }
+    if latencies:
+        report["latency_s"] = {
+            "mean": round(statistics.mean(latencies), 3),
+            "p50": percentile(latencies, 0.50),
+            "p95": percentile(latencies, 0.95),
+            "max": max(latencies),
+        }
+    if executor == "thread":
+        # Process workers keep their own counters; only this process's are visible here
+        from cache import cache_stats, single_flight_stats
+        from token_budget import token_stats
+        from tools import hotel_prefetch_stats
+        report["single_flight"] = single_flight_stats()
+        report["caches"] = cache_stats()
+        report["tokens"] = token_stats()
+        report["hotel_prefetch"] = hotel_prefetch_stats()
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("queries", help="JSONL file of queries")
+    parser.add_argument("-o", "--output", help="Where to write the results (default: stdout)")
+    parser.add_argument("-c", "--concurrency", type=int,
+                        default=int(os.getenv("PLANNER_BATCH_CONCURRENCY", "4")), help="Queries planned at once")
+    parser.add_argument("--executor", choices=["thread", "process"], default="thread")
+    parser.add_argument("--report", help="Also write the report as JSON to this file")
+    args = parser.parse_args()
+
+    queries = read_queries(args.queries)
+    out = open(args.output, "w", encoding="utf-8") if args.output else sys.stdout
+    try:
+        report = run_batch(queries, out, max(1, args.concurrency), args.executor)
+    finally:
+        if args.output:
+            out.close()
+
+    print(json.dumps(report, indent=2), file=sys.stderr)
+    if args.report:
+        with open(args.report, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
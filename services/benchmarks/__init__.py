@@ -0,0 +1,9 @@
+"""
+Offline benchmarks for the planner graph.
+
+Local stand-ins for Amadeus, Nominatim and Overpass (stubs.py) and fake chat
+models (fake_llm.py) let the whole graph run without network access or API
+keys. Run from the services directory:
+
+    python -m benchmarks.run --output bench.json
+"""
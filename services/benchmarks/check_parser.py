@@ -0,0 +1,54 @@
+"""
+Checks the query fast path against hand-checked parses.
+
+    python -m benchmarks.check_parser
+    python -m benchmarks.check_parser --cases my_cases.jsonl
+
+Each line of the cases file holds a query, the date it is parsed on ("today",
+so dates without a year resolve the same way on any day), the TripParams
+fields it must produce ("expect") and the exact list of parts the parser
+must report as missing or ambiguous ("missing"). Prints one line per
+mismatch and exits non-zero if there are any.
+"""
+from datetime import date
+import argparse, json, os, sys
+
+from query_parser import parse_query
+
+CASES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "parser_cases.jsonl")
+
+
+def read_cases(path: str) -> list:
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def check_case(case: dict) -> list:
+    """Mismatches between the parse of one case and what it expects, as text."""
+    parsed = parse_query(case["text"], date.fromisoformat(case["today"]))
+    params = parsed.params.to_dict()
+    problems = [f"{field}: got {params.get(field)!r}, expected {value!r}"
+                for field, value in case.get("expect", {}).items() if params.get(field) != value]
+    if "missing" in case and parsed.missing != case["missing"]:
+        problems.append(f"missing: got {parsed.missing!r}, expected {case['missing']!r}")
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--cases", default=CASES_PATH, help="JSONL cases (default: benchmarks/parser_cases.jsonl)")
+    args = parser.parse_args()
+
+    cases = read_cases(args.cases)
+    failures = 0
+    for case in cases:
+        problems = check_case(case)
+        failures += bool(problems)
+        for problem in problems:
+            print(f"{case['text']!r} ({case['today']}): {problem}")
+    print(f"{len(cases) - failures}/{len(cases)} parser cases pass", file=sys.stderr)
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+"""
+Deterministic chat models standing in for Groq (llm) and Gemini (llm2).
+
+Replies are picked from the prompt: extraction prompts get trip JSON (from
+the rule-based parser, completed with fixed defaults), routing prompts get
+the next agent whose data is missing, and the weather, itinerary and summary
+prompts get canned text of a configurable length. Each call sleeps for a
+first-token latency plus the time to "generate" its reply at a fixed token
+rate, and reports usage metadata like the real integrations.
+"""
+from dataclasses import asdict
+from threading import Lock
+from typing import Any, Iterator, List, Optional
+import json, re, time
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+from query_parser import parse_query
+
+CHARS_PER_TOKEN = 4
+# Filled in when the parser could not place a city; dates stay null so missing-date
+# queries still end in the missing-information path
+EXTRACTION_DEFAULTS = {
+    "origin_city": "Mumbai", "origin_iata": "BOM",
+    "destination_city": "Annecy", "destination_iata": "GVA", "destination_city_code": "ANY",
+    "travel_date": None, "checkin_date": None, "checkout_date": None,
+    "adults": 1, "duration_days": None, "flex_days": 0,
+}
+ROUTING_ORDER = [("flight", "Flight"), ("hotel", "Hotel"), ("weather", "Weather"),
+                 ("restaurant", "Restaurant"), ("activities", "Activities")]
+FILLER = ("Start early at the old town market, then walk along the river to the main museum. "
+          "Lunch at a local bistro, an afternoon guided tour, and dinner near the hotel. ")
+
+
+class FakeChatModel(BaseChatModel):
+    """Chat model with scripted replies and simulated latency."""
+
+    model_name: str = "fake"
+    first_token_ms: float = 200.0
+    tokens_per_second: float = 400.0
+    reply_tokens: int = 300
+    calls: int = 0
+    tokens_in: int = 0
+    tokens_out: int = 0
+    _lock: Any = None
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self._lock = Lock()
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-chat"
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"calls": self.calls, "tokens_in": self.tokens_in, "tokens_out": self.tokens_out}
+
+    def _reply(self, prompt: str) -> str:
+        if '"destination_city_code"' in prompt and "Travel Plan:" in prompt:
+            query = prompt.split("**Travel Plan:**", 1)[1].split("\n", 1)[0].strip()
+            params = {k: v for k, v in asdict(parse_query(query).params).items() if v}
+            return json.dumps({**EXTRACTION_DEFAULTS, **params})
+        if "decide which agent should work next" in prompt:
+            filled = dict(re.findall(r"Has (\w+) data: (True|False)", prompt))
+            for key, agent in ROUTING_ORDER:
+                if filled.get(key) != "True":
+                    return agent
+            return "DONE"
+        if "Weather Agent" in prompt:
+            return self._text("Expect mild days, cool evenings and occasional showers; pack layers.", 80)
+        return self._text(FILLER, self.reply_tokens)
+
+    @staticmethod
+    def _text(seed: str, tokens: int) -> str:
+        chars = tokens * CHARS_PER_TOKEN
+        return (seed * (chars // len(seed) + 1))[:chars]
+
+    def _account(self, prompt: str, reply: str) -> dict:
+        usage = {"input_tokens": len(prompt) // CHARS_PER_TOKEN, "output_tokens": len(reply) // CHARS_PER_TOKEN}
+        usage["total_tokens"] = usage["input_tokens"] + usage["output_tokens"]
+        with self._lock:
+            self.calls += 1
+            self.tokens_in += usage["input_tokens"]
+            self.tokens_out += usage["output_tokens"]
+        return usage
+
+    @staticmethod
+    def _prompt(messages: List[BaseMessage]) -> str:
+        return "\n".join(str(message.content) for message in messages)
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                  run_manager=None, **kwargs) -> ChatResult:
+        prompt = self._prompt(messages)
+        reply = self._reply(prompt)
+        usage = self._account(prompt, reply)
+        time.sleep((self.first_token_ms + 1000 * usage["output_tokens"] / self.tokens_per_second) / 1000)
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=reply, usage_metadata=usage))])
+
+    def _stream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                run_manager=None, **kwargs) -> Iterator[ChatGenerationChunk]:
+        prompt = self._prompt(messages)
+        reply = self._reply(prompt)
+        usage = self._account(prompt, reply)
+        time.sleep(self.first_token_ms / 1000)
+        step = 16 * CHARS_PER_TOKEN
+        for start in range(0, len(reply), step):
+            time.sleep(16 / self.tokens_per_second)
+            yield ChatGenerationChunk(message=AIMessageChunk(content=reply[start:start + step]))
+        yield ChatGenerationChunk(message=AIMessageChunk(content="", usage_metadata=usage))
@@ -0,0 +1,229 @@
+"""
+Runs the query corpus through the planner graph against local stand-ins and
+reports wall time, per-node time, upstream call counts and peak RSS as JSON.
+
+    python -m benchmarks.run                                # report on stdout
+    python -m benchmarks.run -o bench.json --passes 3 --mode sequential
+    python -m benchmarks.run --latency amadeus=400 --errors overpass=0.2
+
+Amadeus, Nominatim and Overpass are served by benchmarks.stubs and the two
+chat models are replaced by benchmarks.fake_llm, so nothing leaves the
+machine and no API keys are needed. The first pass starts with empty caches
+(a fresh PLANNER_CACHE_DIR); later passes show warm-cache behaviour. Queries
+run one at a time so per-node times are comparable between runs.
+"""
+from batch import percentile, read_queries
+from threading import Lock
+import argparse, functools, json, os, platform, shutil, statistics, sys, tempfile, time
+
+from benchmarks.stubs import SERVICES, StubService
+
+CORPUS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "corpus.jsonl")
+# Simulated latency per upstream (ms); for the models it is the time to first token
+DEFAULT_LATENCY_MS = {"amadeus": 150, "nominatim": 100, "overpass": 400, "llm": 250, "llm2": 600}
+NODES = ["ExtractAgent", "TripAgent", "FlightAgent", "HotelAgent", "WeatherAgent",
+         "RestaurantAgent", "TripJoin", "ActivityAgent"]
+RECURSION_LIMIT = 30
+
+
+def parse_overrides(values: list, allowed) -> dict:
+    """["amadeus=400", ...] -> {"amadeus": 400.0}."""
+    overrides = {}
+    for value in values or []:
+        name, _, number = value.partition("=")
+        if name not in allowed or not number:
+            raise SystemExit(f"Expected one of {sorted(allowed)}=<number>, got {value!r}")
+        overrides[name] = float(number)
+    return overrides
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process, or None where getrusage is unavailable."""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def summarize(samples_ms: list) -> dict:
+    if not samples_ms:
+        return {"count": 0}
+    return {
+        "count": len(samples_ms),
+        "mean_ms": round(statistics.mean(samples_ms), 1),
+        "p50_ms": round(percentile(samples_ms, 0.50), 1),
+        "p95_ms": round(percentile(samples_ms, 0.95), 1),
+        "max_ms": round(max(samples_ms), 1),
+    }
+
+
+def diff_counts(after: dict, before: dict) -> dict:
+    return {key: after[key] - before.get(key, 0) for key in after if after[key] - before.get(key, 0)}
+
+
+class NodeTimer:
+    """Wraps agent node functions and records how long each call takes."""
+
+    def __init__(self):
+        self.records = []
+        self._lock = Lock()
+
+    def wrap(self, name: str, node):
+        @functools.wraps(node)
+        def timed(state):
+            started = time.perf_counter()
+            try:
+                return node(state)
+            finally:
+                with self._lock:
+                    self.records.append((name, (time.perf_counter() - started) * 1000))
+        return timed
+
+    def take(self) -> list:
+        with self._lock:
+            records, self.records = self.records, []
+        return records
+
+
+def configure_environment(stubs: dict, cache_dir: str, mode: str):
+    """Points tools.py at the stand-ins; must run before agent/tools are imported."""
+    os.environ["AMADEUS_BASE_URL"] = stubs["amadeus"]
+    os.environ["PLANNER_NOMINATIM_URL"] = stubs["nominatim"] + "/search"
+    os.environ["PLANNER_OVERPASS_URL"] = stubs["overpass"] + "/api/interpreter"
+    os.environ["PLANNER_CACHE_DIR"] = cache_dir
+    # No local restaurant index: restaurant lookups go to the Overpass stand-in
+    os.environ["PLANNER_RESTAURANT_INDEX_DIR"] = os.path.join(cache_dir, "no-restaurant-index")
+    os.environ["PLANNER_GRAPH_MODE"] = mode
+    os.environ["PLANNER_TOKEN_LOG"] = "0"
+    os.environ.setdefault("AMADEUS_CLIENT_ID", "benchmark")
+    os.environ.setdefault("AMADEUS_CLIENT_SECRET", "benchmark")
+
+
+def run_query(graph, query: dict) -> tuple:
+    """Plans one query; returns (status, error)."""
+    from langchain_core.messages import HumanMessage
+    from tracing import trace_run
+    try:
+        with trace_run("benchmark", query_id=query["id"]):
+            state = graph.invoke({"messages": [HumanMessage(content=query["text"])]},
+                                 config={"recursion_limit": RECURSION_LIMIT})
+    except Exception as e:
+        return "failed", f"{type(e).__name__}: {e}"
+    if state.get("final_data"):
+        return "complete", None
+    return ("missing_info" if state.get("missing_info") else "failed"), None
+
+
+def run_benchmark(queries: list, mode: str, passes: int, latency: dict, errors: dict,
+                  jitter_ms: float, tokens_per_second: float, seed: int) -> dict:
+    services = {name: StubService(name, latency[name], jitter_ms, errors.get(name, 0.0), seed)
+                for name in SERVICES}
+    stubs = {name: service.start() for name, service in services.items()}
+    cache_dir = tempfile.mkdtemp(prefix="planner-bench-")
+    try:
+        configure_environment(stubs, cache_dir, mode)
+        import agent
+        from benchmarks.fake_llm import FakeChatModel
+
+        models = {
+            "llm": FakeChatModel(model_name="llm", first_token_ms=latency["llm"], tokens_per_second=tokens_per_second),
+            "llm2": FakeChatModel(model_name="llm2", first_token_ms=latency["llm2"], tokens_per_second=tokens_per_second),
+        }
+        agent.get_llm = lambda: models["llm"]
+        agent.get_llm2 = lambda: models["llm2"]
+        timer = NodeTimer()
+        for name in NODES:
+            setattr(agent, name, timer.wrap(name, getattr(agent, name)))
+        graph = agent.build_graph(mode)
+
+        pass_reports, query_reports = [], []
+        for pass_number in range(1, passes + 1):
+            api_before = {name: service.snapshot() for name, service in services.items()}
+            llm_before = {name: model.stats() for name, model in models.items()}
+            query_ms, node_ms, statuses = [], {}, {}
+            started = time.perf_counter()
+            for query in queries:
+                timer.take()
+                query_started = time.perf_counter()
+                status, error = run_query(graph, query)
+                elapsed = (time.perf_counter() - query_started) * 1000
+                nodes = {}
+                for name, ms in timer.take():
+                    nodes[name] = round(nodes.get(name, 0.0) + ms, 1)
+                    node_ms.setdefault(name, []).append(ms)
+                query_ms.append(elapsed)
+                statuses[status] = statuses.get(status, 0) + 1
+                record = {"id": query["id"], "pass": pass_number, "status": status,
+                          "wall_ms": round(elapsed, 1), "nodes": nodes}
+                if error:
+                    record["error"] = error
+                query_reports.append(record)
+                print(f"[pass {pass_number}] {query['id']}: {status} in {elapsed:.0f} ms", file=sys.stderr)
+
+            pass_reports.append({
+                "pass": pass_number,
+                "caches": "cold" if pass_number == 1 else "warm",
+                "wall_s": round(time.perf_counter() - started, 3),
+                "statuses": statuses,
+                "query": summarize(query_ms),
+                "nodes": {name: summarize(samples) for name, samples in node_ms.items()},
+                "api_calls": {
+                    name: {
+                        "calls": diff_counts(service.snapshot()["calls"], api_before[name]["calls"]),
+                        "injected_errors": service.snapshot()["injected_errors"] - api_before[name]["injected_errors"],
+                    }
+                    for name, service in services.items()
+                },
+                "llm_calls": {name: diff_counts(model.stats(), llm_before[name]) for name, model in models.items()},
+            })
+    finally:
+        for service in services.values():
+            service.stop()
+        shutil.rmtree(cache_dir, ignore_errors=True)
+
+    return {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "mode": mode,
+        "queries": len(queries),
+        "config": {"latency_ms": latency, "jitter_ms": jitter_ms, "error_rate": errors,
+                   "llm_tokens_per_second": tokens_per_second, "seed": seed},
+        "passes": pass_reports,
+        "per_query": query_reports,
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--corpus", default=CORPUS_PATH, help="JSONL queries (default: benchmarks/corpus.jsonl)")
+    parser.add_argument("-o", "--output", help="Write the JSON report here (default: stdout)")
+    parser.add_argument("--mode", choices=["parallel", "sequential"], default="parallel")
+    parser.add_argument("--passes", type=int, default=2, help="Runs over the corpus; the first is cold")
+    parser.add_argument("--latency", action="append", metavar="NAME=MS",
+                        help=f"Override a latency; names: {', '.join(DEFAULT_LATENCY_MS)}")
+    parser.add_argument("--errors", action="append", metavar="SERVICE=RATE",
+                        help=f"Fail this share of calls; services: {', '.join(SERVICES)}")
+    parser.add_argument("--jitter", type=float, default=0.0, help="± random latency added to stub calls (ms)")
+    parser.add_argument("--llm-tokens-per-second", type=float, default=400.0)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    latency = {**DEFAULT_LATENCY_MS, **parse_overrides(args.latency, DEFAULT_LATENCY_MS)}
+    errors = parse_overrides(args.errors, SERVICES)
+    report = run_benchmark(read_queries(args.corpus), args.mode, max(1, args.passes), latency, errors,
+                           args.jitter, args.llm_tokens_per_second, args.seed)
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
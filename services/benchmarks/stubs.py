@@ -0,0 +1,206 @@
+"""
+Local stand-ins for the HTTP APIs used in tools.py.
+
+Each upstream runs its own threaded HTTP server so latency and failures can
+be injected per service. Responses are deterministic for a given request
+(derived from a hash of its parameters) and shaped like the real APIs, as
+far as tools.py reads them. Every request is counted per endpoint.
+"""
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+import hashlib, json, math, random, re, threading, time
+
+AIRLINES = ["AF", "BA", "LH", "EK", "AI", "QR", "KL", "TK"]
+CUISINES = ["french", "italian", "indian", "japanese", "local", "pizza", "cafe", "seafood"]
+# Cities with a single hotel that is never sold out, so the corpus covers a one-offer hotel search
+SINGLE_HOTEL_CITIES = {"REK"}
+
+
+def _seed(*parts) -> int:
+    return int.from_bytes(hashlib.sha256("|".join(map(str, parts)).encode("utf-8")).digest()[:8], "big")
+
+
+def _json(status: int, data) -> tuple:
+    return status, "application/json", json.dumps(data).encode("utf-8")
+
+
+# --------- AMADEUS ----------
+def amadeus_token(query: dict, form: dict) -> tuple:
+    return _json(200, {"access_token": "bench-token", "token_type": "Bearer", "expires_in": 1799})
+
+
+def amadeus_flight_offers(query: dict, form: dict) -> tuple:
+    origin, destination = query.get("originLocationCode", "XXX"), query.get("destinationLocationCode", "YYY")
+    date = query.get("departureDate", "2030-01-01")
+    rng = random.Random(_seed(origin, destination, date))
+    offers = []
+    for _ in range(int(query.get("max", 3))):
+        airline = rng.choice(AIRLINES)
+        hours = rng.randint(2, 14)
+        stops = rng.choice([0, 0, 1])
+        hops = [origin] + (["HUB"] if stops else []) + [destination]
+        segments = [{
+            "departure": {"iataCode": hops[i], "at": f"{date}T{8 + 4 * i:02d}:00:00"},
+            "arrival": {"iataCode": hops[i + 1], "at": f"{date}T{10 + 4 * i:02d}:30:00"},
+            "carrierCode": airline,
+            "number": str(rng.randint(100, 999)),
+        } for i in range(len(hops) - 1)]
+        offers.append({
+            "itineraries": [{"duration": f"PT{hours}H{rng.choice([0, 15, 30, 45])}M", "segments": segments}],
+            "price": {"total": f"{rng.randint(120, 1400)}.00", "currency": "EUR"},
+        })
+    offers.sort(key=lambda offer: float(offer["price"]["total"]))
+    return _json(200, {"data": offers})
+
+
+def amadeus_hotel_list(query: dict, form: dict) -> tuple:
+    city = query.get("cityCode", "XXX")
+    count = 1 if city in SINGLE_HOTEL_CITIES else 60
+    return _json(200, {"data": [{"hotelId": f"{city}{i:05d}", "name": f"{city} Hotel {i}"} for i in range(count)]})
+
+
+def amadeus_hotel_offers(query: dict, form: dict) -> tuple:
+    hotel_ids = [h for h in query.get("hotelIds", "").split(",") if h]
+    checkin, checkout = query.get("checkInDate"), query.get("checkOutDate")
+    data = []
+    for hotel_id in hotel_ids:
+        rng = random.Random(_seed(hotel_id, checkin, checkout))
+        if hotel_id[:3] not in SINGLE_HOTEL_CITIES and rng.random() < 0.3:
+            continue  # Sold out for these dates
+        data.append({
+            "hotel": {"hotelId": hotel_id, "name": f"Hotel {hotel_id}"},
+            "offers": [{"checkInDate": checkin, "checkOutDate": checkout,
+                        "price": {"total": f"{rng.randint(60, 600)}.00", "currency": "EUR"}}],
+        })
+    return _json(200, {"data": data})
+
+
+# --------- NOMINATIM ----------
+def nominatim_search(query: dict, form: dict) -> tuple:
+    rng = random.Random(_seed(query.get("q", "").lower()))
+    return _json(200, [{"lat": f"{rng.uniform(-50, 60):.5f}", "lon": f"{rng.uniform(-120, 150):.5f}"}])
+
+
+# --------- OVERPASS ----------
+# Restaurants per square kilometre around every stand-in city centre (a dense old town),
+# scattered over OVERPASS_AREA_M around it
+OVERPASS_DENSITY = 100
+OVERPASS_AREA_M = 2000
+
+
+def overpass_interpreter(query: dict, form: dict) -> tuple:
+    """
+    CSV rows in the column order tools.OVERPASS_FIELDS asks for, capped by "out qt N".
+
+    Each place has a fixed set of restaurants; a query gets those within its radius in
+    storage order (not by distance), like the real API.
+    """
+    text = form.get("data", "")
+    around = re.search(r"around:([\d.]+),(-?[\d.]+),(-?[\d.]+)", text)
+    radius, lat, lon = (float(g) for g in around.groups()) if around else (1000.0, 0.0, 0.0)
+    cap = re.search(r"out\s+qt\s+(\d+)", text)
+    count = min(int(cap.group(1)) if cap else 500, 500)
+    rng = random.Random(_seed(round(lat, 3), round(lon, 3)))
+    metres_per_degree_lon = 111320.0 * max(math.cos(math.radians(lat)), 0.01)
+    rows = []
+    for i in range(int(OVERPASS_DENSITY * math.pi * (OVERPASS_AREA_M / 1000) ** 2)):
+        distance, bearing = OVERPASS_AREA_M * math.sqrt(rng.random()), rng.uniform(0, 2 * math.pi)
+        cuisine, street, number = rng.choice(CUISINES), rng.randint(1, 80), rng.randint(1, 200)
+        if distance > radius or len(rows) >= count:
+            continue
+        rows.append("\t".join([
+            f"{lat + distance * math.cos(bearing) / 111320.0:.6f}",
+            f"{lon + distance * math.sin(bearing) / metres_per_degree_lon:.6f}",
+            f"Restaurant {i}", cuisine, "", f"Street {street}", str(number),
+        ]))
+    return 200, "text/csv", ("\n".join(rows) + "\n").encode("utf-8")
+
+
+SERVICES = {
+    "amadeus": {
+        ("POST", "/v1/security/oauth2/token"): amadeus_token,
+        ("GET", "/v2/shopping/flight-offers"): amadeus_flight_offers,
+        ("GET", "/v1/reference-data/locations/hotels/by-city"): amadeus_hotel_list,
+        ("GET", "/v3/shopping/hotel-offers"): amadeus_hotel_offers,
+    },
+    "nominatim": {("GET", "/search"): nominatim_search},
+    "overpass": {("POST", "/api/interpreter"): overpass_interpreter},
+}
+# What an injected failure looks like for each service
+ERROR_STATUS = {"amadeus": 500, "nominatim": 503, "overpass": 429}
+
+
+class StubService:
+    """One stand-in API on a local port with injected latency (ms) and error rate (0-1)."""
+
+    def __init__(self, name: str, latency_ms: float = 0, jitter_ms: float = 0, error_rate: float = 0.0,
+                 seed: int = 0):
+        self.name = name
+        self.routes = SERVICES[name]
+        self.latency_ms, self.jitter_ms, self.error_rate = latency_ms, jitter_ms, error_rate
+        self.counts, self.errors = {}, 0
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._server = None
+
+    def _decide(self, path: str):
+        """Counts the call; returns (delay in seconds, whether to fail it)."""
+        with self._lock:
+            self.counts[path] = self.counts.get(path, 0) + 1
+            delay = max(0.0, self.latency_ms + self._rng.uniform(-self.jitter_ms, self.jitter_ms)) / 1000
+            fail = self._rng.random() < self.error_rate
+            if fail:
+                self.errors += 1
+        return delay, fail
+
+    def handle(self, method: str, raw_path: str, body: bytes) -> tuple:
+        url = urlparse(raw_path)
+        handler = self.routes.get((method, url.path))
+        if handler is None:
+            return _json(404, {"error": f"no stub for {method} {url.path}"})
+        delay, fail = self._decide(url.path)
+        time.sleep(delay)
+        if fail:
+            return _json(ERROR_STATUS[self.name], {"errors": [{"title": "injected failure"}]})
+        query = {k: v[0] for k, v in parse_qs(url.query).items()}
+        form = {k: v[0] for k, v in parse_qs(body.decode("utf-8", "replace")).items()}
+        return handler(query, form)
+
+    def start(self) -> str:
+        """Starts serving on a free port; returns the base URL."""
+        service = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def _respond(self, method):
+                body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+                status, content_type, payload = service.handle(method, self.path, body)
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def do_GET(self):
+                self._respond("GET")
+
+            def do_POST(self):
+                self._respond("POST")
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, name=f"stub-{self.name}", daemon=True).start()
+        return f"http://127.0.0.1:{self._server.server_address[1]}"
+
+    def stop(self):
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {"calls": dict(self.counts), "injected_errors": self.errors}
@@ -0,0 +1,37 @@
+"""
+Builds data/climate_normals.bin from monthly normals TSVs.
+
+Each TSV has the columns name, country, metric, jan ... dec, with one row per
+city and metric: tmax and tmin (mean daily high/low, °C) and precip (mm).
+Lines starting with '#' are comments.
+
+The bundled data/climate_normals.tsv covers the hand-curated cities. Its
+values are rounded approximations compiled by hand from published long-term
+station averages; they don't come from a single dataset or a stated reference
+period (its header says so too), so treat them as indicative. For traceable
+numbers, convert the WMO 1991-2020 Climatological Standard Normals or
+NOAA's 1991-2020 U.S. Climate Normals to this layout and pass them after
+the bundled file; later files win, city by city. Cities must exist in the gazetteer,
+so rebuild after build_gazetteer.py:
+
+    python build_climate.py
+    python build_climate.py data/climate_normals.tsv wmo_normals.tsv
+"""
+from climate import CLIMATE_PATH, CLIMATE_SOURCE_PATH, compile_normals
+import argparse, os
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("sources", nargs="*", default=[CLIMATE_SOURCE_PATH], help="Normals TSV files")
+    parser.add_argument("-o", "--output", default=CLIMATE_PATH, help="Binary normals file")
+    args = parser.parse_args()
+
+    written, skipped = compile_normals(args.sources, args.output)
+    for name in skipped:
+        print(f"not in the gazetteer or incomplete, skipped: {name}")
+    print(f"Wrote normals for {written} cities to {args.output} ({os.path.getsize(args.output)} bytes)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+"""
+Builds data/cities.tsv from a GeoNames cities extract.
+
+Download e.g. https://download.geonames.org/export/dump/cities15000.zip, unzip
+it, then run:
+
+    python build_gazetteer.py cities15000.txt
+
+The same extract as JSON, as packaged in the geonamescache distribution
+(geonamescache/data/cities15000.json), works too:
+
+    python build_gazetteer.py cities15000.json
+
+Rows already in data/cities.tsv (the hand-curated ones with airport and IATA
+city codes) are kept and take precedence; GeoNames adds every other city with
+its coordinates, population and ASCII alternate names.
+
+The bundled data/cities.tsv is the hand-curated rows plus GeoNames cities15000
+(every city with at least 15,000 inhabitants), taken from geonamescache 3.0.2.
+GeoNames data is licensed under CC BY 4.0 (https://www.geonames.org/,
+https://creativecommons.org/licenses/by/4.0/); see data/SOURCES.md.
+"""
+from gazetteer import FIELDS, GAZETTEER_PATH, normalize
+import argparse, json, os, unicodedata
+
+# Column positions in the GeoNames "geoname" table
+GEONAMES_NAME, GEONAMES_ASCII, GEONAMES_ALTERNATES = 1, 2, 3
+GEONAMES_LAT, GEONAMES_LON, GEONAMES_COUNTRY, GEONAMES_POPULATION = 4, 5, 8, 14
+MAX_ALIASES = 8
+
+
+def read_curated(path: str) -> list:
+    if not os.path.exists(path):
+        return []
+    with open(path, encoding="utf-8") as f:
+        header = f.readline().rstrip("\n").split("\t")
+        return [dict(zip(header, line.rstrip("\n").split("\t"))) for line in f if line.strip()]
+
+
+def geonames_row(name: str, ascii_name: str, alternates: list, lat, lon, country: str, population: int) -> dict:
+    name_key = normalize(ascii_name or name)
+    # Keep short, ASCII-foldable alternates; GeoNames lists dozens of scripts per city
+    aliases = []
+    for alias in [name] + alternates:
+        key = normalize(alias)
+        if key and key != name_key and alias.isascii() and key not in aliases:
+            aliases.append(key)
+    return {
+        "name": ascii_name or name,
+        "country": country,
+        "lat": f"{float(lat):.4f}",
+        "lon": f"{float(lon):.4f}",
+        "airport": "",
+        "city_code": "",
+        "aliases": ",".join(aliases[:MAX_ALIASES]),
+        "population": str(population),
+    }
+
+
+def read_geonames(path: str, min_population: int) -> list:
+    rows = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            cols = line.rstrip("\n").split("\t")
+            if len(cols) <= GEONAMES_POPULATION:
+                continue
+            population = int(cols[GEONAMES_POPULATION] or 0)
+            if population < min_population:
+                continue
+            rows.append(geonames_row(cols[GEONAMES_NAME], cols[GEONAMES_ASCII], cols[GEONAMES_ALTERNATES].split(","),
+                                     cols[GEONAMES_LAT], cols[GEONAMES_LON], cols[GEONAMES_COUNTRY], population))
+    return rows
+
+
+def ascii_fold(name: str) -> str:
+    """'São Paulo' -> 'Sao Paulo', like the asciiname column the JSON packaging drops."""
+    folded = unicodedata.normalize("NFKD", name)
+    return "".join(ch for ch in folded if not unicodedata.combining(ch)).encode("ascii", "ignore").decode().strip()
+
+
+def read_geonames_json(path: str, min_population: int) -> list:
+    """The same cities from geonamescache's JSON ({geonameid: {name, latitude, ...}})."""
+    with open(path, encoding="utf-8") as f:
+        cities = json.load(f)
+    rows = []
+    for city in sorted(cities.values(), key=lambda city: city["geonameid"]):
+        if (city.get("population") or 0) < min_population:
+            continue
+        rows.append(geonames_row(city["name"], ascii_fold(city["name"]), city.get("alternatenames") or [],
+                                 city["latitude"], city["longitude"], city["countrycode"], city["population"]))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("geonames", help="GeoNames cities file (e.g. cities15000.txt or geonamescache's cities15000.json)")
+    parser.add_argument("-o", "--output", default=GAZETTEER_PATH, help="Gazetteer TSV to write")
+    parser.add_argument("--min-population", type=int, default=15000)
+    args = parser.parse_args()
+
+    curated = read_curated(args.output)
+    seen = {(normalize(row["name"]), row["country"]) for row in curated}
+    read = read_geonames_json if args.geonames.endswith(".json") else read_geonames
+    added = [row for row in read(args.geonames, args.min_population)
+             if (normalize(row["name"]), row["country"]) not in seen]
+
+    with open(args.output, "w", encoding="utf-8") as f:
+        f.write("\t".join(FIELDS) + "\n")
+        for row in curated + added:
+            f.write("\t".join(row.get(field, "") for field in FIELDS) + "\n")
+    print(f"Wrote {len(curated) + len(added)} cities ({len(added)} from GeoNames) to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""
+Builds the local restaurant index used by get_restaurants_data.
+
+Inputs are OSM extracts, either Overpass JSON, e.g. the output of
+
+    [out:json];
+    area["name"="Paris"]->.a;
+    node["amenity"="restaurant"](area.a);
+    out body;
+
+or .osm.pbf files (needs the optional `osmium` package, e.g. from
+https://download.geofabrik.de/). Every extract's bounding box is recorded as
+covered; lookups outside all of them still go to Overpass.
+
+    python build_restaurant_index.py paris.json berlin-latest.osm.pbf
+"""
+from restaurant_index import RESTAURANT_INDEX_DIR, cell_ids
+import argparse, json, os
+import numpy as np
+
+DEFAULT_CELL_SIZE = 0.01  # degrees, roughly 1 km
+
+
+def restaurant_record(tags: dict) -> dict:
+    """The fields get_restaurants_data returns, taken from an OSM tag dict."""
+    return {
+        "name": tags.get("name", "Unnamed Restaurant"),
+        "cuisine": tags.get("cuisine", "Unknown"),
+        "address": tags.get("addr:full") or f"{tags.get('addr:street', '')} {tags.get('addr:housenumber', '')}".strip(),
+    }
+
+
+def read_overpass_json(path: str):
+    with open(path, encoding="utf-8") as f:
+        data = json.load(f)
+    for element in data.get("elements", []):
+        tags = element.get("tags", {})
+        lat = element.get("lat", element.get("center", {}).get("lat"))
+        lon = element.get("lon", element.get("center", {}).get("lon"))
+        if tags.get("amenity") == "restaurant" and lat is not None and lon is not None:
+            yield lat, lon, restaurant_record(tags)
+
+
+def read_pbf(path: str):
+    try:
+        import osmium
+    except ImportError:
+        raise SystemExit("Reading .pbf extracts needs the 'osmium' package: pip install osmium")
+
+    points = []
+
+    class Handler(osmium.SimpleHandler):
+        def node(self, node):
+            if node.tags.get("amenity") == "restaurant" and node.location.valid():
+                tags = {tag.k: tag.v for tag in node.tags}
+                points.append((node.location.lat, node.location.lon, restaurant_record(tags)))
+
+    Handler().apply_file(path)
+    return points
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("extracts", nargs="+", help="Overpass JSON or .osm.pbf files")
+    parser.add_argument("-o", "--output", default=RESTAURANT_INDEX_DIR, help="Index directory")
+    parser.add_argument("--cell-size", type=float, default=DEFAULT_CELL_SIZE, help="Grid cell size in degrees")
+    args = parser.parse_args()
+
+    lats, lons, records, bboxes = [], [], [], []
+    for path in args.extracts:
+        points = list(read_pbf(path) if path.endswith(".pbf") else read_overpass_json(path))
+        if not points:
+            print(f"{path}: no restaurants, skipped")
+            continue
+        extract_lats = [p[0] for p in points]
+        extract_lons = [p[1] for p in points]
+        bboxes.append([min(extract_lats), min(extract_lons), max(extract_lats), max(extract_lons)])
+        lats += extract_lats
+        lons += extract_lons
+        records += [p[2] for p in points]
+        print(f"{path}: {len(points)} restaurants")
+
+    cells = cell_ids(lats, lons, args.cell_size)
+    order = np.argsort(cells, kind="stable")
+    coords = np.column_stack([np.asarray(lats, dtype=np.float32), np.asarray(lons, dtype=np.float32)])
+
+    os.makedirs(args.output, exist_ok=True)
+    offsets = [0]
+    with open(os.path.join(args.output, "records.jsonl"), "wb") as f:
+        for i in order:
+            line = json.dumps(records[i], ensure_ascii=False, separators=(",", ":")).encode("utf-8") + b"\n"
+            f.write(line)
+            offsets.append(offsets[-1] + len(line))
+    np.save(os.path.join(args.output, "cells.npy"), cells[order])
+    np.save(os.path.join(args.output, "coords.npy"), coords[order].reshape(-1, 2))
+    np.save(os.path.join(args.output, "offsets.npy"), np.asarray(offsets, dtype=np.int64))
+    with open(os.path.join(args.output, "meta.json"), "w", encoding="utf-8") as f:
+        json.dump({"cell_size": args.cell_size, "count": len(records), "bboxes": bboxes,
+                   "sources": [os.path.basename(p) for p in args.extracts]}, f, indent=2)
+    print(f"Indexed {len(records)} restaurants into {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,204 @@
+"""
+TTL + LRU caches for external lookups.
+
+Two interchangeable backends:
+  - "memory": an in-process OrderedDict, fastest but private to one worker.
+  - "sqlite": a single on-disk SQLite file shared by every worker process.
+
+Values must be JSON-serializable. `get` returns None on a miss, so never cache None.
+
+`single_flight` complements the caches for concurrent callers: identical async
+lookups that are already in flight on the same event loop share one call
+instead of all missing the cache at once.
+"""
+from collections import OrderedDict
+import asyncio, functools, json, os, sqlite3, threading, time
+
+CACHE_BACKEND = os.getenv("PLANNER_CACHE_BACKEND", "sqlite").lower()
+CACHE_DIR = os.getenv(
+    "PLANNER_CACHE_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache"),
+)
+
+_registry = {}
+_registry_lock = threading.Lock()
+_inflight = {}
+_inflight_stats = {}
+_inflight_lock = threading.Lock()
+
+
+def _encode_key(key) -> str:
+    return json.dumps(list(key) if isinstance(key, tuple) else key, separators=(",", ":"))
+
+
+class MemoryCache:
+    """In-process cache with a TTL and an LRU size bound."""
+
+    def __init__(self, name: str, ttl: float = None, maxsize: int = 1024):
+        self.name = name
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_entry(self, key):
+        """Returns (value, stored_at) or None if missing or expired."""
+        key = _encode_key(key)
+        with self._lock:
+            entry = self._data.get(key)
+            if entry and self.ttl and time.time() - entry[1] > self.ttl:
+                del self._data[key]
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def get(self, key):
+        entry = self.get_entry(key)
+        return entry[0] if entry else None
+
+    def set(self, key, value):
+        key = _encode_key(key)
+        with self._lock:
+            self._data[key] = (value, time.time())
+            self._data.move_to_end(key)
+            while self.maxsize and len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(_encode_key(key), None)
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "backend": "memory",
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0,
+            "size": len(self),
+        }
+
+
+class SQLiteCache(MemoryCache):
+    """On-disk cache shared across processes; same interface as MemoryCache."""
+
+    def __init__(self, name: str, ttl: float = None, maxsize: int = 1024, path: str = None):
+        super().__init__(name, ttl, maxsize)
+        self.path = path or os.path.join(CACHE_DIR, "planner_cache.sqlite3")
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self._conn = sqlite3.connect(self.path, timeout=10, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS cache ("
+            " namespace TEXT NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL,"
+            " stored_at REAL NOT NULL, accessed_at REAL NOT NULL,"
+            " PRIMARY KEY (namespace, key))"
+        )
+
+    def get_entry(self, key):
+        key = _encode_key(key)
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, stored_at FROM cache WHERE namespace = ? AND key = ?",
+                (self.name, key),
+            ).fetchone()
+            if row and self.ttl and now - row[1] > self.ttl:
+                self._conn.execute("DELETE FROM cache WHERE namespace = ? AND key = ?", (self.name, key))
+                row = None
+            if row is None:
+                self.misses += 1
+                return None
+            self._conn.execute(
+                "UPDATE cache SET accessed_at = ? WHERE namespace = ? AND key = ?",
+                (now, self.name, key),
+            )
+            self.hits += 1
+            return json.loads(row[0]), row[1]
+
+    def set(self, key, value):
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO cache (namespace, key, value, stored_at, accessed_at) VALUES (?, ?, ?, ?, ?)",
+                (self.name, _encode_key(key), json.dumps(value, separators=(",", ":")), now, now),
+            )
+            if self.maxsize:
+                self._conn.execute(
+                    "DELETE FROM cache WHERE namespace = ? AND key IN ("
+                    " SELECT key FROM cache WHERE namespace = ? ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+                    (self.name, self.name, self.maxsize),
+                )
+
+    def delete(self, key):
+        with self._lock:
+            self._conn.execute("DELETE FROM cache WHERE namespace = ? AND key = ?", (self.name, _encode_key(key)))
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM cache WHERE namespace = ?", (self.name,)).fetchone()[0]
+
+    def stats(self) -> dict:
+        return {**super().stats(), "backend": "sqlite"}
+
+
+def make_cache(name: str, ttl: float = None, maxsize: int = 1024, backend: str = None):
+    """Returns the named cache, creating it with the configured backend on first use."""
+    with _registry_lock:
+        if name not in _registry:
+            backend = (backend or CACHE_BACKEND).lower()
+            cache_class = SQLiteCache if backend == "sqlite" else MemoryCache
+            _registry[name] = cache_class(name, ttl=ttl, maxsize=maxsize)
+        return _registry[name]
+
+
+def cache_stats() -> dict:
+    """Hit/miss counters for every cache created in this process."""
+    with _registry_lock:
+        caches = list(_registry.values())
+    return {cache.name: cache.stats() for cache in caches}
+
+
+def single_flight(name: str):
+    """
+    Decorator for async lookups: concurrent calls with the same arguments on one
+    event loop await a single execution. Only in-flight calls are shared; results
+    are not kept once the call finishes (that is what the caches are for).
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            key = (name, asyncio.get_running_loop(), repr((args, sorted(kwargs.items()))))
+            with _inflight_lock:
+                stats = _inflight_stats.setdefault(name, {"calls": 0, "coalesced": 0})
+                stats["calls"] += 1
+                task = _inflight.get(key)
+                if task is None:
+                    task = _inflight[key] = asyncio.ensure_future(func(*args, **kwargs))
+                    task.add_done_callback(lambda _: _forget(key))
+                else:
+                    stats["coalesced"] += 1
+            # A cancelled caller must not cancel the call the others are waiting on
+            return await asyncio.shield(task)
+        return wrapper
+    return decorator
+
+
+def _forget(key):
+    with _inflight_lock:
+        _inflight.pop(key, None)
+
+
+def single_flight_stats() -> dict:
+    """How many lookups per name were coalesced into an already running identical call."""
+    with _inflight_lock:
+        return {name: dict(stats) for name, stats in _inflight_stats.items()}
@@ -0,0 +1,212 @@
+"""
+Monthly climate normals for the gazetteer's cities.
+
+data/climate_normals.tsv holds long-term monthly averages per city (mean daily
+high and low in °C, precipitation in mm; see its header for where the values
+come from); build_climate.py compiles it into
+data/climate_normals.bin, a flat little-endian float32 array laid out as
+[gazetteer row][month][metric] behind a small header. The file is
+memory-mapped and read through a memoryview, so loading costs one mmap and a
+lookup is an offset computation. Daylight is computed from latitude.
+
+The array is indexed by gazetteer row id. Its header carries a fingerprint of
+the rows it was built against; if the gazetteer has changed since (e.g.
+build_gazetteer.py reordered it), the TSV is recompiled into the cache
+directory on first use.
+"""
+from cache import CACHE_DIR
+from gazetteer import find_city, load as load_gazetteer, normalize
+from array import array
+from collections import namedtuple
+from datetime import date as Date, datetime, timedelta
+from functools import lru_cache
+import hashlib, math, mmap, os, struct, sys
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+CLIMATE_SOURCE_PATH = os.getenv("PLANNER_CLIMATE_SOURCE", os.path.join(DATA_DIR, "climate_normals.tsv"))
+CLIMATE_PATH = os.getenv("PLANNER_CLIMATE_PATH", os.path.join(DATA_DIR, "climate_normals.bin"))
+
+METRICS = ["tmax", "tmin", "precip"]
+MONTHS = 12
+# magic, format version, metrics per month, cities, gazetteer fingerprint
+HEADER = struct.Struct("<4sHHI16s")
+MAGIC, VERSION = b"CLIM", 1
+
+Normal = namedtuple("Normal", ["high", "low", "precip"])
+
+
+def fingerprint(gazetteer, count: int) -> bytes:
+    """Digest of the first `count` gazetteer rows; changes whenever their ids would."""
+    digest = hashlib.blake2b(digest_size=16)
+    for row_id in range(min(count, len(gazetteer))):
+        digest.update(f"{gazetteer.names[row_id]}\t{gazetteer.countries[row_id]}\n".encode("utf-8"))
+    return digest.digest()
+
+
+def read_normals(path: str) -> dict:
+    """{(normalized name, country): {metric: [12 monthly values]}} from a normals TSV ('#' lines are comments)."""
+    normals = {}
+    with open(path, encoding="utf-8") as f:
+        lines = (line.rstrip("\n") for line in f if line.strip() and not line.startswith("#"))
+        header = next(lines, "").split("\t")
+        for line in lines:
+            row = dict(zip(header, line.split("\t")))
+            if row.get("metric") not in METRICS:
+                continue
+            values = [float(row[month]) for month in header[3:3 + MONTHS]]
+            normals.setdefault((normalize(row["name"]), row["country"]), {})[row["metric"]] = values
+    return normals
+
+
+def compile_normals(sources: list, output: str, gazetteer=None) -> tuple:
+    """
+    Writes the binary normals for every source row found in the gazetteer.
+
+    Later sources override earlier ones for the same city. Returns
+    (cities written, [names not in the gazetteer or missing a metric]).
+    """
+    gazetteer = gazetteer or load_gazetteer()
+    normals = {}
+    for path in sources:
+        normals.update(read_normals(path))
+
+    rows, skipped = {}, []
+    for (key, country), metrics in normals.items():
+        row_id = gazetteer.lookup(key)
+        if row_id is None or gazetteer.countries[row_id] != country or set(metrics) != set(METRICS):
+            skipped.append(f"{key} ({country})")
+            continue
+        rows[row_id] = metrics
+
+    count = max(rows) + 1 if rows else 0
+    values = array("f", [math.nan]) * (count * MONTHS * len(METRICS))
+    for row_id, metrics in rows.items():
+        for month in range(MONTHS):
+            base = (row_id * MONTHS + month) * len(METRICS)
+            for i, metric in enumerate(METRICS):
+                values[base + i] = metrics[metric][month]
+    if sys.byteorder == "big":
+        values.byteswap()
+
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    tmp = f"{output}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(HEADER.pack(MAGIC, VERSION, len(METRICS), count, fingerprint(gazetteer, count)))
+        f.write(values.tobytes())
+    os.replace(tmp, output)
+    return len(rows), sorted(skipped)
+
+
+class ClimateNormals:
+    """Read-only, memory-mapped normals array."""
+
+    def __init__(self, path: str):
+        with open(path, "rb") as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, metrics, self.count, self.fingerprint = HEADER.unpack_from(self._map)
+        if magic != MAGIC or version != VERSION or metrics != len(METRICS):
+            raise ValueError(f"{path} is not a version {VERSION} climate normals file")
+        view = memoryview(self._map)[HEADER.size:HEADER.size + self.count * MONTHS * metrics * 4]
+        if sys.byteorder == "big":
+            self.values = array("f", bytes(view))
+            self.values.byteswap()
+        else:
+            self.values = view.cast("f")
+
+    def __len__(self):
+        return self.count
+
+    def month(self, row_id: int, month: int):
+        """Normal for a gazetteer row and month (1-12), or None if the city has no data."""
+        if not 0 <= row_id < self.count:
+            return None
+        base = (row_id * MONTHS + month - 1) * len(METRICS)
+        high, low, precip = self.values[base:base + len(METRICS)]
+        return None if math.isnan(high) else Normal(high, low, precip)
+
+
+@lru_cache(maxsize=1)
+def load():
+    """The normals matching the current gazetteer, recompiling a stale file; None without data."""
+    gazetteer = load_gazetteer()
+    rebuilt = os.path.join(CACHE_DIR, "climate_normals.bin")
+    for path in (CLIMATE_PATH, rebuilt):
+        if os.path.exists(path):
+            normals = ClimateNormals(path)
+            if normals.fingerprint == fingerprint(gazetteer, normals.count):
+                return normals
+    if not os.path.exists(CLIMATE_SOURCE_PATH):
+        return None
+    compile_normals([CLIMATE_SOURCE_PATH], rebuilt, gazetteer)
+    return ClimateNormals(rebuilt)
+
+
+def daylight_hours(lat: float, day: Date) -> float:
+    """Hours between sunrise and sunset at a latitude on a given day (polar day/night clamp)."""
+    day_of_year = day.timetuple().tm_yday
+    declination = math.radians(23.44) * math.sin(2 * math.pi * (284 + day_of_year) / 365)
+    phi = math.radians(lat)
+    # Sunrise is when the sun's centre is 0.833° below the horizon (refraction plus its radius)
+    cos_hour_angle = ((math.sin(math.radians(-0.833)) - math.sin(phi) * math.sin(declination))
+                      / (math.cos(phi) * math.cos(declination)))
+    return 24 * math.acos(max(-1.0, min(1.0, cos_hour_angle))) / math.pi
+
+
+def trip_months(start: str, end: str = "", days: int = 0) -> list:
+    """Calendar months (as dates on the 15th) a trip touches, in order."""
+    first = datetime.strptime(start, "%Y-%m-%d").date()
+    last = datetime.strptime(end, "%Y-%m-%d").date() if end else first + timedelta(days=max(days - 1, 0))
+    months, current = [], first.replace(day=15)
+    while current <= last.replace(day=15) and len(months) < MONTHS:
+        months.append(current)
+        current = (current + timedelta(days=31)).replace(day=15)
+    return months
+
+
+def packing_tips(normals: list) -> list:
+    """A few clothing hints from the coldest, hottest and wettest month of the trip."""
+    low = min(n.low for n in normals)
+    high = max(n.high for n in normals)
+    precip = max(n.precip for n in normals)
+    tips = []
+    if low < 5:
+        tips.append("a warm coat, hat and gloves")
+    elif low < 14:
+        tips.append("a jacket or sweater for the evenings")
+    if high >= 28:
+        tips.append("light, breathable clothes and sun protection")
+    if precip >= 100:
+        tips.append("a rain jacket or umbrella")
+    elif precip >= 50:
+        tips.append("a compact umbrella")
+    return tips
+
+
+def climate_report(city_name: str, start: str, end: str = "", days: int = 0):
+    """
+    Typical weather for a trip from the bundled normals.
+
+    Returns:
+        A short readable summary, or None when the city or its normals are unknown
+        (the caller then falls back to the LLM).
+    """
+    city = find_city(city_name, fuzzy=True)
+    normals = load()
+    if city is None or normals is None or not start:
+        return None
+    months = trip_months(start, end, days)
+    monthly = [normals.month(city.row_id, month.month) for month in months]
+    if not months or None in monthly:
+        return None
+
+    lines = [f"🌤 Typical weather in {city.name} (long-term monthly averages, not a forecast):"]
+    for month, normal in zip(months, monthly):
+        lines.append(
+            f"• {month.strftime('%B')}: highs around {normal.high:.0f}°C, lows around {normal.low:.0f}°C, "
+            f"{normal.precip:.0f} mm of rain, about {daylight_hours(city.lat, month):.1f} h of daylight"
+        )
+    tips = packing_tips(monthly)
+    if tips:
+        pack = tips[0] if len(tips) == 1 else ", ".join(tips[:-1]) + " and " + tips[-1]
+        lines.append(f"🧳 Pack {pack}.")
+    return "\n".join(lines)
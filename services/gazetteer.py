@@ -0,0 +1,149 @@
+"""
+Offline city gazetteer.
+
+Loads data/cities.tsv (bundled; rebuild or extend it from a GeoNames extract
+with build_gazetteer.py) into parallel arrays plus a normalized name/alias ->
+row index, so lookups are a dict hit instead of a geocoding request.
+"""
+from array import array
+from collections import namedtuple
+from difflib import get_close_matches
+from functools import lru_cache
+import os, re, unicodedata
+
+GAZETTEER_PATH = os.getenv(
+    "PLANNER_GAZETTEER_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "cities.tsv"),
+)
+FIELDS = ["name", "country", "lat", "lon", "airport", "city_code", "aliases", "population"]
+# How similar a misspelt name has to be to a known one (difflib ratio)
+FUZZY_CUTOFF = float(os.getenv("PLANNER_GAZETTEER_FUZZY_CUTOFF", "0.85"))
+
+# Everyday words that are also place names somewhere; never matched on their own in free text
+TEXT_STOPWORDS = {
+    "a", "an", "the", "to", "from", "for", "in", "on", "of", "at", "by", "and", "or", "with", "via",
+    "plan", "trip", "tour", "day", "days", "week", "weeks", "night", "nights", "my", "me", "we", "i",
+    "visit", "until", "till", "next", "this", "people", "adults", "hotel", "flight", "stay", "best",
+}
+
+_TOKEN = re.compile(r"[A-Za-z0-9]+")
+
+# row_id is the city's position in the loaded gazetteer; per-city arrays (climate.py) are indexed by it
+City = namedtuple("City", ["name", "country", "lat", "lon", "airport", "city_code", "row_id"])
+
+
+def tokenize(text: str) -> list:
+    """Splits text into accent-free alphanumeric tokens, keeping their case."""
+    text = text or ""
+    if not text.isascii():
+        # Loading the GeoNames rows calls this for every alias; most are plain ASCII already
+        text = unicodedata.normalize("NFKD", text)
+        text = "".join(ch for ch in text if not unicodedata.combining(ch))
+    return _TOKEN.findall(text)
+
+
+def normalize(name: str) -> str:
+    """Lower-cases, strips accents and punctuation so 'São Paulo' matches 'sao paulo'."""
+    return " ".join(tokenize(name)).lower()
+
+
+class Gazetteer:
+    """Column-oriented city table with an exact and a fuzzy name index."""
+
+    def __init__(self, path: str):
+        self.names, self.countries, self.airports, self.city_codes = [], [], [], []
+        self.lats, self.lons = array("d"), array("d")
+        self.keys = {}
+        self._buckets = {}
+
+        rows = []
+        with open(path, encoding="utf-8") as f:
+            header = f.readline().rstrip("\n").split("\t")
+            for line in f:
+                row = dict(zip(header, line.rstrip("\n").split("\t")))
+                rows.append(row)
+        # When two places share a name the most populous one wins; hand-curated rows
+        # (the ones carrying IATA codes) win over everything else.
+        rows.sort(key=lambda row: (not row.get("airport"), -int(row.get("population") or 0)))
+
+        for row_id, row in enumerate(rows):
+            self.names.append(row["name"])
+            self.countries.append(row["country"])
+            self.airports.append(row.get("airport", ""))
+            self.city_codes.append(row.get("city_code", ""))
+            self.lats.append(float(row["lat"]))
+            self.lons.append(float(row["lon"]))
+            for alias in [row["name"]] + (row.get("aliases") or "").split(","):
+                key = normalize(alias)
+                if key and key not in self.keys:
+                    self.keys[key] = row_id
+                    self._buckets.setdefault(key[:1], []).append(key)
+
+    def __len__(self):
+        return len(self.names)
+
+    def city(self, row_id: int) -> City:
+        return City(
+            self.names[row_id], self.countries[row_id], self.lats[row_id], self.lons[row_id],
+            self.airports[row_id], self.city_codes[row_id], row_id,
+        )
+
+    def lookup(self, key: str):
+        """Exact lookup of an already-normalized name; returns a row id or None."""
+        return self.keys.get(key)
+
+    def fuzzy_lookup(self, key: str):
+        """Closest known name sharing the first letter and of similar length; row id or None."""
+        candidates = [k for k in self._buckets.get(key[:1], []) if abs(len(k) - len(key)) <= 2]
+        match = get_close_matches(key, candidates, n=1, cutoff=FUZZY_CUTOFF)
+        return self.keys[match[0]] if match else None
+
+
+@lru_cache(maxsize=1)
+def load() -> Gazetteer:
+    """Loads the bundled gazetteer once per process."""
+    return Gazetteer(GAZETTEER_PATH)
+
+
+def find_city(name: str, fuzzy: bool = False):
+    """Returns the City for a name or alias (optionally tolerating typos), or None."""
+    key = normalize(name)
+    if not key:
+        return None
+    gazetteer = load()
+    row_id = gazetteer.lookup(key)
+    if row_id is None and fuzzy:
+        row_id = gazetteer.fuzzy_lookup(key)
+    return gazetteer.city(row_id) if row_id is not None else None
+
+
+def find_cities_in_text(text: str, max_words: int = 3) -> list:
+    """
+    Scans free text for known city names (longest match first). Cities without an
+    airport (the GeoNames rows) only match when capitalized in the text.
+
+    Returns:
+        A list of (word_position, City, matched_text) tuples in the order they appear,
+        where matched_text keeps the caller's capitalization.
+    """
+    tokens = tokenize(text)
+    words = [token.lower() for token in tokens]
+    gazetteer = load()
+    found = []
+    i = 0
+    while i < len(words):
+        for size in range(min(max_words, len(words) - i), 0, -1):
+            key = " ".join(words[i:i + size])
+            if size == 1 and key in TEXT_STOPWORDS:
+                continue
+            row_id = gazetteer.lookup(key)
+            # GeoNames rows include towns called "See" or "Mobile"; only a capitalized name counts for them
+            if row_id is not None and not gazetteer.airports[row_id] and not tokens[i][:1].isupper():
+                row_id = None
+            if row_id is not None:
+                found.append((i, gazetteer.city(row_id), " ".join(tokens[i:i + size])))
+                i += size
+                break
+        else:
+            i += 1
+    return found
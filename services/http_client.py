@@ -0,0 +1,54 @@
+"""
+Shared HTTP clients for the external APIs used in tools.py.
+
+Every event loop gets one pooled httpx.AsyncClient (keep-alive, per-host
+connection reuse, bounded pool). Synchronous callers go through run_sync(),
+which executes the coroutine on a single long-lived background loop so they
+share that loop's connection pool as well.
+"""
+import asyncio, os, threading, weakref
+import httpx
+
+HTTP_TIMEOUT = float(os.getenv("PLANNER_HTTP_TIMEOUT", "30"))
+HTTP_CONNECT_TIMEOUT = float(os.getenv("PLANNER_HTTP_CONNECT_TIMEOUT", "10"))
+HTTP_MAX_CONNECTIONS = int(os.getenv("PLANNER_HTTP_MAX_CONNECTIONS", "100"))
+HTTP_MAX_KEEPALIVE = int(os.getenv("PLANNER_HTTP_MAX_KEEPALIVE", "20"))
+HTTP_KEEPALIVE_EXPIRY = float(os.getenv("PLANNER_HTTP_KEEPALIVE_EXPIRY", "30"))
+USER_AGENT = os.getenv("PLANNER_USER_AGENT", "itinerary-planner")
+
+_clients = weakref.WeakKeyDictionary()
+_background_loop = None
+_background_lock = threading.Lock()
+
+
+def get_async_client() -> httpx.AsyncClient:
+    """Returns the pooled client bound to the running event loop."""
+    loop = asyncio.get_running_loop()
+    client = _clients.get(loop)
+    if client is None or client.is_closed:
+        client = httpx.AsyncClient(
+            timeout=httpx.Timeout(HTTP_TIMEOUT, connect=HTTP_CONNECT_TIMEOUT),
+            limits=httpx.Limits(
+                max_connections=HTTP_MAX_CONNECTIONS,
+                max_keepalive_connections=HTTP_MAX_KEEPALIVE,
+                keepalive_expiry=HTTP_KEEPALIVE_EXPIRY,
+            ),
+            headers={"User-Agent": USER_AGENT},
+        )
+        _clients[loop] = client
+    return client
+
+
+def get_background_loop() -> asyncio.AbstractEventLoop:
+    """Starts (once) and returns the loop that serves synchronous callers."""
+    global _background_loop
+    with _background_lock:
+        if _background_loop is None:
+            _background_loop = asyncio.new_event_loop()
+            threading.Thread(target=_background_loop.run_forever, name="planner-http", daemon=True).start()
+    return _background_loop
+
+
+def run_sync(coro):
+    """Runs a coroutine on the shared background loop and blocks until it finishes."""
+    return asyncio.run_coroutine_threadsafe(coro, get_background_loop()).result()
@@ -0,0 +1,91 @@
+"""
+Cold-start budget for the planner modules.
+
+Imports each module in fresh interpreters under `python -X importtime`, takes
+the median cumulative import time and compares it with import_budget.json.
+The check also fails if a module imports something it is supposed to defer
+(the model SDKs, numpy, ...), which is usually how a regression starts.
+
+    python import_budget.py            # check; exits 1 on a regression
+    python import_budget.py --record   # re-measure and rewrite the budget
+    python import_budget.py --top 10   # also list the slowest imports
+"""
+import argparse, json, os, statistics, subprocess, sys
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+BUDGET_PATH = os.path.join(HERE, "import_budget.json")
+# Recorded budgets leave this much room over the measured median
+HEADROOM = 0.5
+
+
+def measure(module: str) -> dict:
+    """One cold import: {imported module: cumulative microseconds}."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=HERE, capture_output=True, text=True,
+    )
+    if result.returncode:
+        raise SystemExit(f"import {module} failed:\n{result.stderr[-2000:]}")
+    timings = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line.split("|", 2)
+        if cumulative.strip().isdigit():
+            timings[name.strip()] = int(cumulative)
+    return timings
+
+
+def profile(module: str, runs: int):
+    """Median cumulative import time in ms, plus the module set and timings of the last run."""
+    samples = [measure(module) for _ in range(runs)]
+    median_ms = statistics.median(sample[module] for sample in samples) / 1000
+    return round(median_ms, 1), samples[-1]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--record", action="store_true", help="Write the measured times as the new budget")
+    parser.add_argument("--runs", type=int, help="Cold imports per module (default from the budget file)")
+    parser.add_argument("--top", type=int, default=0, help="Show the N slowest imports per module")
+    args = parser.parse_args()
+
+    with open(BUDGET_PATH, encoding="utf-8") as f:
+        budget = json.load(f)
+    runs = args.runs or budget.get("runs", 5)
+
+    failures = []
+    for module, spec in budget["modules"].items():
+        median_ms, timings = profile(module, runs)
+        status = "ok"
+        if args.record:
+            spec["measured_ms"] = median_ms
+            spec["budget_ms"] = round(median_ms * (1 + HEADROOM))
+        elif median_ms > spec["budget_ms"]:
+            status = "OVER BUDGET"
+            failures.append(module)
+
+        eager = [name for name in spec.get("deferred", []) if name in timings]
+        if eager:
+            status = "EAGER IMPORTS"
+            failures.append(module)
+        print(f"{module:<12} {median_ms:>8.1f} ms  (budget {spec['budget_ms']} ms)  {status}")
+        for name in eager:
+            print(f"    imported at startup: {name} ({timings[name] / 1000:.1f} ms)")
+
+        if args.top:
+            slowest = sorted(((t, n) for n, t in timings.items() if n != module), reverse=True)[:args.top]
+            for micros, name in slowest:
+                print(f"    {micros / 1000:>8.1f} ms  {name}")
+
+    if args.record:
+        with open(BUDGET_PATH, "w", encoding="utf-8") as f:
+            json.dump(budget, f, indent=2)
+            f.write("\n")
+        print(f"Budget written to {BUDGET_PATH}")
+    elif failures:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
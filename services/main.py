@@ -1,14 +1,13 @@
+import settings
 import asyncio
-from dotenv import load_dotenv
 from livekit.agents import (
     Agent, AgentSession, JobContext,
     WorkerOptions, cli, function_tool,
 )
 from livekit.plugins import groq, silero
 from langchain_core.messages import HumanMessage
-from agent import graph
-
-load_dotenv()
+from agent import get_graph
+from tracing import trace_run
 
 TTS_AVAILABLE = True
 
@@ -34,7 +33,8 @@ async def itinerary_planner(user_input: str) -> dict:
     LiveKit expects so the LLM can read / speak it.
     """
     try:
-        result = graph.invoke({"messages": [HumanMessage(content=user_input)]})
+        with trace_run("voice"):
+            result = get_graph().invoke({"messages": [HumanMessage(content=user_input)]})
         final_data = result.get("final_data") if isinstance(result, dict) \
                      else getattr(result, "final_data", None)
         if not final_data:
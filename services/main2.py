@@ -1,25 +1,70 @@
-from agent import graph
+from agent import close_session, get_graph, get_session_graph, open_session, replan_update, resume_update
 from langchain_core.messages import HumanMessage
-import sys
+from tracing import trace_run
+import sys, uuid
 
-def run_workflow(user_input: str):
-    """Run the workflow with the given input and return the result."""
-    final_step = {}
-    
+# Rounds of follow-up questions main() asks before giving up
+MAX_FOLLOW_UPS = 3
+
+def session_config(thread_id: str) -> dict:
     # Configure with recursion limit as safety measure
-    config = {"recursion_limit": 15}
+    return {"recursion_limit": 15, "configurable": {"thread_id": thread_id}}
+
+def session_values(thread_id: str) -> dict:
+    """The session's latest checkpointed state ({} for an unknown session)."""
+    return get_session_graph().get_state(session_config(thread_id)).values
+
+def can_resume(thread_id: str) -> bool:
+    """Whether the session exists and stopped for missing details."""
+    return bool(session_values(thread_id).get("missing_info"))
+
+def can_replan(thread_id: str) -> bool:
+    """Whether the session exists and got as far as extracting the trip details."""
+    return bool(session_values(thread_id).get("trip_params"))
+
+def prepare_run(user_input: str = None, thread_id: str = None, answers: dict = None, replan: bool = False):
+    """
+    (graph, input, config) for one run. Without a thread_id the run is one-shot; with one it is
+    checkpointed as that session, and passing answers resumes the session where it stopped
+    for missing details instead of starting over. With replan, the answers are changes to a
+    session's trip details and the whole plan is redone, reusing what they don't affect.
+    """
+    if not thread_id:
+        return get_graph(), {"messages": [HumanMessage(content=user_input)]}, {"recursion_limit": 15}
+
+    graph, config = get_session_graph(), session_config(thread_id)
+    if answers is None:
+        open_session(thread_id)
+        return graph, {"messages": [HumanMessage(content=user_input)]}, config
+
+    values = graph.get_state(config).values
+    if replan:
+        if not values.get("trip_params"):
+            raise ValueError(f"Session {thread_id} has no trip to re-plan")
+        graph.update_state(config, replan_update(values, answers, thread_id), as_node="ExtractAgent")
+        return graph, None, config
+    if not values.get("missing_info"):
+        raise ValueError(f"Session {thread_id} has nothing to resume")
+    graph.update_state(config, resume_update(values, answers, thread_id), as_node="ExtractAgent")
+    return graph, None, config
+
+def run_workflow(user_input: str, thread_id: str = None, answers: dict = None, replan: bool = False):
+    """Run (or, given answers, resume or re-plan) the workflow and return its last step."""
+    final_step = {}
     step_count = 0
     try:
-        for step in graph.stream({"messages": [HumanMessage(content=user_input)]}, config=config):
-            node_name = list(step.keys())[0]
-            step_data = list(step.values())[0]
-            step_count += 1
-            
-            # Optional: Uncomment for debugging
-            # print(f"Step {step_count} - Agent: {node_name}")
+        graph, graph_input, config = prepare_run(user_input, thread_id, answers, replan)
+        with trace_run("replan" if replan else "plan", resumed=answers is not None):
+            for step in graph.stream(graph_input, config=config):
+                node_name = list(step.keys())[0]
+                step_data = list(step.values())[0]
+                step_count += 1
                 
-            # Keep track of the latest step
-            final_step = step
+                # Optional: Uncomment for debugging
+                # print(f"Step {step_count} - Agent: {node_name}")
+                    
+                # Keep track of the latest step
+                final_step = step
         
         # Workflow completed successfully
         
@@ -31,173 +76,107 @@ def run_workflow(user_input: str):
     
     return final_step
 
+def final_text(final_step) -> str:
+    """The text shown to the user for the workflow's last step: the plan or the missing-info prompt."""
+    if not final_step:
+        return "Workflow failed to execute."
+
+    final_state = list(final_step.values())[0] or {}
+    if final_state.get("missing_info"):
+        return final_state["messages"][-1].content
+
+    return final_state.get("final_data") or "No final trip plan was generated."
+
+def stream_workflow(user_input: str, thread_id: str = None, answers: dict = None, replan: bool = False):
+    """
+    Run (or resume or re-plan) the workflow and yield its progress as it happens:
+    ("step", {node: update}) after every agent and ("token", text) for each
+    chunk of the final summary. Errors propagate to the caller.
+    """
+    graph, graph_input, config = prepare_run(user_input, thread_id, answers, replan)
+    with trace_run("replan" if replan else "plan", stream=True, resumed=answers is not None):
+        for mode, chunk in graph.stream(
+            graph_input,
+            config=config,
+            stream_mode=["updates", "custom"],
+        ):
+            if mode == "updates":
+                yield "step", chunk
+            elif isinstance(chunk, dict) and chunk.get("type") == "token":
+                yield "token", chunk["text"]
+
 def get_user_input(prompt: str) -> str:
     """Get input from user with a prompt."""
     return input(f"\n{prompt}\nYour response: ").strip()
 
+# Follow-up question per missing detail: (word in the agent's missing_info entry, answer key, prompt).
+# Check-in/out come before "date" since their entries contain it too.
+FOLLOW_UP_QUESTIONS = [
+    ("departure", "departure", "Please provide the departure city (e.g., Mumbai, New York, London):"),
+    ("arrival", "arrival", "Please provide the destination city (e.g., Paris, London, Tokyo):"),
+    ("checkin", "checkin_date", "Please provide the check-in date (e.g., 2025-12-25, December 25, 2025):"),
+    ("checkout", "checkout_date", "Please provide the check-out date (e.g., 2025-12-30, December 30, 2025):"),
+    ("date", "date", "Please provide the travel date (e.g., 2025-12-25, December 25, 2025):"),
+    ("city", "city_code", "Please provide the destination city for hotel booking:"),
+]
+
+def ask_missing_info(missing_info: list) -> dict:
+    """Asks the user for each missing detail; answers are keyed like the agents' extracted_info."""
+    answers = {}
+    for missing_item in missing_info:
+        for word, key, prompt in FOLLOW_UP_QUESTIONS:
+            if word in missing_item.lower():
+                if key not in answers:
+                    answers[key] = get_user_input(prompt)
+                break
+    return answers
+
+def ask_changes() -> dict:
+    """Trip details to change, typed as field=value pairs; {} when the user is done."""
+    text = get_user_input("Change anything? (e.g. checkout_date=2025-10-12 adults=2, blank to finish)")
+    return dict(pair.split("=", 1) for pair in text.split() if "=" in pair)
+
 def main(user_input: str):
     print(f"Starting trip planning for: {user_input}")
     
-    # Run the workflow
-    final_step = run_workflow(user_input)
+    # The session is checkpointed, so follow-up answers resume the run where it
+    # stopped instead of repeating the agents that already finished
+    thread_id = uuid.uuid4().hex
+    final_step = run_workflow(user_input, thread_id)
+    
+    for _ in range(MAX_FOLLOW_UPS):
+        if not final_step:
+            break
+        final_state = list(final_step.values())[0] or {}
+        missing_info = final_state.get("missing_info")
+        if not missing_info:
+            break
+        print(f"\n{final_state['messages'][-1].content}")
+        answers = ask_missing_info(missing_info)
+        print(f"\nThank you! Now planning your trip with the updated information...")
+        final_step = run_workflow(None, thread_id, answers)
+    else:
+        close_session(thread_id)
     
     if not final_step:
         print("Workflow failed to execute.")
         return
     
-    # Check if we need more information
-    final_state = list(final_step.values())[0]
-    missing_info = final_state.get("missing_info")
-    
+    # --- Final summary ---
+    print(final_text(final_step))
 
-    
-    if missing_info:
-        print(f"\n{final_state['messages'][-1].content}")
-        
-        # Get the missing information from user
-        extracted_info = final_state.get("extracted_info", {})
-        updated_info = extracted_info.copy()
-        
-        for missing_item in missing_info:
-            if "departure" in missing_item.lower():
-                departure = get_user_input("Please provide the departure city (e.g., Mumbai, New York, London):")
-                # Convert city name to IATA code (simplified mapping)
-                city_to_iata = {
-                    "mumbai": "BOM", "new york": "JFK", "london": "LHR", "paris": "CDG",
-                    "tokyo": "NRT", "delhi": "DEL", "bangalore": "BLR", "dubai": "DXB",
-                    "singapore": "SIN", "sydney": "SYD", "melbourne": "MEL", "toronto": "YYZ",
-                    "vancouver": "YVR", "montreal": "YUL", "berlin": "BER", "madrid": "MAD",
-                    "rome": "FCO", "amsterdam": "AMS", "barcelona": "BCN", "milan": "MXP",
-                    "vienna": "VIE", "prague": "PRG", "zurich": "ZUR", "geneva": "GVA"
-                }
-                updated_info["departure"] = city_to_iata.get(departure.lower(), departure.upper()[:3])
-                
-            elif "arrival" in missing_item.lower():
-                arrival = get_user_input("Please provide the destination city (e.g., Paris, London, Tokyo):")
-                city_to_iata = {
-                    "mumbai": "BOM", "new york": "JFK", "london": "LHR", "paris": "CDG",
-                    "tokyo": "NRT", "delhi": "DEL", "bangalore": "BLR", "dubai": "DXB",
-                    "singapore": "SIN", "sydney": "SYD", "melbourne": "MEL", "toronto": "YYZ",
-                    "vancouver": "YVR", "montreal": "YUL", "berlin": "BER", "madrid": "MAD",
-                    "rome": "FCO", "amsterdam": "AMS", "barcelona": "BCN", "milan": "MXP",
-                    "vienna": "VIE", "prague": "PRG", "zurich": "ZUR", "geneva": "GVA"
-                }
-                updated_info["arrival"] = city_to_iata.get(arrival.lower(), arrival.upper()[:3])
-                
-            elif "date" in missing_item.lower():
-                date = get_user_input("Please provide the travel date (e.g., 2024-12-25, December 25, 2024, or 'next month'):")
-                # Try to parse the date
-                try:
-                    from dateutil.parser import parse
-                    parsed_date = parse(date, fuzzy=True)
-                    updated_info["date"] = parsed_date.strftime("%Y-%m-%d")
-                except:
-                    updated_info["date"] = date
-                    
-            elif "city" in missing_item.lower():
-                city = get_user_input("Please provide the destination city for hotel booking:")
-                city_to_iata = {
-                    "mumbai": "BOM", "new york": "NYC", "london": "LON", "paris": "PAR",
-                    "tokyo": "TYO", "delhi": "DEL", "bangalore": "BLR", "dubai": "DXB",
-                    "singapore": "SIN", "sydney": "SYD", "melbourne": "MEL", "toronto": "YTO",
-                    "vancouver": "YVR", "montreal": "YMQ", "berlin": "BER", "madrid": "MAD",
-                    "rome": "ROM", "amsterdam": "AMS", "barcelona": "BCN", "milan": "MIL",
-                    "vienna": "VIE", "prague": "PRG", "zurich": "ZUR", "geneva": "GVA"
-                }
-                updated_info["city_code"] = city_to_iata.get(city.lower(), city.upper()[:3])
-                
-            elif "checkin" in missing_item.lower():
-                checkin = get_user_input("Please provide the check-in date (e.g., 2024-12-25, December 25, 2024):")
-                try:
-                    from dateutil.parser import parse
-                    parsed_date = parse(checkin, fuzzy=True)
-                    updated_info["checkin_date"] = parsed_date.strftime("%Y-%m-%d")
-                except:
-                    updated_info["checkin_date"] = checkin
-                    
-            elif "checkout" in missing_item.lower():
-                checkout = get_user_input("Please provide the check-out date (e.g., 2024-12-30, December 30, 2024):")
-                try:
-                    from dateutil.parser import parse
-                    parsed_date = parse(checkout, fuzzy=True)
-                    updated_info["checkout_date"] = parsed_date.strftime("%Y-%m-%d")
-                except:
-                    updated_info["checkout_date"] = checkout
-        
-        # Create updated query with the new information
-        updated_query = f"Plan a trip from {updated_info.get('departure', '')} to {updated_info.get('arrival', '')} on {updated_info.get('date', '')}"
-        if updated_info.get('checkin_date') and updated_info.get('checkout_date'):
-            updated_query += f" with check-in on {updated_info['checkin_date']} and check-out on {updated_info['checkout_date']}"
-        
-        print(f"\nThank you! Now planning your trip with the updated information...")
-        print(f"Updated query: {updated_query}")
-        
-        # Run the workflow again with updated information
-        final_step = run_workflow(updated_query)
-        
+    # Interactive sessions can iterate on the plan; agents whose inputs didn't change are reused
+    while sys.stdin.isatty() and not (list(final_step.values())[0] or {}).get("missing_info"):
+        changes = ask_changes()
+        if not changes:
+            break
+        final_step = run_workflow(None, thread_id, changes, replan=True)
         if not final_step:
-            print("Workflow failed to execute with updated information.")
+            print("Workflow failed to execute.")
             return
-        
-        # Check if the second run also needs more information
-        final_state = list(final_step.values())[0]
-        missing_info_2 = final_state.get("missing_info")
-        
-
-        
-        if missing_info_2:
-            print(f"\nI still need more information: {', '.join(missing_info_2)}")
-            print("Let me ask for the remaining details...")
-            
-            # Get the additional missing information
-            extracted_info_2 = final_state.get("extracted_info", {})
-            updated_info_2 = extracted_info_2.copy()
-            
-            for missing_item in missing_info_2:
-                if "checkin" in missing_item.lower():
-                    checkin = get_user_input("Please provide the check-in date for your hotel (e.g., 2025-12-25, December 25, 2025):")
-                    try:
-                        from dateutil.parser import parse
-                        parsed_date = parse(checkin, fuzzy=True)
-                        updated_info_2["checkin_date"] = parsed_date.strftime("%Y-%m-%d")
-                    except:
-                        updated_info_2["checkin_date"] = checkin
-                        
-                elif "checkout" in missing_item.lower():
-                    checkout = get_user_input("Please provide the check-out date for your hotel (e.g., 2025-12-30, December 30, 2025):")
-                    try:
-                        from dateutil.parser import parse
-                        parsed_date = parse(checkout, fuzzy=True)
-                        updated_info_2["checkout_date"] = parsed_date.strftime("%Y-%m-%d")
-                    except:
-                        updated_info_2["checkout_date"] = checkout
-            
-            # Create final updated query
-            final_query = f"Plan a trip from {updated_info.get('departure', '')} to {updated_info.get('arrival', '')} on {updated_info.get('date', '')}"
-            if updated_info_2.get('checkin_date') and updated_info_2.get('checkout_date'):
-                final_query += f" with check-in on {updated_info_2['checkin_date']} and check-out on {updated_info_2['checkout_date']}"
-            
-            print(f"\nPerfect! Now planning your complete trip...")
-            print(f"Final query: {final_query}")
-            
-            # Run the workflow one more time with all information
-            final_step = run_workflow(final_query)
-            
-            if not final_step:
-                print("Workflow failed to execute with complete information.")
-                return
-    
-    # --- Final summary ---
-    if final_step:
-        final_state = list(final_step.values())[0]
-        final_data = final_state.get("final_data")
-        
-        if final_data:
-            print(final_data)
-        else:
-            print("No final trip plan was generated.")
-    else:
-        print("No steps were executed.")
+        print(final_text(final_step))
+        report = session_values(thread_id).get("node_report") or {}
+        print("Reused: " + (", ".join(node for node, outcome in report.items() if outcome == "reused") or "nothing"))
 
 if __name__ == "__main__":
     if len(sys.argv) < 2:
@@ -0,0 +1,255 @@
+"""
+Deterministic fast path for common trip queries.
+
+Handles phrasings like "Plan a trip from Mumbai to Paris from 10th October for
+21 days" with a few regexes, dateutil and the bundled gazetteer, so the
+ExtractAgent only has to call the LLM when the parse is not confident.
+"""
+from collections import namedtuple
+from datetime import date, datetime
+from dateutil.parser import parse
+from dateutil.relativedelta import relativedelta
+from gazetteer import find_cities_in_text, normalize
+from trip_params import TripParams
+import os, re, threading
+
+# Fraction of the required fields (origin, destination, start date, end/duration) needed to skip the LLM
+FAST_PATH_THRESHOLD = float(os.getenv("PLANNER_FAST_PATH_THRESHOLD", "1.0"))
+
+ParsedQuery = namedtuple("ParsedQuery", ["params", "confidence", "missing"])
+
+_NUMBER_WORDS = {
+    "a": 1, "an": 1, "one": 1, "two": 2, "three": 3, "four": 4, "five": 5, "six": 6,
+    "seven": 7, "eight": 8, "nine": 9, "ten": 10, "eleven": 11, "twelve": 12,
+    "thirteen": 13, "fourteen": 14, "fifteen": 15, "twenty": 20, "thirty": 30,
+}
+_NUMBER = r"(\d+|" + "|".join(_NUMBER_WORDS) + r")"
+_MONTH = r"(?:jan(?:uary)?|feb(?:ruary)?|mar(?:ch)?|apr(?:il)?|may|june?|july?|aug(?:ust)?|sep(?:t(?:ember)?)?|oct(?:ober)?|nov(?:ember)?|dec(?:ember)?)"
+
+_DATE_PATTERNS = [
+    re.compile(r"\b\d{4}-\d{1,2}-\d{1,2}\b"),
+    re.compile(rf"\b\d{{1,2}}(?:st|nd|rd|th)?\s+(?:of\s+)?{_MONTH}\.?(?:,?\s+\d{{4}})?\b", re.I),
+    re.compile(rf"\b{_MONTH}\.?\s+\d{{1,2}}(?:st|nd|rd|th)?(?:,?\s+\d{{4}})?\b", re.I),
+]
+_DURATION = re.compile(
+    rf"\bfor\s+(?:a\s+|an\s+)?{_NUMBER}?\s*-?\s*(day|night|week)s?\b"
+    rf"|\b{_NUMBER}\s*-?\s*(day|night|week)s?\s+(?:trip|stay|vacation|holiday|getaway|tour)\b",
+    re.I,
+)
+_ADULTS = re.compile(rf"\b{_NUMBER}\s+(?:adults?|people|persons?|travell?ers?|passengers?|guests?|pax)\b", re.I)
+_FAMILY = re.compile(rf"\b(?:family|group)\s+of\s+{_NUMBER}\b", re.I)
+_FLEX = re.compile(
+    rf"(?:±|\+/-|\+-|plus or minus|give or take)\s*{_NUMBER}\s*days?\b"
+    rf"|\bflexible\s+(?:by|within)\s+(?:±|\+/-)?\s*{_NUMBER}\s*days?\b"
+    rf"|\b{_NUMBER}\s+days?\s+either\s+way\b",
+    re.I,
+)
+_FLEXIBLE = re.compile(r"\bflexible\b|\bday (?:earlier|later)\b", re.I)
+# Window used when the dates are "flexible" without a number
+DEFAULT_FLEX_DAYS = int(os.getenv("PLANNER_DEFAULT_FLEX_DAYS", "3"))
+_COUPLE = re.compile(r"\b(?:couple|my (?:wife|husband|partner|girlfriend|boyfriend))\b", re.I)
+# People travelling with the speaker ("with 3 friends", "with my family")
+_COMPANIONS = re.compile(
+    rf"\bwith\s+(?:my\s+|some\s+)?{_NUMBER}?\s*(?:of\s+my\s+)?"
+    r"(friends?|colleagues?|co-?workers?|mates|buddies|relatives|cousins|siblings|brothers?|sisters?|parents|family|kids|children)\b",
+    re.I,
+)
+
+_ORIGIN_MARKERS = {"from", "leaving", "departing"}
+# "live in London": the city after "in" is where the traveller starts
+_HOME_MARKERS = {"live", "living", "based", "reside", "residing"}
+_DESTINATION_MARKERS = {"to", "visit", "visiting", "towards", "into"}
+# "a week in Paris" names the destination only when no other marker does
+_WEAK_DESTINATION_MARKERS = {"in"}
+
+_stats_lock = threading.Lock()
+_stats = {"fast_path_hits": 0, "llm_fallbacks": 0}
+
+
+def _number(token: str) -> int:
+    token = (token or "").lower()
+    return int(token) if token.isdigit() else _NUMBER_WORDS.get(token, 0)
+
+
+def _find_dates(text: str, today: date) -> list:
+    """
+    Returns the explicit dates in the text, in order of appearance. A date without a
+    year is the next one to come: "10th October" after October 10th is next year's.
+    """
+    spans = []
+    for pattern in _DATE_PATTERNS:
+        for match in pattern.finditer(text):
+            if not any(start <= match.start() < end for start, end, _ in spans):
+                spans.append((match.start(), match.end(), match.group(0)))
+
+    dates = []
+    for _, _, raw in sorted(spans):
+        cleaned = re.sub(r"(\d)(st|nd|rd|th)\b", r"\1", raw, flags=re.I).replace(" of ", " ")
+        try:
+            found = parse(cleaned, default=datetime(today.year, 1, 1))
+        except (ValueError, OverflowError):
+            continue
+        if not re.search(r"\d{4}", raw) and found.date() < today:
+            found += relativedelta(years=1)
+        dates.append(found)
+    return dates
+
+
+def _find_duration(text: str) -> int:
+    """Returns the trip length in days, or 0 if none is stated."""
+    match = _DURATION.search(text)
+    if not match:
+        return 0
+    count, unit = (match.group(1), match.group(2)) if match.group(2) else (match.group(3), match.group(4))
+    count = _number(count) if count else 1
+    return count * 7 if unit.lower() == "week" else count
+
+
+def _find_adults(text: str) -> tuple:
+    """Returns (number of travellers or 0 if none is stated, whether the text pins that number down)."""
+    match = _ADULTS.search(text) or _FAMILY.search(text)
+    if match:
+        return _number(match.group(1)), True
+    companions = _COMPANIONS.search(text)
+    if companions:
+        count = _number(companions.group(1))
+        # "with my friends" doesn't say how many, and children aren't adults
+        if not count or companions.group(2).lower() in ("kids", "children"):
+            return 0, False
+        return count + 1, True
+    if _COUPLE.search(text):
+        return 2, True
+    return 0, True
+
+
+def _find_flex_days(text: str) -> int:
+    """Returns how many days either way the departure may move, or 0 for fixed dates."""
+    match = _FLEX.search(text)
+    if match:
+        return _number(next(group for group in match.groups() if group))
+    return DEFAULT_FLEX_DAYS if _FLEXIBLE.search(text) else 0
+
+
+def _find_route(text: str):
+    """
+    Picks origin and destination cities using 'from'/'to' style markers around them.
+
+    Returns:
+        (origin, destination, conflicting) where conflicting is True when the markers name
+        more than one origin or destination, or a marked city fits neither.
+    """
+    words = normalize(text).split()
+    origins, destinations, weak, unmarked = [], [], [], []
+    for position, city, surface in find_cities_in_text(text):
+        marker = words[position - 1] if position else ""
+        before = words[position - 2] if position > 1 else ""
+        if marker in _ORIGIN_MARKERS or (marker == "in" and before in _HOME_MARKERS):
+            found = origins
+        elif marker in _DESTINATION_MARKERS:
+            found = destinations
+        elif marker in _WEAK_DESTINATION_MARKERS:
+            found = weak
+        elif surface[:1].isupper():
+            # Without a marker only a capitalized name counts ("a nice trip" is not Nice)
+            found = unmarked
+        else:
+            continue
+        if city not in found:
+            found.append(city)
+
+    if not destinations:
+        destinations, weak = weak, []
+    conflicting = len(origins) > 1 or len(destinations) > 1 or any(city not in destinations for city in weak)
+    origin = origins[0] if origins else None
+    destination = destinations[0] if destinations else None
+
+    # "Mumbai - Paris" style: the first unmarked city is the origin, the next the destination
+    for city in unmarked:
+        if origin is None and city != destination:
+            origin = city
+        elif destination is None and city != origin:
+            destination = city
+    if origin is not None and origin == destination:
+        conflicting = True
+    return origin, destination, conflicting
+
+
+def parse_query(text: str, today: date = None) -> ParsedQuery:
+    """
+    Parses a trip query without an LLM; today (default: the current date) places
+    dates that have no year.
+
+    Returns:
+        ParsedQuery(params, confidence, missing) where confidence is the fraction
+        of origin, destination, start date and end date/duration that were found,
+        less a quarter for each ambiguous part (a city without an airport code, a
+        conflicting route, an unknown party size, an end date that disagrees with the
+        duration); missing lists both.
+    """
+    origin, destination, conflicting = _find_route(text)
+    dates = _find_dates(text, today or date.today())
+    duration = _find_duration(text)
+    adults, adults_known = _find_adults(text)
+    flex_days = _find_flex_days(text)
+
+    start = dates[0] if dates else None
+    end = dates[1] if len(dates) > 1 else None
+    if start and end and end <= start:
+        end += relativedelta(years=1)
+
+    params = TripParams.from_dict({
+        "origin_city": origin.name if origin else "",
+        "origin_iata": origin.airport if origin else "",
+        "destination_city": destination.name if destination else "",
+        "destination_iata": destination.airport if destination else "",
+        "destination_city_code": destination.city_code if destination else "",
+        "travel_date": start.strftime("%Y-%m-%d") if start else "",
+        "checkout_date": end.strftime("%Y-%m-%d") if end else "",
+        "duration_days": duration,
+        "adults": adults or 1,
+        "flex_days": flex_days,
+    })
+
+    missing = [name for name, found in (
+        ("origin", origin),
+        ("destination", destination),
+        ("start date", start),
+        ("end date or duration", params.checkout_date),
+    ) if not found]
+    # Cities known only from GeoNames have no IATA codes; the LLM supplies those
+    if origin and not origin.airport:
+        missing.append("origin airport")
+    if destination and not (destination.airport and destination.city_code):
+        missing.append("destination airport")
+    if conflicting:
+        missing.append("unambiguous route")
+    if not adults_known:
+        missing.append("number of travellers")
+    # "12th May to 18th May, 7 days" counts both ends, so one day either way still agrees
+    if start and end and duration and abs((end - start).days - duration) > 1:
+        missing.append("end date matching the duration")
+    return ParsedQuery(params, max(0, 4 - len(missing)) / 4, missing)
+
+
+def is_confident(parsed: ParsedQuery) -> bool:
+    """Whether the parse is good enough to skip the LLM."""
+    return parsed.confidence >= FAST_PATH_THRESHOLD
+
+
+def record_fast_path(hit: bool):
+    """Counts whether a query was served by the fast path or fell back to the LLM."""
+    with _stats_lock:
+        _stats["fast_path_hits" if hit else "llm_fallbacks"] += 1
+
+
+def fast_path_stats() -> dict:
+    """Fast-path hit rate; every hit is one extraction LLM call avoided."""
+    with _stats_lock:
+        hits, fallbacks = _stats["fast_path_hits"], _stats["llm_fallbacks"]
+    total = hits + fallbacks
+    return {
+        "fast_path_hits": hits,
+        "llm_fallbacks": fallbacks,
+        "llm_calls_avoided": hits,
+        "hit_rate": round(hits / total, 4) if total else 0.0,
+    }
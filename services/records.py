@@ -0,0 +1,207 @@
+"""
+Typed records for flight and hotel offers.
+
+tools.py parses the Amadeus responses into these once; the graph state, the
+flight cache, the node memo and the checkpoints carry them as they are, and
+text is only rendered when an offer is shown to the user or pasted into a
+prompt (render_flights / render_hotels). Prices are numbers and times are
+datetimes, so offers can be ranked and filtered without re-parsing strings.
+
+Each record packs into a positional row (to_row / from_row) holding only
+JSON types, which is what the caches store and the worker sends over IPC.
+"""
+from dataclasses import dataclass
+from datetime import date, datetime
+import re
+
+_ISO_DURATION = re.compile(r"^P(?:(\d+)D)?(?:T(?:(\d+)H)?(?:(\d+)M)?)?")
+
+
+def duration_minutes(value: str) -> int:
+    """Minutes in an ISO 8601 duration such as 'PT12H30M' (0 if it can't be parsed)."""
+    match = _ISO_DURATION.match(value or "")
+    if not match:
+        return 0
+    days, hours, minutes = (int(part or 0) for part in match.groups())
+    return (days * 24 + hours) * 60 + minutes
+
+
+def format_duration(minutes: int) -> str:
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}h {minutes:02d}m" if hours else f"{minutes}m"
+
+
+def format_price(amount: float, currency: str) -> str:
+    return f"{amount:.2f} {currency}"
+
+
+@dataclass(frozen=True, slots=True)
+class Segment:
+    """One leg of a flight offer; times are local to the airports."""
+    origin: str
+    destination: str
+    carrier: str
+    number: str
+    departs: datetime
+    arrives: datetime
+
+    @classmethod
+    def from_amadeus(cls, segment: dict) -> "Segment":
+        return cls(
+            segment["departure"]["iataCode"], segment["arrival"]["iataCode"],
+            segment["carrierCode"], segment["number"],
+            datetime.fromisoformat(segment["departure"]["at"]), datetime.fromisoformat(segment["arrival"]["at"]),
+        )
+
+    def to_row(self) -> list:
+        return [self.origin, self.destination, self.carrier, self.number,
+                self.departs.isoformat(timespec="minutes"), self.arrives.isoformat(timespec="minutes")]
+
+    @classmethod
+    def from_row(cls, row: list) -> "Segment":
+        origin, destination, carrier, number, departs, arrives = row
+        return cls(origin, destination, carrier, number, datetime.fromisoformat(departs), datetime.fromisoformat(arrives))
+
+
+@dataclass(frozen=True, slots=True)
+class FlightOffer:
+    """A priced one-way itinerary."""
+    price: float
+    currency: str
+    duration: int                 # minutes
+    segments: tuple = ()
+
+    @classmethod
+    def from_amadeus(cls, offer: dict) -> "FlightOffer":
+        itinerary = offer["itineraries"][0]
+        return cls(
+            float(offer["price"]["total"]), offer["price"]["currency"], duration_minutes(itinerary["duration"]),
+            tuple(Segment.from_amadeus(segment) for segment in itinerary["segments"]),
+        )
+
+    @property
+    def stops(self) -> int:
+        return max(len(self.segments) - 1, 0)
+
+    @property
+    def carrier(self) -> str:
+        return self.segments[0].carrier if self.segments else ""
+
+    @property
+    def departure_day(self):
+        return self.segments[0].departs.date() if self.segments else None
+
+    def to_row(self) -> list:
+        return [self.price, self.currency, self.duration, [segment.to_row() for segment in self.segments]]
+
+    @classmethod
+    def from_row(cls, row: list) -> "FlightOffer":
+        price, currency, duration, segments = row
+        return cls(price, currency, duration, tuple(Segment.from_row(segment) for segment in segments))
+
+
+@dataclass(frozen=True, slots=True)
+class HotelOffer:
+    """The best rate of one hotel for the whole stay."""
+    hotel_id: str
+    name: str
+    price: float
+    currency: str
+    checkin: date
+    checkout: date
+
+    @classmethod
+    def from_amadeus(cls, item: dict) -> "HotelOffer":
+        offer = item["offers"][0]
+        return cls(
+            item["hotel"].get("hotelId", ""), item["hotel"]["name"],
+            float(offer["price"]["total"]), offer["price"]["currency"],
+            date.fromisoformat(offer["checkInDate"]), date.fromisoformat(offer["checkOutDate"]),
+        )
+
+    @property
+    def nights(self) -> int:
+        return (self.checkout - self.checkin).days
+
+    def to_row(self) -> list:
+        return [self.hotel_id, self.name, self.price, self.currency, self.checkin.isoformat(), self.checkout.isoformat()]
+
+    @classmethod
+    def from_row(cls, row: list) -> "HotelOffer":
+        hotel_id, name, price, currency, checkin, checkout = row
+        return cls(hotel_id, name, price, currency, date.fromisoformat(checkin), date.fromisoformat(checkout))
+
+
+RECORD_TYPES = (Segment, FlightOffer, HotelOffer)
+
+
+def parse_offers(cls, items) -> list:
+    """Records of type cls for the API items that parse; incomplete items are skipped."""
+    offers = []
+    for item in items:
+        try:
+            offers.append(cls.from_amadeus(item))
+        except (KeyError, IndexError, TypeError, ValueError):
+            continue
+    return offers
+
+
+def to_rows(value):
+    """value with every record replaced by its row; lists, tuples and dict values are walked."""
+    if isinstance(value, RECORD_TYPES):
+        return value.to_row()
+    if isinstance(value, (list, tuple)):
+        return [to_rows(item) for item in value]
+    if isinstance(value, dict):
+        return {key: to_rows(item) for key, item in value.items()}
+    return value
+
+
+def load_offers(cls, rows) -> list:
+    """Records of type cls from a list of rows."""
+    return [cls.from_row(row) for row in rows or []]
+
+
+def load_calendar(days) -> dict:
+    """A fare calendar from its packed form ({day: row or None})."""
+    return {day: FlightOffer.from_row(row) if row else None for day, row in (days or {}).items()}
+
+
+# --------- RENDERING ----------
+def render_flight(offer: FlightOffer) -> str:
+    return (
+        f"✈️ Price: {format_price(offer.price, offer.currency)}\n"
+        f"🕒 Total Duration: {format_duration(offer.duration)}\n"
+        f"🛬 Flight Segments:\n" +
+        "\n".join(
+            f"  • {seg.origin} → {seg.destination} | Airline: {seg.carrier} {seg.number} | "
+            f"Departs: {seg.departs.strftime('%b %d, %I:%M %p')} | "
+            f"Arrives: {seg.arrives.strftime('%b %d, %I:%M %p')}"
+            for seg in offer.segments
+        )
+    )
+
+
+def render_calendar(calendar: dict, requested: str = "") -> str:
+    """The cheapest fare per departure day; requested marks the day the traveller asked for."""
+    return "📅 Cheapest fare by departure date:\n" + "\n".join(
+        f"  • {datetime.strptime(day, '%Y-%m-%d').strftime('%a %b %d')}: "
+        + (f"{format_price(offer.price, offer.currency)} | {offer.carrier} | "
+           f"{'non-stop' if not offer.stops else str(offer.stops) + ' stop(s)'}" if offer else "no offers")
+        + (" ← requested" if day == requested else "")
+        for day, offer in calendar.items()
+    )
+
+
+def render_flights(offers: list, calendar: dict = None) -> str:
+    """Flight offers (and the fare calendar, if any) as shown to the user."""
+    text = "\n\n".join(render_flight(offer) for offer in offers)
+    if calendar:
+        requested = offers[0].departure_day.isoformat() if offers and offers[0].departure_day else ""
+        text += "\n\n" + render_calendar(calendar, requested)
+    return text
+
+
+def render_hotels(offers: list) -> str:
+    """Hotel offers as shown to the user, one per line."""
+    return "\n".join(f"🏨 {offer.name} - {format_price(offer.price, offer.currency)}" for offer in offers)
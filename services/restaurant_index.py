@@ -0,0 +1,111 @@
+"""
+Local spatial index of OSM restaurants.
+
+Built by build_restaurant_index.py. Points are bucketed into fixed-size
+lat/lon grid cells and stored sorted by cell id, so a radius query is a
+handful of binary searches over a memory-mapped array followed by an exact
+haversine filter. Nothing is parsed or built at load time.
+
+Files in the index directory:
+    cells.npy     int64 cell id per point (sorted)
+    coords.npy    float32 (n, 2) lat/lon per point
+    offsets.npy   int64 (n + 1) byte offsets into records.jsonl
+    records.jsonl one JSON record per point (name, cuisine, address)
+    meta.json     cell size and the bounding boxes of the ingested extracts
+"""
+from functools import lru_cache
+import json, math, mmap, os
+import numpy as np
+
+RESTAURANT_INDEX_DIR = os.getenv(
+    "PLANNER_RESTAURANT_INDEX_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "restaurants"),
+)
+EARTH_RADIUS_M = 6371000.0
+METERS_PER_DEGREE = 111320.0
+
+
+def cell_ids(lats, lons, cell_size: float):
+    """Grid cell id for each point: row in the high 32 bits, column in the low 32."""
+    rows = np.floor((np.asarray(lats, dtype=np.float64) + 90.0) / cell_size).astype(np.int64)
+    cols = np.floor((np.asarray(lons, dtype=np.float64) + 180.0) / cell_size).astype(np.int64)
+    return (rows << 32) | cols
+
+
+def haversine_m(lat, lon, lats, lons):
+    """Vectorized great-circle distance in meters from one point to many."""
+    lat1, lon1 = np.radians(lat), np.radians(lon)
+    lat2, lon2 = np.radians(np.asarray(lats, dtype=np.float64)), np.radians(np.asarray(lons, dtype=np.float64))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_M * np.arcsin(np.sqrt(a))
+
+
+class RestaurantIndex:
+    """Read-only, memory-mapped restaurant index."""
+
+    def __init__(self, directory: str):
+        with open(os.path.join(directory, "meta.json"), encoding="utf-8") as f:
+            self.meta = json.load(f)
+        self.cell_size = self.meta["cell_size"]
+        self.bboxes = self.meta["bboxes"]
+        self.cells = np.load(os.path.join(directory, "cells.npy"), mmap_mode="r")
+        self.coords = np.load(os.path.join(directory, "coords.npy"), mmap_mode="r")
+        self.offsets = np.load(os.path.join(directory, "offsets.npy"), mmap_mode="r")
+        with open(os.path.join(directory, "records.jsonl"), "rb") as f:
+            self._records = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if self.offsets[-1] else b""
+
+    def __len__(self):
+        return len(self.cells)
+
+    def covers(self, lat: float, lon: float) -> bool:
+        """Whether the point lies inside one of the ingested extracts."""
+        return any(s <= lat <= n and w <= lon <= e for s, w, n, e in self.bboxes)
+
+    def _record(self, i: int) -> dict:
+        return json.loads(self._records[int(self.offsets[i]):int(self.offsets[i + 1])])
+
+    def query(self, lat: float, lon: float, radius: float = 1000, limit: int = 5) -> list:
+        """Nearest restaurants within radius meters, closest first, shaped like get_restaurants_data."""
+        dlat = radius / METERS_PER_DEGREE
+        dlon = radius / (METERS_PER_DEGREE * max(math.cos(math.radians(lat)), 1e-6))
+        low = cell_ids([lat - dlat], [lon - dlon], self.cell_size)[0]
+        high = cell_ids([lat + dlat], [lon + dlon], self.cell_size)[0]
+        row_low, row_high = int(low >> 32), int(high >> 32)
+        col_low, col_high = int(low & 0xFFFFFFFF), int(high & 0xFFFFFFFF)
+
+        # Each grid row's cells are contiguous in the sorted array: one range per row
+        candidates = []
+        for row in range(row_low, row_high + 1):
+            start = np.searchsorted(self.cells, (row << 32) | col_low, side="left")
+            end = np.searchsorted(self.cells, (row << 32) | col_high, side="right")
+            if end > start:
+                candidates.append(np.arange(start, end))
+        if not candidates:
+            return []
+
+        candidates = np.concatenate(candidates)
+        points = self.coords[candidates]
+        distances = haversine_m(lat, lon, points[:, 0], points[:, 1])
+        inside = distances <= radius
+        candidates, distances, points = candidates[inside], distances[inside], points[inside]
+        nearest = np.argsort(distances, kind="stable")[:limit]
+
+        restaurants = []
+        for i in nearest:
+            record = self._record(candidates[i])
+            restaurants.append({
+                "name": record.get("name", "Unnamed Restaurant"),
+                "cuisine": record.get("cuisine", "Unknown"),
+                "lat": round(float(points[i, 0]), 6),
+                "lon": round(float(points[i, 1]), 6),
+                "address": record.get("address", ""),
+            })
+        return restaurants
+
+
+@lru_cache(maxsize=1)
+def load_index(directory: str = RESTAURANT_INDEX_DIR):
+    """The index in directory, or None if it hasn't been built."""
+    if not os.path.exists(os.path.join(directory, "meta.json")):
+        return None
+    return RestaurantIndex(directory)
@@ -0,0 +1,9 @@
+"""
+Loads .env once per process.
+
+Import this before reading configuration from os.environ; later imports are
+no-ops, so every module can do it without re-reading the file.
+"""
+from dotenv import load_dotenv
+
+load_dotenv()
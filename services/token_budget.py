@@ -0,0 +1,133 @@
+"""
+Token budgets for the prompts that inline agent outputs.
+
+ActivityAgent pastes the flight, hotel, restaurant and weather slots (and its
+own itinerary) into its prompts; for long trips with many offers these grow
+without bound. Before each such call the slots are compacted: repeated
+entries are dropped, only the first top-K offers of each list are kept
+(flight and hotel offers are rendered cheapest first), and whatever is still
+over the budget is trimmed line by line, shortest slots first so small ones
+stay whole.
+
+Token counts are estimated from the text length; no tokenizer is loaded.
+When a model reports usage metadata, the reported counts are used instead.
+"""
+from threading import Lock
+import math, os, sys
+
+CHARS_PER_TOKEN = 4
+# Token budget for the agent data inlined into each prompt
+ACTIVITY_PROMPT_BUDGET = int(os.getenv("PLANNER_ACTIVITY_PROMPT_BUDGET", "2500"))
+FINAL_PROMPT_BUDGET = int(os.getenv("PLANNER_FINAL_PROMPT_BUDGET", "4000"))
+# Offers kept per slot before the budget is applied
+SLOT_TOP_K = {
+    "flight_data": int(os.getenv("PLANNER_TOP_FLIGHTS", "3")),
+    "hotel_data": int(os.getenv("PLANNER_TOP_HOTELS", "5")),
+    "restaurant_data": int(os.getenv("PLANNER_TOP_RESTAURANTS", "8")),
+}
+# How each slot is split into entries, and the prefix that marks an offer
+# (other entries, e.g. the fare calendar, are always kept)
+SLOT_ENTRIES = {
+    "flight_data": ("\n\n", "✈️"),
+    "hotel_data": ("\n", "🏨"),
+    "restaurant_data": ("\n", ""),
+}
+# Per-call log lines on stderr, for debugging; the counts always reach the worker's stats
+# and the planner_llm_tokens_total metric (the pool relays worker stderr as warnings)
+TOKEN_LOG = os.getenv("PLANNER_TOKEN_LOG", "0") == "1"
+
+_usage = {}
+_usage_lock = Lock()
+
+
+def estimate_tokens(text) -> int:
+    return math.ceil(len(text or "") / CHARS_PER_TOKEN)
+
+
+def top_entries(text: str, separator: str, prefix: str, k: int) -> str:
+    """Drops duplicate entries and keeps the first k offers (entries starting with prefix)."""
+    kept, seen, offers, dropped = [], set(), 0, 0
+    for entry in text.split(separator):
+        key = " ".join(entry.split())
+        if not key or key in seen:
+            continue
+        seen.add(key)
+        if entry.lstrip().startswith(prefix):
+            offers += 1
+            if offers > k:
+                dropped += 1
+                continue
+        kept.append(entry)
+    if dropped:
+        kept.append(f"(+{dropped} more options not shown)")
+    return separator.join(kept)
+
+
+def trim_to_tokens(text: str, budget: int) -> str:
+    """Keeps whole lines from the top while they fit the budget."""
+    if estimate_tokens(text) <= budget:
+        return text
+    lines, used = [], 0
+    all_lines = text.splitlines()
+    for line in all_lines:
+        cost = estimate_tokens(line + "\n")
+        if used + cost > budget:
+            break
+        lines.append(line)
+        used += cost
+    if not lines and all_lines:
+        lines.append(all_lines[0][:budget * CHARS_PER_TOKEN])
+    omitted = len(all_lines) - len(lines)
+    return "\n".join(lines) + (f"\n… ({omitted} more lines trimmed)" if omitted > 0 else "")
+
+
+def compact_slots(slots: dict, budget: int) -> dict:
+    """
+    Fits slot texts into a shared token budget.
+
+    Returns:
+        The slots in the same order, each deduplicated, cut to its top-K offers and,
+        if the total is still too large, trimmed to its share of the budget.
+    """
+    compacted = {}
+    for name, text in slots.items():
+        text = text or ""
+        if name in SLOT_ENTRIES:
+            separator, prefix = SLOT_ENTRIES[name]
+            text = top_entries(text, separator, prefix, SLOT_TOP_K[name])
+        compacted[name] = text
+
+    # Smallest slots first: whatever they leave of their fair share goes to the larger ones
+    remaining, left = budget, len(compacted)
+    for name in sorted(compacted, key=lambda name: estimate_tokens(compacted[name])):
+        share = remaining // left
+        compacted[name] = trim_to_tokens(compacted[name], share)
+        remaining -= min(estimate_tokens(compacted[name]), share)
+        left -= 1
+    return {name: compacted[name] for name in slots}
+
+
+def record_usage(node: str, prompt: str, reply: str, usage: dict = None):
+    """
+    Counts a call's prompt and reply tokens for a node (model-reported when available).
+
+    Returns:
+        (tokens_in, tokens_out)
+    """
+    usage = usage or {}
+    tokens_in = usage.get("input_tokens") or estimate_tokens(prompt)
+    tokens_out = usage.get("output_tokens") or estimate_tokens(reply)
+    with _usage_lock:
+        totals = _usage.setdefault(node, {"calls": 0, "tokens_in": 0, "tokens_out": 0})
+        totals["calls"] += 1
+        totals["tokens_in"] += tokens_in
+        totals["tokens_out"] += tokens_out
+    if TOKEN_LOG:
+        print(f"[tokens] {node}: in={tokens_in} out={tokens_out}", file=sys.stderr)
+    return tokens_in, tokens_out
+
+
+def token_stats() -> dict:
+    """Calls and tokens in/out per node since the process started."""
+    with _usage_lock:
+        return {node: dict(totals) for node, totals in _usage.items()}
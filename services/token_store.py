@@ -0,0 +1,139 @@
+"""
+OAuth access tokens shared by every planner worker process.
+
+A token lives in memory and in a small JSON file under the cache directory,
+so a freshly spawned worker reuses the token its siblings already fetched.
+Refreshes are single-flight: within a process one coroutine per event loop
+refreshes while the others wait, and across processes an exclusive flock on
+a sidecar lock file makes late arrivals re-read the file instead of calling
+the OAuth endpoint again. Tokens close to expiry are refreshed in the
+background while the still-valid one keeps being served.
+"""
+from cache import CACHE_DIR
+import asyncio, hashlib, json, os, time, weakref
+
+try:
+    import fcntl
+except ImportError:  # Windows: no cross-process lock, each process refreshes on its own
+    fcntl = None
+
+# Refresh in the background once a token has less than this many seconds left
+TOKEN_REFRESH_MARGIN = float(os.getenv("PLANNER_TOKEN_REFRESH_MARGIN", "300"))
+# Never hand out a token with less than this many seconds left
+TOKEN_MIN_TTL = float(os.getenv("PLANNER_TOKEN_MIN_TTL", "30"))
+
+
+class TokenManager:
+    """
+    Caches one bearer token for `fetch`, an async callable returning
+    (access_token, expires_in_seconds).
+    """
+
+    def __init__(self, name: str, fetch, directory: str = CACHE_DIR):
+        self.fetch = fetch
+        digest = hashlib.sha256(name.encode("utf-8")).hexdigest()[:16]
+        self.path = os.path.join(directory, f"token-{digest}.json")
+        self.lock_path = self.path + ".lock"
+        self.access_token = None
+        self.expires_at = 0.0
+        self.refreshes = 0
+        self._locks = weakref.WeakKeyDictionary()
+        self._background = set()
+
+    def _loop_lock(self) -> asyncio.Lock:
+        loop = asyncio.get_running_loop()
+        lock = self._locks.get(loop)
+        if lock is None:
+            lock = self._locks[loop] = asyncio.Lock()
+        return lock
+
+    def _usable(self, now: float) -> bool:
+        return bool(self.access_token) and now < self.expires_at - TOKEN_MIN_TTL
+
+    def _fresh(self, now: float) -> bool:
+        return bool(self.access_token) and now < self.expires_at - TOKEN_REFRESH_MARGIN
+
+    def _read_file(self):
+        """Adopts the token another process stored, if it is newer than ours."""
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return
+        if data.get("expires_at", 0) > self.expires_at:
+            self.access_token, self.expires_at = data["access_token"], data["expires_at"]
+
+    def _write_file(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp = f"{self.path}.{os.getpid()}.tmp"
+        fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump({"access_token": self.access_token, "expires_at": self.expires_at}, f)
+        os.replace(tmp, self.path)
+
+    def _acquire_file_lock(self):
+        if fcntl is None:
+            return None
+        os.makedirs(os.path.dirname(self.lock_path), exist_ok=True)
+        fd = os.open(self.lock_path, os.O_RDWR | os.O_CREAT, 0o600)
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        return fd
+
+    @staticmethod
+    def _release_file_lock(fd):
+        if fd is not None:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+            os.close(fd)
+
+    def _due(self, rejected) -> bool:
+        """Whether a refresh is needed: the token is close to expiry, or is still the one the API rejected."""
+        return not self._fresh(time.time()) or (rejected is not None and self.access_token == rejected)
+
+    async def _refresh(self, rejected: str = None):
+        """
+        Single-flight refresh; whoever waited on a lock re-checks before fetching, so
+        requests that all failed with the same rejected token cause one fetch between them.
+        """
+        async with self._loop_lock():
+            if not self._due(rejected):
+                return
+            fd = await asyncio.to_thread(self._acquire_file_lock)
+            try:
+                self._read_file()
+                if not self._due(rejected):
+                    return
+                access_token, expires_in = await self.fetch()
+                self.access_token, self.expires_at = access_token, time.time() + float(expires_in)
+                self.refreshes += 1
+                self._write_file()
+            finally:
+                self._release_file_lock(fd)
+
+    async def _refresh_in_background(self):
+        try:
+            await self._refresh()
+        except Exception:
+            pass  # The current token is still valid; the next call retries
+        finally:
+            self._background.discard(asyncio.current_task())
+
+    async def get(self) -> str:
+        """Returns a valid token, fetching one only if no process holds a usable token."""
+        now = time.time()
+        if not self._usable(now):
+            self._read_file()
+        if not self._usable(now):
+            await self._refresh()
+            return self.access_token
+        if not self._fresh(now) and not self._background:
+            task = asyncio.get_running_loop().create_task(self._refresh_in_background())
+            self._background.add(task)
+        return self.access_token
+
+    async def invalidate(self, token: str):
+        """Replaces a token the API rejected, unless another request (or process) already has."""
+        await self._refresh(rejected=token)
+        return await self.get()
+
+    def stats(self) -> dict:
+        return {"refreshes": self.refreshes, "expires_in": max(0, round(self.expires_at - time.time()))}
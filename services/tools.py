@@ -1,58 +1,87 @@
-from dotenv import load_dotenv
-from amadeus import Client, ResponseError
-from geopy.geocoders import Nominatim
-import os, requests, time
-
-load_dotenv()
+import settings
+from http_client import get_async_client, get_background_loop, run_sync
+from cache import make_cache, single_flight
+from token_store import TokenManager
+from gazetteer import find_city, normalize
+from tracing import span
+from records import FlightOffer, HotelOffer, load_offers, parse_offers, to_rows
+from datetime import date as Date, datetime, timedelta
+from functools import lru_cache
+import asyncio, math, os, threading, time, uuid, weakref
 
 #AVIATIONSTACK_API_KEY = os.getenv("AVIATIONSTACK_API_KEY")
 AMADEUS_CLIENT_ID = os.getenv("AMADEUS_CLIENT_ID")
 AMADEUS_CLIENT_SECRET = os.getenv("AMADEUS_CLIENT_SECRET")
+# Overrides the environment's API host, e.g. to point at a local stand-in (see benchmarks/)
+AMADEUS_BASE_URL = os.getenv("AMADEUS_BASE_URL")
 #OPENWEATHER_API_KEY = os.getenv("OPENWEATHER_API_KEY")  Not useful for free tier
-# Direct Amadeus client to bypass SDK issues
+# Amadeus rate-limits per client (the test environment allows ~10 requests/second)
+AMADEUS_MAX_CONCURRENCY = int(os.getenv("PLANNER_AMADEUS_MAX_CONCURRENCY", "4"))
+# Direct Amadeus client to bypass SDK issues (all Amadeus traffic goes through the pooled async client)
 class AmadeusDirectClient:
     def __init__(self, client_id, client_secret, environment='test'):
         self.client_id = client_id
         self.client_secret = client_secret
         self.environment = environment
-        self.base_url = f"https://{environment}.api.amadeus.com" if environment == 'test' else "https://api.amadeus.com"
-        self.access_token = None
-        self.token_expires_at = 0
+        self.base_url = AMADEUS_BASE_URL or (f"https://{environment}.api.amadeus.com" if environment == 'test' else "https://api.amadeus.com")
+        self.tokens = TokenManager(f"amadeus:{environment}:{client_id}", self._fetch_access_token)
+        self._limiters = weakref.WeakKeyDictionary()
+
+    def _limiter(self):
+        """Per-event-loop semaphore bounding concurrent API calls."""
+        loop = asyncio.get_running_loop()
+        limiter = self._limiters.get(loop)
+        if limiter is None:
+            limiter = self._limiters[loop] = asyncio.Semaphore(AMADEUS_MAX_CONCURRENCY)
+        return limiter
     
-    def get_access_token(self):
-        """Get OAuth access token."""
-        if self.access_token and time.time() < self.token_expires_at:
-            return self.access_token
+    async def _fetch_access_token(self):
+        """OAuth client-credentials grant; returns (access_token, expires_in)."""
+        path = "/v1/security/oauth2/token"
         
-        url = f"{self.base_url}/v1/security/oauth2/token"
-        
-        response = requests.post(url,
-            headers={'Content-Type': 'application/x-www-form-urlencoded'},
-            data={
-                'grant_type': 'client_credentials',
-                'client_id': self.client_id,
-                'client_secret': self.client_secret
-            }
-        )
+        with span("http", "amadeus", method="POST", endpoint=path) as call:
+            response = await get_async_client().post(f"{self.base_url}{path}",
+                headers={'Content-Type': 'application/x-www-form-urlencoded'},
+                data={
+                    'grant_type': 'client_credentials',
+                    'client_id': self.client_id,
+                    'client_secret': self.client_secret
+                }
+            )
+            call.set(status=response.status_code, bytes=response.num_bytes_downloaded)
         
         if response.status_code == 200:
             token_data = response.json()
-            self.access_token = token_data['access_token']
-            self.token_expires_at = time.time() + token_data['expires_in'] - 60
-            return self.access_token
+            return token_data['access_token'], token_data['expires_in']
         else:
             raise Exception(f"OAuth failed: {response.status_code} - {response.text}")
+
+    async def aget_access_token(self):
+        """Get OAuth access token (shared with the other worker processes)."""
+        return await self.tokens.get()
+
+    async def _aget(self, path, params, error_prefix):
+        """Authorized GET against the Amadeus API."""
+        token = await self.aget_access_token()
+        for attempt in range(2):
+            async with self._limiter():
+                with span("http", "amadeus", method="GET", endpoint=path) as call:
+                    response = await get_async_client().get(
+                        f"{self.base_url}{path}",
+                        headers={'Authorization': f'Bearer {token}'},
+                        params=params
+                    )
+                    call.set(status=response.status_code, bytes=response.num_bytes_downloaded)
+            # Revoked or expired early: refresh once and retry
+            if response.status_code != 401 or attempt:
+                break
+            token = await self.tokens.invalidate(token)
+        if response.status_code == 200:
+            return response.json()
+        raise Exception(f"{error_prefix}: {response.status_code} - {response.text}")
     
-    def search_flights(self, origin, destination, departure_date, adults=1, max_results=3):
+    async def asearch_flights(self, origin, destination, departure_date, adults=1, max_results=3):
         """Search for flights using direct HTTP calls."""
-        token = self.get_access_token()
-        
-        url = f"{self.base_url}/v2/shopping/flight-offers"
-        headers = {
-            'Authorization': f'Bearer {token}',
-            'Content-Type': 'application/json'
-        }
-        
         params = {
             'originLocationCode': origin,
             'destinationLocationCode': destination,
@@ -60,25 +89,74 @@ class AmadeusDirectClient:
             'adults': adults,
             'max': max_results
         }
-        
-        response = requests.get(url, headers=headers, params=params)
-        
-        if response.status_code == 200:
-            return response.json()
-        else:
-            raise Exception(f"Flight search failed: {response.status_code} - {response.text}")
+        return await self._aget("/v2/shopping/flight-offers", params, "Flight search failed")
+
+    async def asearch_flights_flexible(self, origin, destination, departure_date, flex_days, adults=1, max_results=3):
+        """Searches every departure date within ±flex_days concurrently; returns {date: response}."""
+        dates = flexible_dates(departure_date, flex_days)
+        responses = await asyncio.gather(
+            *(self.asearch_flights(origin, destination, day, adults, max_results) for day in dates),
+            return_exceptions=True,
+        )
+        return {day: response for day, response in zip(dates, responses) if not isinstance(response, Exception)}
+
+    async def alist_hotels_by_city(self, city_code):
+        """Hotel List API: hotels registered in a city."""
+        return await self._aget("/v1/reference-data/locations/hotels/by-city", {'cityCode': city_code}, "Hotel list failed")
 
-# Initialize the direct client
-amadeus_direct = AmadeusDirectClient(AMADEUS_CLIENT_ID, AMADEUS_CLIENT_SECRET, 'test')
+    async def asearch_hotel_offers(self, hotel_ids, checkin_date, checkout_date, adults=1):
+        """Hotel Search API: best offer per hotel for the given stay."""
+        params = {
+            'hotelIds': ','.join(hotel_ids),
+            'adults': adults,
+            'checkInDate': checkin_date,
+            'checkOutDate': checkout_date,
+            'roomQuantity': 1,
+            'bestRateOnly': 'true'
+        }
+        return await self._aget("/v3/shopping/hotel-offers", params, "Hotel offers search failed")
 
-# Keep the original client for hotel searches (they might work)
-amadeus = Client(
-        client_id=AMADEUS_CLIENT_ID,
-        client_secret=AMADEUS_CLIENT_SECRET,
-        hostname='test'
-                )
+    def get_access_token(self):
+        """Synchronous wrapper around aget_access_token."""
+        return run_sync(self.aget_access_token())
+
+    def search_flights(self, origin, destination, departure_date, adults=1, max_results=3):
+        """Synchronous wrapper around asearch_flights."""
+        return run_sync(self.asearch_flights(origin, destination, departure_date, adults, max_results))
+
+    def search_flights_flexible(self, origin, destination, departure_date, flex_days, adults=1, max_results=3):
+        """Synchronous wrapper around asearch_flights_flexible."""
+        return run_sync(self.asearch_flights_flexible(origin, destination, departure_date, flex_days, adults, max_results))
+
+@lru_cache(maxsize=1)
+def get_amadeus_client():
+    """The shared direct client, created on first use."""
+    return AmadeusDirectClient(AMADEUS_CLIENT_ID, AMADEUS_CLIENT_SECRET, 'test')
+
+def __getattr__(name):
+    """`tools.amadeus_direct` still resolves to the shared client."""
+    if name == "amadeus_direct":
+        return get_amadeus_client()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 # --------- FLIGHT API ----------
+# Popular routes get asked for over and over; offers are cached per (route, date, passengers, max_results)
+# as FlightOffer rows
+flight_cache = make_cache(
+    "flight_records",
+    ttl=float(os.getenv("PLANNER_FLIGHT_CACHE_TTL", "3600")),
+    maxsize=int(os.getenv("PLANNER_FLIGHT_CACHE_SIZE", "2048")),
+)
+# Widest ± window a flexible-date search may ask for
+FLIGHT_FLEX_MAX_DAYS = int(os.getenv("PLANNER_FLIGHT_FLEX_MAX_DAYS", "7"))
+
+def flexible_dates(date, flex_days):
+    """Departure dates within ±flex_days of date (capped, never in the past), in order."""
+    center = datetime.strptime(date, "%Y-%m-%d").date()
+    flex_days = max(0, min(int(flex_days), FLIGHT_FLEX_MAX_DAYS))
+    days = (center + timedelta(days=offset) for offset in range(-flex_days, flex_days + 1))
+    return [day.isoformat() for day in days if day >= Date.today()]
+
 # Uncomment the following lines if you want to use AviationStack API (but unreliable for future flights and limited calls)
 # def get_flights_data(departure, arrival, date=None):
 #     url = "http://api.aviationstack.com/v1/flights"
@@ -95,49 +173,110 @@ amadeus = Client(
 #         return res.json().get("data", [])[:3]
 #     except Exception as e:
 #         return [{"error": str(e)}]
-def get_flights_data(departure, arrival, date=None):
+@single_flight("flights")
+async def aget_flights_data(departure, arrival, date=None, adults=1, max_results=3):
+    """FlightOffer records, cheapest first, or [{"error": ...}] if the search failed."""
+    cache_key = (departure.upper(), arrival.upper(), date, adults, max_results)
+    cached = flight_cache.get(cache_key)
+    if cached is not None:
+        return load_offers(FlightOffer, cached)
+
     try:
         # Use the direct client instead of the SDK
-        response = amadeus_direct.search_flights(
+        response = await get_amadeus_client().asearch_flights(
             origin=departure.upper(),
             destination=arrival.upper(),
             departure_date=date,
-            adults=1,
-            max_results=3
+            adults=adults,
+            max_results=max_results
         )
 
-        flights = response.get('data', [])
-        top_flights = []
-
-        for flight in flights:
-            itinerary = flight['itineraries'][0]
-            segments = itinerary['segments']
-            duration = itinerary['duration']
-            price = flight['price']['total']
-            currency = flight['price']['currency']
-
-            top_flights.append({
-                "price": f"{price} {currency}",
-                "duration": duration,
-                "segments": [
-                    {
-                        "from": seg['departure']['iataCode'],
-                        "to": seg['arrival']['iataCode'],
-                        "airline": seg['carrierCode'],
-                        "flightNumber": seg['number'],
-                        "departureTime": seg['departure']['at'],
-                        "arrivalTime": seg['arrival']['at']
-                    } for seg in segments
-                ]
-            })
-
+        top_flights = sorted(parse_offers(FlightOffer, response.get('data', [])), key=lambda offer: offer.price)
+        flight_cache.set(cache_key, to_rows(top_flights))
         return top_flights
 
     except Exception as e:
         return [{"error": str(e)}]
 
+def get_flights_data(departure, arrival, date=None, adults=1, max_results=3):
+    """Synchronous wrapper around aget_flights_data."""
+    return run_sync(aget_flights_data(departure, arrival, date, adults, max_results))
+
+async def aget_flight_calendar(departure, arrival, date, flex_days=3, adults=1, max_results=3):
+    """
+    Cheapest offer for every departure date within ±flex_days of date.
+
+    Each day is an ordinary aget_flights_data lookup, so days already in the
+    flight cache cost nothing and the rest run concurrently under the Amadeus
+    concurrency limit; the whole window takes about as long as one search.
+
+    Returns:
+        {"YYYY-MM-DD": FlightOffer or None} in date order, None marking days without
+        offers (or whose search failed).
+    """
+    try:
+        dates = flexible_dates(date, flex_days)
+    except (TypeError, ValueError) as e:
+        return {"error": str(e)}
+
+    results = await asyncio.gather(
+        *(aget_flights_data(departure, arrival, day, adults, max_results) for day in dates)
+    )
+    calendar = {}
+    for day, offers in zip(dates, results):
+        offers = [offer for offer in offers if isinstance(offer, FlightOffer)]
+        calendar[day] = min(offers, key=lambda offer: offer.price) if offers else None
+    return calendar
+
+def get_flight_calendar(departure, arrival, date, flex_days=3, adults=1, max_results=3):
+    """Synchronous wrapper around aget_flight_calendar."""
+    return run_sync(aget_flight_calendar(departure, arrival, date, flex_days, adults, max_results))
+
 # --------- HOTEL API (Amadeus) ----------
-def get_hotels_data(city_code: str, checkin_date: str, checkout_date: str, adults: int = 1):
+# The set of hotels in a city changes over weeks, so phase 1 of the hotel search is cached for a
+# long time and refreshed in the background once an entry is older than HOTEL_LIST_REFRESH_AFTER.
+hotel_list_cache = make_cache(
+    "hotel_lists",
+    ttl=float(os.getenv("PLANNER_HOTEL_LIST_TTL", str(14 * 24 * 3600))),
+    maxsize=int(os.getenv("PLANNER_HOTEL_LIST_CACHE_SIZE", "1024")),
+)
+HOTEL_LIST_REFRESH_AFTER = float(os.getenv("PLANNER_HOTEL_LIST_REFRESH_AFTER", str(24 * 3600)))
+_hotel_list_refreshing = set()
+_background_tasks = set()
+
+async def _fetch_hotel_ids(city_code: str) -> list:
+    """Calls the Hotel List API and stores the city's hotel IDs."""
+    hotel_list_response = await get_amadeus_client().alist_hotels_by_city(city_code)
+    # Extract the hotel IDs from the response. The Hotel Search API requires these.
+    hotel_ids = [hotel['hotelId'] for hotel in hotel_list_response.get('data', [])]
+    if hotel_ids:
+        hotel_list_cache.set(city_code, hotel_ids)
+    return hotel_ids
+
+async def _refresh_hotel_ids(city_code: str):
+    try:
+        await _fetch_hotel_ids(city_code)
+    except Exception:
+        pass  # Keep serving the cached list; the next stale hit retries
+    finally:
+        _hotel_list_refreshing.discard(city_code)
+
+async def aget_hotel_ids(city_code: str) -> list:
+    """Hotel IDs for a city, served from the persistent cache whenever possible."""
+    entry = hotel_list_cache.get_entry(city_code)
+    if entry is None:
+        return await _fetch_hotel_ids(city_code)
+
+    hotel_ids, stored_at = entry
+    if time.time() - stored_at > HOTEL_LIST_REFRESH_AFTER and city_code not in _hotel_list_refreshing:
+        _hotel_list_refreshing.add(city_code)
+        task = asyncio.create_task(_refresh_hotel_ids(city_code))
+        _background_tasks.add(task)
+        task.add_done_callback(_background_tasks.discard)
+    return hotel_ids
+
+@single_flight("hotels")
+async def aget_hotels_data(city_code: str, checkin_date: str, checkout_date: str, adults: int = 1):
     """
     Implements the two-phase hotel search to fetch offers for a given city.
 
@@ -145,46 +284,38 @@ def get_hotels_data(city_code: str, checkin_date: str, checkout_date: str, adult
     and then uses the Hotel Search API to get real-time offers for those hotels.
 
     Args:
-        amadeus: An initialized Amadeus API client instance.
         city_code: The IATA code for the city (e.g., 'PAR').
         checkin_date: The check-in date in 'YYYY-MM-DD' format.
         checkout_date: The check-out date in 'YYYY-MM-DD' format.
         adults: The number of adults per room.
 
     Returns:
-        A list of hotel offer dictionaries, or an error dictionary if an issue occurs.
+        HotelOffer records, cheapest first, or a one-item list with an "error" or
+        "message" dictionary if an issue occurs.
     """
     # --- Phase 1: Get Hotel IDs from City Code ---
-    # This call translates the city code into a list of specific hotel properties.
+    # This translates the city code into a list of specific hotel properties (cached, see aget_hotel_ids).
     try:
-        hotel_list_response = amadeus.reference_data.locations.hotels.by_city.get(
-            cityCode=city_code
-        )
-        hotels = hotel_list_response.data
-    except ResponseError as e:
+        hotel_ids = await aget_hotel_ids(city_code)
+    except Exception as e:
         return [{"error": f"Hotel List API Error: {e}"}]
 
     # --- Edge Case Handling for Phase 1 ---
     # If the Hotel List API returns no hotels, there is nothing to search for.
-    if not hotels:
+    if not hotel_ids:
         return [{"message": f"No hotels found for city code: {city_code}"}]
 
-    # Extract the hotel IDs from the response. The Hotel Search API requires these.
-    hotel_ids = [hotel['hotelId'] for hotel in hotels]
-
     # --- Phase 2: Get Hotel Offers from Hotel IDs ---
     # This call uses the collected hotel IDs to find real-time offers.
     try:
-        hotel_offers_response = amadeus.shopping.hotel_offers_search.get(
-            hotelIds=','.join(hotel_ids[:20]),  # Using a slice to respect API limits
-            adults=adults,
-            checkInDate=checkin_date,
-            checkOutDate=checkout_date,
-            roomQuantity=1,
-            bestRateOnly=True # This valid parameter can be used
+        hotel_offers_response = await get_amadeus_client().asearch_hotel_offers(
+            hotel_ids[:20],  # Using a slice to respect API limits
+            checkin_date,
+            checkout_date,
+            adults
         )
-        offers = hotel_offers_response.data
-    except ResponseError as e:
+        offers = sorted(parse_offers(HotelOffer, hotel_offers_response.get('data', [])), key=lambda offer: offer.price)
+    except Exception as e:
         # Handle API errors during the offer search.
         return [{"error": f"Hotel Offers API Error: {e}"}]
 
@@ -194,6 +325,82 @@ def get_hotels_data(city_code: str, checkin_date: str, checkout_date: str, adult
         return [{"message": f"No offers available for the hotels in {city_code} on the selected dates."}]
 
     return offers
+
+def get_hotels_data(city_code: str, checkin_date: str, checkout_date: str, adults: int = 1):
+    """Synchronous wrapper around aget_hotels_data."""
+    return run_sync(aget_hotels_data(city_code, checkin_date, checkout_date, adults))
+
+# --------- SPECULATIVE HOTEL SEARCH ----------
+# The hotel search only needs the city code and dates, so it is started as soon as they
+# are extracted; HotelAgent later takes the result instead of searching again.
+HOTEL_PREFETCH_TTL = float(os.getenv("PLANNER_HOTEL_PREFETCH_TTL", "300"))
+_hotel_prefetches = {}  # ticket -> (search args, concurrent future, started at)
+_hotel_prefetch_lock = threading.Lock()
+_hotel_prefetch_counts = {"started": 0, "hits": 0, "misses": 0, "expired": 0}
+
+def _expire_hotel_prefetches():
+    """Drops prefetches nobody picked up (e.g. the run stopped before HotelAgent)."""
+    cutoff = time.monotonic() - HOTEL_PREFETCH_TTL
+    with _hotel_prefetch_lock:
+        stale = [ticket for ticket, (_, _, started) in _hotel_prefetches.items() if started < cutoff]
+        for ticket in stale:
+            _hotel_prefetches.pop(ticket)[1].cancel()
+        _hotel_prefetch_counts["expired"] += len(stale)
+
+def prefetch_hotels(city_code: str, checkin_date: str, checkout_date: str, adults: int = 1) -> str:
+    """Starts aget_hotels_data on the background loop; returns a ticket for take_hotel_prefetch."""
+    _expire_hotel_prefetches()
+    args = (city_code, checkin_date, checkout_date, adults)
+    future = asyncio.run_coroutine_threadsafe(aget_hotels_data(*args), get_background_loop())
+    ticket = uuid.uuid4().hex
+    with _hotel_prefetch_lock:
+        _hotel_prefetches[ticket] = (args, future, time.monotonic())
+        _hotel_prefetch_counts["started"] += 1
+    return ticket
+
+def take_hotel_prefetch(ticket: str, city_code: str, checkin_date: str, checkout_date: str, adults: int = 1):
+    """
+    Result of a prefetched search, waiting for it if needed.
+
+    Returns None (and discards the prefetch) when there is no such ticket, the search
+    was for different parameters, or it failed; the caller then searches normally.
+    """
+    with _hotel_prefetch_lock:
+        entry = _hotel_prefetches.pop(ticket, None) if ticket else None
+    if entry is None:
+        return None
+    args, future, _ = entry
+    if args != (city_code, checkin_date, checkout_date, adults):
+        future.cancel()
+        with _hotel_prefetch_lock:
+            _hotel_prefetch_counts["misses"] += 1
+        return None
+    try:
+        result = future.result()
+    except Exception:
+        result = None
+    with _hotel_prefetch_lock:
+        _hotel_prefetch_counts["hits" if result is not None else "misses"] += 1
+    return result
+
+def discard_hotel_prefetch(ticket: str):
+    """Cancels a prefetch that will not be used."""
+    with _hotel_prefetch_lock:
+        entry = _hotel_prefetches.pop(ticket, None) if ticket else None
+        if entry is not None:
+            _hotel_prefetch_counts["misses"] += 1
+    if entry is not None:
+        entry[1].cancel()
+
+def hotel_prefetch_stats() -> dict:
+    """Speculation counters: hits were used, misses and expired prefetches were wasted calls."""
+    with _hotel_prefetch_lock:
+        counts = dict(_hotel_prefetch_counts)
+        counts["pending"] = len(_hotel_prefetches)
+    settled = counts["hits"] + counts["misses"] + counts["expired"]
+    counts["wasted"] = counts["misses"] + counts["expired"]
+    counts["hit_rate"] = round(counts["hits"] / settled, 3) if settled else 0.0
+    return counts
 # --------- WEATHER API ----------
 # def get_weather_data(city):
 #     url = "https://api.openweathermap.org/data/2.5/weather"
@@ -210,73 +417,118 @@ def get_hotels_data(city_code: str, checkin_date: str, checkout_date: str, adult
 #         return {"error": str(e)}
 
 # --------- RESTAURANTS ----------
-def get_city_coordinates(city):
+NOMINATIM_URL = os.getenv("PLANNER_NOMINATIM_URL", "https://nominatim.openstreetmap.org/search")
+OVERPASS_URL = os.getenv("PLANNER_OVERPASS_URL", "http://overpass-api.de/api/interpreter")
+
+# Live geocoding results are kept forever; cities don't move
+geocode_cache = make_cache(
+    "geocode",
+    ttl=None,
+    maxsize=int(os.getenv("PLANNER_GEOCODE_CACHE_SIZE", "50000")),
+)
+
+@single_flight("geocode")
+async def aget_city_coordinates(city):
     """
-    Returns the latitude and longitude of a city using Nominatim with fallback support.
-    Includes comprehensive error handling for SSL and network issues.
+    Returns the latitude and longitude of a city.
+
+    Resolution order: the bundled gazetteer (exact, alias, then fuzzy match), the
+    persistent geocoding cache, and finally a live Nominatim lookup whose result is
+    cached. Returns (None, None) if the city can't be located.
     """
-    # First try hardcoded coordinates for common cities
-    fallback_coords = get_fallback_coordinates(city)
-    if fallback_coords:
-        return fallback_coords
+    known = find_city(city, fuzzy=True)
+    if known:
+        return known.lat, known.lon
+
+    cache_key = normalize(city)
+    cached = geocode_cache.get(cache_key)
+    if cached is not None:
+        return tuple(cached)
     
     # Try geocoding with error handling
     try:
-        geolocator = Nominatim(user_agent="restaurant_agent")
-        location = geolocator.geocode(city, timeout=5)
-        if location:
-            return location.latitude, location.longitude
-        else:
-            # Return default coordinates (London) as last resort
-            return 51.5074, -0.1278
-            
+        with span("http", "nominatim", method="GET", endpoint="/search") as call:
+            response = await get_async_client().get(
+                NOMINATIM_URL,
+                params={"q": city, "format": "json", "limit": 1},
+                headers={"User-Agent": "restaurant_agent"},
+                timeout=5
+            )
+            call.set(status=response.status_code, bytes=response.num_bytes_downloaded)
+        response.raise_for_status()
+        locations = response.json()
+        if locations:
+            coords = float(locations[0]["lat"]), float(locations[0]["lon"])
+            geocode_cache.set(cache_key, list(coords))
+            return coords
     except Exception as e:
-        # Return default coordinates (London) as last resort
-        return 51.5074, -0.1278
+        pass
+    return None, None
 
-def get_fallback_coordinates(city):
-    """
-    Returns hardcoded coordinates for common cities as fallback.
-    """
-    city_lower = city.lower().strip()
+def get_city_coordinates(city):
+    """Synchronous wrapper around aget_city_coordinates."""
+    return run_sync(aget_city_coordinates(city))
     
-    fallback_coords = {
-        'paris': (48.8566, 2.3522),
-        'london': (51.5074, -0.1278),
-        'new york': (40.7128, -74.0060),
-        'nyc': (40.7128, -74.0060),
-        'tokyo': (35.6762, 139.6503),
-        'madrid': (40.4168, -3.7038),
-        'rome': (41.9028, 12.4964),
-        'berlin': (52.5200, 13.4050),
-        'amsterdam': (52.3676, 4.9041),
-        'barcelona': (41.3851, 2.1734),
-        'milan': (45.4642, 9.1900),
-        'vienna': (48.2082, 16.3738),
-        'prague': (50.0755, 14.4378),
-        'zurich': (47.3769, 8.5417),
-        'geneva': (46.2044, 6.1432),
-        'dubai': (25.2048, 55.2708),
-        'singapore': (1.3521, 103.8198),
-        'hong kong': (22.3193, 114.1694),
-        'sydney': (-33.8688, 151.2093),
-        'melbourne': (-37.8136, 144.9631),
-        'los angeles': (34.0522, -118.2437),
-        'san francisco': (37.7749, -122.4194),
-        'chicago': (41.8781, -87.6298),
-        'mumbai': (19.0760, 72.8777),
-        'delhi': (28.7041, 77.1025),
-        'bangalore': (12.9716, 77.5946),
-        'toronto': (43.6532, -79.3832),
-        'vancouver': (49.2827, -123.1207),
-        'montreal': (45.5017, -73.5673)
+# Overpass returns matches in storage (quadtile) order, not by distance, so fetch a bounded
+# pool of candidates and rank them locally. A pool cut off by the cap is an arbitrary subset,
+# so the search retries once with a quarter of the radius, where the cap rarely bites.
+OVERPASS_FIELDS = ["::lat", "::lon", "name", "cuisine", '"addr:full"', '"addr:street"', '"addr:housenumber"']
+OVERPASS_CANDIDATES_PER_RESULT = int(os.getenv("PLANNER_OVERPASS_CANDIDATES_PER_RESULT", "20"))
+OVERPASS_MIN_CANDIDATES = int(os.getenv("PLANNER_OVERPASS_MIN_CANDIDATES", "100"))
+OVERPASS_MIN_RADIUS = int(os.getenv("PLANNER_OVERPASS_MIN_RADIUS", "125"))
+OVERPASS_TIMEOUT = int(os.getenv("PLANNER_OVERPASS_TIMEOUT", "25"))
+# Restaurants don't open and close by the hour; Overpass answers are kept per (point, radius, limit)
+restaurant_cache = make_cache(
+    "restaurants",
+    ttl=float(os.getenv("PLANNER_RESTAURANT_CACHE_TTL", "604800")),
+    maxsize=int(os.getenv("PLANNER_RESTAURANT_CACHE_SIZE", "5000")),
+)
+
+def parse_overpass_row(line):
+    """One tab-separated Overpass CSV row as a restaurant dict, or None if malformed."""
+    cols = line.rstrip("\r\n").split("\t")
+    if len(cols) != len(OVERPASS_FIELDS):
+        return None
+    try:
+        row_lat, row_lon = float(cols[0]), float(cols[1])
+    except ValueError:
+        return None
+    name, cuisine, full, street, housenumber = cols[2:]
+    return {
+        "name": name or "Unnamed Restaurant",
+        "cuisine": cuisine or "Unknown",
+        "lat": row_lat,
+        "lon": row_lon,
+        "address": full or f"{street} {housenumber}".strip()
     }
-    
-    return fallback_coords.get(city_lower)
-    
-def get_restaurants_data(lat, lon, radius=1000, limit=5):
+
+def nearest_restaurants(lat, lon, restaurants, limit):
+    """The limit restaurants closest to (lat, lon), nearest first."""
+    if not restaurants:
+        return []
+    try:
+        from restaurant_index import haversine_m
+        distances = haversine_m(lat, lon, [r["lat"] for r in restaurants], [r["lon"] for r in restaurants]).tolist()
+    except ImportError:
+        # Equirectangular approximation is plenty to order points a few km apart
+        scale = math.cos(math.radians(lat))
+        distances = [math.hypot(r["lat"] - lat, (r["lon"] - lon) * scale) for r in restaurants]
+    order = sorted(range(len(restaurants)), key=distances.__getitem__)
+    return [restaurants[i] for i in order[:limit]]
+
+def get_restaurant_index():
+    """The local OSM restaurant index, or None if it isn't built (or numpy is missing)."""
+    try:
+        from restaurant_index import load_index
+    except ImportError:
+        return None
+    return load_index()
+
+@single_flight("restaurants")
+async def aget_restaurants_data(lat, lon, radius=1000, limit=5):
     """
-    Fetch nearby restaurants using Overpass API with coordinates.
+    Fetch nearby restaurants from the local OSM index when it covers the
+    coordinates, otherwise from the Overpass API.
 
     Args:
         lat (float): Latitude.
@@ -285,34 +537,60 @@ def get_restaurants_data(lat, lon, radius=1000, limit=5):
         limit (int): Number of restaurants.
 
     Returns:
-        List of restaurants or error dict.
+        List of restaurants, closest first, or error dict.
     """
-    try:
-        overpass_url = "http://overpass-api.de/api/interpreter"
-        query = f"""
-        [out:json];
-        node
-          ["amenity"="restaurant"]
-          (around:{radius},{lat},{lon});
-        out body;
-        """
-        res = requests.post(overpass_url, data={"data": query})
-        res.raise_for_status()
-        data = res.json()
-
-        restaurants = []
-        for element in data.get("elements", [])[:limit]:
-            tags = element.get("tags", {})
-            restaurants.append({
-                "name": tags.get("name", "Unnamed Restaurant"),
-                "cuisine": tags.get("cuisine", "Unknown"),
-                "lat": element.get("lat"),
-                "lon": element.get("lon"),
-                "address": tags.get("addr:full") or f"{tags.get('addr:street', '')} {tags.get('addr:housenumber', '')}".strip()
-            })
-
-        return restaurants
+    index = get_restaurant_index()
+    if index is not None and index.covers(lat, lon):
+        return index.query(lat, lon, radius, limit)
+
+    # ~11 m grid, so the same city centre geocoded twice hits the same entry
+    cache_key = f"{lat:.4f},{lon:.4f},{radius},{limit}"
+    cached = restaurant_cache.get(cache_key)
+    if cached is not None:
+        return cached
 
+    try:
+        candidates = max(limit * OVERPASS_CANDIDATES_PER_RESULT, OVERPASS_MIN_CANDIDATES)
+        rows = await _aquery_overpass(lat, lon, radius, candidates)
+        if len(rows) >= candidates and radius > OVERPASS_MIN_RADIUS:
+            # Capped: one retry on a circle a sixteenth the size. If that is capped too, its
+            # sample already lies within a few hundred metres; if it has too few, the rest
+            # come from the wider circle's sample (all of them are farther away).
+            outer = rows
+            rows = await _aquery_overpass(lat, lon, max(radius // 4, OVERPASS_MIN_RADIUS), candidates)
+            if len(rows) < limit:
+                seen = {(row["lat"], row["lon"]) for row in rows}
+                rows += [row for row in outer if (row["lat"], row["lon"]) not in seen]
+        restaurants = nearest_restaurants(lat, lon, rows, limit)
     except Exception as e:
         return {"error": str(e)}
+    restaurant_cache.set(cache_key, restaurants)
+    return restaurants
 
+async def _aquery_overpass(lat, lon, radius, candidates):
+    """Restaurants within radius (metres) in Overpass order, at most candidates of them."""
+    # CSV output carries only the columns we use; "out qt N" caps the result server-side
+    query = f"""
+    [out:csv({",".join(OVERPASS_FIELDS)};false;"\\t")][timeout:{OVERPASS_TIMEOUT}];
+    node
+      ["amenity"="restaurant"]
+      (around:{radius},{lat},{lon});
+    out qt {candidates};
+    """
+    rows = []
+    with span("http", "overpass", method="POST", endpoint="/api/interpreter") as call:
+        async with get_async_client().stream("POST", OVERPASS_URL, data={"data": query}) as res:
+            call.set(status=res.status_code, radius=radius)
+            res.raise_for_status()
+            async for line in res.aiter_lines():
+                row = parse_overpass_row(line)
+                if row:
+                    rows.append(row)
+                    if len(rows) >= candidates:
+                        break
+            call.set(bytes=res.num_bytes_downloaded)
+    return rows
+
+def get_restaurants_data(lat, lon, radius=1000, limit=5):
+    """Synchronous wrapper around aget_restaurants_data."""
+    return run_sync(aget_restaurants_data(lat, lon, radius, limit))
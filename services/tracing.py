@@ -0,0 +1,245 @@
+"""
+Tracing spans and latency metrics for planner runs.
+
+Each graph run opens a trace; graph nodes, HTTP calls to the external APIs
+and LLM invocations inside it open spans. The current trace and span live in
+contextvars, so spans nest on their own, follow the run into the branch
+threads and the shared HTTP loop, and concurrent runs never mix.
+
+Every finished span feeds in-process histograms and counters, rendered in the
+Prometheus text format by prometheus_text() (the worker's "metrics" request).
+That costs a clock read and a dict update per span. Full traces are kept only
+for a sampled share of runs and appended to PLANNER_TRACE_FILE, one JSON
+object per span and line, written in one piece when the run ends.
+"""
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+from threading import Lock
+import json, os, random, sys, time
+
+METRICS_ENABLED = os.getenv("PLANNER_METRICS", "1") == "1"
+TRACE_FILE = os.getenv("PLANNER_TRACE_FILE", "")
+# Share of runs whose spans are written to TRACE_FILE
+TRACE_SAMPLE_RATE = float(os.getenv("PLANNER_TRACE_SAMPLE_RATE", "0.1"))
+# Upper bounds (seconds) of the latency histogram buckets
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+_current_trace = ContextVar("planner_trace", default=None)
+_current_span = ContextVar("planner_span", default=None)
+_trace_file_lock = Lock()
+
+
+# --------- SPANS ----------
+class Span:
+    """One timed operation; attributes set while it is open end up in the trace and the metrics."""
+
+    __slots__ = ("trace_id", "span_id", "parent_id", "kind", "name", "attrs", "start", "duration", "error")
+
+    def __init__(self, trace_id, parent_id, kind: str, name: str, attrs: dict):
+        self.trace_id = trace_id
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent_id
+        self.kind = kind
+        self.name = name
+        self.attrs = attrs
+        self.start = time.time()
+        self.duration = 0.0
+        self.error = None
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+    def to_dict(self) -> dict:
+        record = {
+            "trace_id": self.trace_id, "span_id": self.span_id, "parent_id": self.parent_id,
+            "kind": self.kind, "name": self.name, "start": round(self.start, 6),
+            "duration_ms": round(self.duration * 1000, 3), "attrs": self.attrs,
+        }
+        if self.error:
+            record["error"] = self.error
+        return record
+
+
+class Trace:
+    """The spans of one run; only sampled traces collect them."""
+
+    def __init__(self, sampled: bool):
+        self.trace_id = os.urandom(16).hex()
+        self.sampled = sampled
+        self.spans = []
+        self._lock = Lock()
+
+    def add(self, span: Span):
+        with self._lock:
+            self.spans.append(span)
+
+    def export(self):
+        """Appends the trace to TRACE_FILE in a single write so concurrent runs don't interleave."""
+        with self._lock:
+            lines = "".join(json.dumps(s.to_dict(), ensure_ascii=False, default=str) + "\n" for s in self.spans)
+        try:
+            with _trace_file_lock, open(TRACE_FILE, "a", encoding="utf-8") as f:
+                f.write(lines)
+        except OSError as e:
+            print(f"[tracing] could not write {TRACE_FILE}: {e}", file=sys.stderr)
+
+
+@contextmanager
+def _open_span(trace, kind: str, name: str, attrs: dict):
+    parent = _current_span.get()
+    current = Span(trace.trace_id if trace else None, parent.span_id if parent else None, kind, name, attrs)
+    token = _current_span.set(current)
+    started = time.perf_counter()
+    try:
+        yield current
+    except BaseException as e:
+        current.error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        current.duration = time.perf_counter() - started
+        _current_span.reset(token)
+        if METRICS_ENABLED:
+            observe_span(current)
+        if trace is not None and trace.sampled:
+            trace.add(current)
+
+
+@contextmanager
+def trace_run(name: str, **attrs):
+    """Opens the trace of one graph run (its root span has kind "run")."""
+    sampled = bool(TRACE_FILE) and random.random() < TRACE_SAMPLE_RATE
+    if not (sampled or METRICS_ENABLED):
+        yield None
+        return
+    current = Trace(sampled)
+    token = _current_trace.set(current)
+    try:
+        with _open_span(current, "run", name, attrs) as root:
+            yield root
+    finally:
+        _current_trace.reset(token)
+        if sampled:
+            current.export()
+
+
+@contextmanager
+def span(kind: str, name: str, **attrs):
+    """
+    Times the block as a span of the current run (kind is "node", "http" or "llm").
+    Outside a run it still counts towards the metrics.
+    """
+    trace = _current_trace.get()
+    if not METRICS_ENABLED and not (trace is not None and trace.sampled):
+        yield _NOOP_SPAN
+        return
+    with _open_span(trace, kind, name, attrs) as current:
+        yield current
+
+
+class _NoopSpan:
+    def set(self, **attrs):
+        pass
+
+
+_NOOP_SPAN = _NoopSpan()
+
+
+def traced_node(name: str, node):
+    """Wraps a graph node so each call is a "node" span."""
+    def traced(State):
+        with span("node", name):
+            return node(State)
+    traced.__name__ = getattr(node, "__name__", name)
+    traced.__doc__ = node.__doc__
+    return traced
+
+
+# --------- METRICS ----------
+METRIC_HELP = {
+    "planner_run_duration_seconds": ("histogram", "Wall time of a planner graph run."),
+    "planner_node_duration_seconds": ("histogram", "Time spent in one call of a graph node."),
+    "planner_http_request_duration_seconds": ("histogram", "Latency of HTTP calls to the external APIs."),
+    "planner_http_response_bytes_total": ("counter", "Response bytes received from the external APIs."),
+    "planner_llm_duration_seconds": ("histogram", "Latency of LLM invocations, including streaming."),
+    "planner_llm_tokens_total": ("counter", "Prompt and completion tokens per model and node."),
+}
+
+_histograms = {}
+_counters = {}
+_metrics_lock = Lock()
+
+
+def _observe(metric: str, labels: tuple, seconds: float):
+    with _metrics_lock:
+        series = _histograms.get((metric, labels))
+        if series is None:
+            series = _histograms[(metric, labels)] = [[0] * (len(LATENCY_BUCKETS) + 1), 0.0]
+        series[0][bisect_left(LATENCY_BUCKETS, seconds)] += 1
+        series[1] += seconds
+
+
+def _increment(metric: str, labels: tuple, amount):
+    if not amount:
+        return
+    with _metrics_lock:
+        _counters[(metric, labels)] = _counters.get((metric, labels), 0) + amount
+
+
+def observe_span(s: Span):
+    """Folds a finished span into the metrics of its kind."""
+    status = "error" if s.error else "ok"
+    if s.kind == "run":
+        _observe("planner_run_duration_seconds", (("status", status),), s.duration)
+    elif s.kind == "node":
+        _observe("planner_node_duration_seconds", (("node", s.name), ("status", status)), s.duration)
+    elif s.kind == "http":
+        service, endpoint = ("service", s.name), ("endpoint", s.attrs.get("endpoint", ""))
+        code = str(s.attrs.get("status") or "error")
+        _observe("planner_http_request_duration_seconds", (service, endpoint, ("status", code)), s.duration)
+        _increment("planner_http_response_bytes_total", (service, endpoint), s.attrs.get("bytes"))
+    elif s.kind == "llm":
+        node, model = ("node", s.name), ("model", s.attrs.get("model", ""))
+        _observe("planner_llm_duration_seconds", (model, node, ("status", status)), s.duration)
+        _increment("planner_llm_tokens_total", (model, node, ("type", "prompt")), s.attrs.get("prompt_tokens"))
+        _increment("planner_llm_tokens_total", (model, node, ("type", "completion")), s.attrs.get("completion_tokens"))
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labels) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in labels) + "}"
+
+
+def _format_value(value) -> str:
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def prometheus_text() -> str:
+    """All metrics of this process in the Prometheus text exposition format."""
+    with _metrics_lock:
+        histograms = {key: (list(counts), total) for key, (counts, total) in _histograms.items()}
+        counters = dict(_counters)
+
+    lines = []
+    for metric, (kind, help_text) in METRIC_HELP.items():
+        lines += [f"# HELP {metric} {help_text}", f"# TYPE {metric} {kind}"]
+        if kind == "counter":
+            for (name, labels), value in sorted(counters.items()):
+                if name == metric:
+                    lines.append(f"{metric}{_format_labels(labels)} {_format_value(value)}")
+            continue
+        for (name, labels), (counts, total) in sorted(histograms.items()):
+            if name != metric:
+                continue
+            cumulative = 0
+            for bound, count in zip(LATENCY_BUCKETS + ("+Inf",), counts):
+                cumulative += count
+                lines.append(f"{metric}_bucket{_format_labels(labels + (('le', str(bound)),))} {cumulative}")
+            lines.append(f"{metric}_sum{_format_labels(labels)} {_format_value(round(total, 6))}")
+            lines.append(f"{metric}_count{_format_labels(labels)} {cumulative}")
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,117 @@
+from dataclasses import dataclass, asdict
+from datetime import datetime, timedelta
+from dateutil.parser import parse
+import re
+
+_IATA = re.compile(r"^[A-Z]{3}$")
+
+
+def _clean_text(value) -> str:
+    """Strips a free-text value and maps LLM placeholders like 'null' to ''."""
+    if value is None:
+        return ""
+    value = str(value).strip()
+    return "" if value.lower() in ("", "null", "none", "n/a", "unknown") else value
+
+
+def _clean_iata(value) -> str:
+    """Returns a 3-letter upper-case IATA code, or '' if the value isn't one."""
+    value = _clean_text(value).upper()
+    return value if _IATA.match(value) else ""
+
+
+def _clean_date(value) -> str:
+    """Normalizes a date to 'YYYY-MM-DD', or '' if it can't be parsed."""
+    value = _clean_text(value)
+    if not value:
+        return ""
+    try:
+        return parse(value, fuzzy=True).strftime("%Y-%m-%d")
+    except Exception:
+        return ""
+
+
+def _clean_int(value, default: int = 0, minimum: int = 0) -> int:
+    """Coerces a count to an int no smaller than minimum, falling back to default."""
+    try:
+        value = int(float(value))
+    except (TypeError, ValueError):
+        return default
+    return value if value >= minimum else default
+
+
+@dataclass(frozen=True)
+class TripParams:
+    """Validated trip parameters shared by every agent."""
+    origin_city: str = ""
+    origin_iata: str = ""             # departure airport, e.g. BOM
+    destination_city: str = ""
+    destination_iata: str = ""        # arrival airport, e.g. CDG
+    destination_city_code: str = ""   # hotel city code, e.g. PAR
+    travel_date: str = ""             # YYYY-MM-DD
+    checkin_date: str = ""            # YYYY-MM-DD
+    checkout_date: str = ""           # YYYY-MM-DD
+    adults: int = 1
+    duration_days: int = 0
+    flex_days: int = 0                # ± days the departure may move for the fare calendar
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "TripParams":
+        """
+        Builds TripParams from loosely-typed input (e.g. LLM JSON), validating each field
+        and deriving whatever can be derived: check-in defaults to the travel date, and
+        check-out and duration are filled from each other.
+        """
+        data = data or {}
+        travel_date = _clean_date(data.get("travel_date"))
+        checkin_date = _clean_date(data.get("checkin_date")) or travel_date
+        checkout_date = _clean_date(data.get("checkout_date"))
+        duration_days = _clean_int(data.get("duration_days"))
+
+        if checkin_date and checkout_date and checkout_date <= checkin_date:
+            checkout_date = ""
+        if checkin_date and not checkout_date and duration_days:
+            checkout = datetime.strptime(checkin_date, "%Y-%m-%d") + timedelta(days=duration_days)
+            checkout_date = checkout.strftime("%Y-%m-%d")
+        if checkin_date and checkout_date and not duration_days:
+            duration_days = (datetime.strptime(checkout_date, "%Y-%m-%d")
+                             - datetime.strptime(checkin_date, "%Y-%m-%d")).days
+
+        return cls(
+            origin_city=_clean_text(data.get("origin_city")),
+            origin_iata=_clean_iata(data.get("origin_iata")),
+            destination_city=_clean_text(data.get("destination_city")),
+            destination_iata=_clean_iata(data.get("destination_iata")),
+            destination_city_code=_clean_iata(data.get("destination_city_code")),
+            travel_date=travel_date or checkin_date,
+            checkin_date=checkin_date,
+            checkout_date=checkout_date,
+            adults=_clean_int(data.get("adults"), default=1, minimum=1),
+            duration_days=duration_days,
+            flex_days=_clean_int(data.get("flex_days")),
+        )
+
+    def merge(self, updates: dict) -> "TripParams":
+        """
+        A copy with the non-empty updates applied and validated like from_dict. Values that
+        were derived from a field the updates replace (the duration from the check-out date,
+        the check-out date from the duration) are derived again, and moving the dates keeps
+        the trip length: the check-out date moves with the check-in date.
+        """
+        data = self.to_dict()
+        updates = {key: value for key, value in (updates or {}).items() if key in data and _clean_text(value)}
+        if "checkout_date" in updates and "duration_days" not in updates:
+            data["duration_days"] = 0
+        if "duration_days" in updates and "checkout_date" not in updates:
+            data["checkout_date"] = ""
+        if "travel_date" in updates and "checkin_date" not in updates and self.checkin_date == self.travel_date:
+            data["checkin_date"] = ""
+        if (not data["checkin_date"] or "checkin_date" in updates) and "checkout_date" not in updates and data["duration_days"]:
+            # from_dict derives the check-out date again from the new check-in date and the duration
+            data["checkout_date"] = ""
+        data.update(updates)
+        return TripParams.from_dict(data)
+
+    def to_dict(self) -> dict:
+        """Plain-dict view of the parameters."""
+        return asdict(self)
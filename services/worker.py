@@ -0,0 +1,199 @@
+"""
+Long-lived planner worker.
+
+The Node server keeps a pool of these processes alive so the heavy imports
+(langchain, langgraph, the Amadeus client, ...) and the compiled graph are
+paid for once per worker instead of once per HTTP request.
+
+Protocol: one JSON object per line on stdin, one JSON object per line on
+stdout.
+
+    -> {"id": 1, "type": "plan", "text": "Plan a trip from Mumbai to Paris"}
+    <- {"id": 1, "ok": true, "result": "..."}
+
+    -> {"id": 2, "type": "ping"}
+    <- {"id": 2, "ok": true, "result": "pong"}
+
+    -> {"id": 3, "type": "stats"}
+    <- {"id": 3, "ok": true, "result": {"fast_path": {...}, "caches": {...}, "single_flight": {...},
+                                        "tokens": {...}, "hotel_prefetch": {...}, "node_memo": {...}}}
+
+    -> {"id": 4, "type": "metrics"}
+    <- {"id": 4, "ok": true, "result": "# HELP planner_node_duration_seconds ..."}
+
+A plan request with "stream": true also emits progress frames before its
+response: one per finished agent, then the final summary token by token.
+
+    -> {"id": 5, "type": "plan", "text": "...", "stream": true}
+    <- {"id": 5, "event": {"type": "step", "agent": "FlightAgent", "message": "...", "data": {...}, "records": {...}}}
+    <- {"id": 5, "event": {"type": "token", "text": "..."}}
+    <- {"id": 5, "ok": true, "result": "..."}
+
+A plan request with a "session" id is checkpointed. Its result then says
+whether details are missing; a resume request answers them and continues the
+run where it stopped (the answers are keyed like the agents' extracted_info).
+Resume requests may stream too.
+
+    -> {"id": 6, "type": "plan", "text": "Plan a trip to Paris", "session": "abc"}
+    <- {"id": 6, "ok": true, "result": {"session": "abc", "text": "...", "missing_info": ["departure (IATA code)", ...]}}
+    -> {"id": 7, "type": "resume", "session": "abc", "answers": {"departure": "Mumbai", "date": "2025-10-10"}}
+    <- {"id": 7, "ok": true, "result": {"session": "abc", "text": "...", "missing_info": [], "node_report": {...}}}
+
+A replan request changes trip details of a session (same keys as the answers)
+and plans again; agents whose inputs did not change are reused, which
+node_report shows ({"FlightAgent": "reused", "HotelAgent": "computed", ...}).
+
+    -> {"id": 8, "type": "replan", "session": "abc", "changes": {"checkout_date": "2025-10-13"}}
+    <- {"id": 8, "ok": true, "result": {"session": "abc", "text": "...", "missing_info": [], "node_report": {...}}}
+
+On startup the worker emits {"type": "ready", "pid": ...} once everything is
+imported and the graph and models are built. Closing stdin makes the worker exit cleanly.
+"""
+import json, os, sys, traceback
+
+# Protocol frames are written to the real stdout; anything the agents print
+# while planning is redirected to stderr so it cannot corrupt the stream.
+_protocol_out = sys.stdout
+sys.stdout = sys.stderr
+
+from main2 import can_replan, can_resume, final_text, run_workflow, session_values, stream_workflow
+from agent import RECORD_SLOTS, get_graph, get_llm, get_llm2, node_memo_stats, slot_text
+from query_parser import fast_path_stats
+from gazetteer import load as load_gazetteer
+from cache import cache_stats, single_flight_stats
+from token_budget import token_stats
+from tools import hotel_prefetch_stats
+from tracing import prometheus_text
+from records import to_rows
+
+
+def send(message: dict):
+    """Write a single protocol frame."""
+    _protocol_out.write(json.dumps(message, ensure_ascii=False) + "\n")
+    _protocol_out.flush()
+
+
+# Agent outputs forwarded with each step event (the activities are folded into the summary tokens)
+STEP_SLOTS = ["flight_data", "hotel_data", "weather_data", "restaurant_data"]
+
+
+def plan(text: str, session: str = None, answers: dict = None, replan: bool = False):
+    """Run (or resume or re-plan) the workflow once and return the text main2.py would have printed."""
+    return session_result(session, run_workflow(text, session, answers, replan))
+
+
+def session_result(session, final_step):
+    """The plain result text, or for a session the text plus what is still missing."""
+    text = final_text(final_step)
+    if not session:
+        return text
+    final_state = (list(final_step.values())[0] or {}) if final_step else {}
+    return {"session": session, "text": text, "missing_info": final_state.get("missing_info") or [],
+            "node_report": session_values(session).get("node_report") or {}}
+
+
+def step_event(node: str, update: dict) -> dict:
+    """JSON-safe progress event for one finished agent."""
+    update = update or {}
+    messages = update.get("messages") or []
+    return {
+        "type": "step",
+        "agent": node,
+        "message": messages[-1].content if messages and not update.get("final_data") else "",
+        "data": {slot: slot_text(update, slot) for slot in STEP_SLOTS if update.get(slot)},
+        # The offers themselves, as compact rows (see records.py), for clients that sort or filter them
+        "records": {slot: to_rows(update[slot]) for slot in RECORD_SLOTS if update.get(slot)},
+    }
+
+
+def plan_stream(request_id, text: str, session: str = None, answers: dict = None, replan: bool = False):
+    """Like plan(), but sends each step and summary token as an event frame while it runs."""
+    final_step = {}
+    try:
+        for kind, payload in stream_workflow(text, session, answers, replan):
+            if kind == "step":
+                final_step = payload
+                node, update = next(iter(payload.items()))
+                send({"id": request_id, "event": step_event(node, update)})
+            else:
+                send({"id": request_id, "event": {"type": "token", "text": payload}})
+    except Exception as e:
+        print(f"Error during workflow execution: {e}")
+        traceback.print_exc()
+        return session_result(session, {})
+    return session_result(session, final_step)
+
+
+def handle(request: dict) -> dict:
+    """Dispatch a single request and build its response frame."""
+    request_id = request.get("id")
+    request_type = request.get("type")
+
+    if request_type == "ping":
+        return {"id": request_id, "ok": True, "result": "pong"}
+
+    if request_type == "stats":
+        stats = {"fast_path": fast_path_stats(), "caches": cache_stats(), "single_flight": single_flight_stats(),
+                 "tokens": token_stats(), "hotel_prefetch": hotel_prefetch_stats(), "node_memo": node_memo_stats()}
+        return {"id": request_id, "ok": True, "result": stats}
+
+    if request_type == "metrics":
+        return {"id": request_id, "ok": True, "result": prometheus_text()}
+
+    if request_type in ("plan", "resume", "replan"):
+        text, session, answers = request.get("text"), request.get("session") or None, None
+        replan = request_type == "replan"
+        if request_type == "resume":
+            answers = request.get("answers")
+            if not isinstance(session, str) or not isinstance(answers, dict):
+                return {"id": request_id, "ok": False, "error": "Missing 'session' or 'answers'"}
+            if not can_resume(session):
+                return {"id": request_id, "ok": False, "error": f"Session {session} has nothing to resume"}
+        elif replan:
+            answers = request.get("changes")
+            if not isinstance(session, str) or not isinstance(answers, dict):
+                return {"id": request_id, "ok": False, "error": "Missing 'session' or 'changes'"}
+            if not can_replan(session):
+                return {"id": request_id, "ok": False, "error": f"Session {session} has no trip to re-plan"}
+        elif not isinstance(text, str) or not text.strip():
+            return {"id": request_id, "ok": False, "error": "Missing 'text'"}
+        if request.get("stream"):
+            return {"id": request_id, "ok": True, "result": plan_stream(request_id, text, session, answers, replan)}
+        return {"id": request_id, "ok": True, "result": plan(text, session, answers, replan)}
+
+    return {"id": request_id, "ok": False, "error": f"Unknown request type: {request_type}"}
+
+
+def preload():
+    """Builds the graph, models and gazetteer up front so the first request doesn't pay for them."""
+    get_graph()
+    load_gazetteer()
+    for factory in (get_llm, get_llm2):
+        try:
+            factory()
+        except Exception as e:
+            print(f"Model preload failed, retrying on first use: {e}", file=sys.stderr)
+
+
+def main():
+    preload()
+    send({"type": "ready", "pid": os.getpid()})
+
+    for line in sys.stdin:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            request = json.loads(line)
+        except json.JSONDecodeError as e:
+            send({"id": None, "ok": False, "error": f"Invalid JSON: {e}"})
+            continue
+
+        try:
+            send(handle(request))
+        except Exception as e:
+            send({"id": request.get("id"), "ok": False, "error": str(e)})
+
+
+if __name__ == "__main__":
+    main()
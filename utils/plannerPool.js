@@ -0,0 +1,398 @@
+import path from 'path';
+import readline from 'readline';
+import { fileURLToPath } from 'url';
+import { spawn } from 'child_process';
+import logger from './logger.js';
+
+const currentFilePath = fileURLToPath(import.meta.url);
+const currentDirectoryPath = path.dirname(currentFilePath);
+const servicesDirectoryPath = path.resolve(currentDirectoryPath, '..', 'services');
+
+const toInt = (value, fallback) => {
+    const parsed = parseInt(value, 10);
+    return Number.isNaN(parsed) ? fallback : parsed;
+};
+
+// Sums the Prometheus text of several workers: samples with the same name and labels
+// are added up (counters, histogram buckets, sums and counts are all additive)
+const mergeMetrics = (texts) => {
+    const families = new Map();
+    let family = null;
+    for (const text of texts) {
+        for (const line of text.split('\n')) {
+            if (!line.trim()) {
+                continue;
+            }
+            if (line.startsWith('#')) {
+                const name = line.split(' ')[2];
+                if (!families.has(name)) {
+                    families.set(name, { comments: [], samples: new Map() });
+                }
+                family = families.get(name);
+                if (!family.comments.includes(line)) {
+                    family.comments.push(line);
+                }
+                continue;
+            }
+            const split = line.lastIndexOf(' ');
+            const key = line.slice(0, split);
+            const value = Number(line.slice(split + 1));
+            if (family) {
+                family.samples.set(key, (family.samples.get(key) || 0) + value);
+            }
+        }
+    }
+    const lines = [];
+    for (const { comments, samples } of families.values()) {
+        lines.push(...comments);
+        for (const [key, value] of samples) {
+            lines.push(`${key} ${value}`);
+        }
+    }
+    return lines.join('\n') + '\n';
+};
+
+// Delay before replacing a crashed worker; doubles while workers keep failing
+const RESTART_DELAY_MS = 1000;
+const MAX_RESTART_DELAY_MS = 30000;
+
+class PlannerWorker {
+    constructor(pool) {
+        this.pool = pool;
+        this.ready = false;
+        this.busy = false;
+        this.retiring = false;
+        this.served = 0;
+        this.exited = false;
+        this.pending = new Map();
+        this.lastMetrics = '';
+
+        this.process = spawn(pool.pythonBin, [path.join(servicesDirectoryPath, 'worker.py')], {
+            cwd: servicesDirectoryPath,
+            stdio: ['pipe', 'pipe', 'pipe'],
+            // A session may be resumed on any worker, so several workers share their checkpoints on disk
+            env: {
+                ...process.env,
+                PLANNER_CHECKPOINTER: process.env.PLANNER_CHECKPOINTER || (pool.size > 1 ? 'sqlite' : 'memory')
+            }
+        });
+        this.pid = this.process.pid;
+
+        readline.createInterface({ input: this.process.stdout }).on('line', (line) => this.onLine(line));
+        this.process.stderr.on('data', (data) => {
+            logger.warn(`[planner-worker ${this.pid}] ${data.toString().trimEnd()}`);
+        });
+        this.process.on('exit', (code) => this.onExit(code));
+        // Writing to a worker that already died fails with EPIPE; unhandled, that would crash the server
+        this.process.stdin.on('error', (err) => this.onPipeError(err));
+        this.process.on('error', (err) => {
+            logger.error(`Planner worker failed to start: ${err.message}`);
+            // A process that never started (e.g. a bad PYTHON_BIN) emits no 'exit'
+            if (this.pid === undefined) {
+                this.onExit(null, err);
+            }
+        });
+    }
+
+    onLine(line) {
+        let message;
+        try {
+            message = JSON.parse(line);
+        } catch (err) {
+            logger.warn(`[planner-worker ${this.pid}] non-protocol output: ${line}`);
+            return;
+        }
+
+        if (message.type === 'ready') {
+            this.ready = true;
+            this.pool.restartDelayMs = RESTART_DELAY_MS;
+            logger.info(`Planner worker ${this.pid} is ready`);
+            this.pool.drain();
+            return;
+        }
+
+        const entry = this.pending.get(message.id);
+        if (!entry) {
+            return;
+        }
+        // Progress frames of a streaming request; the response frame follows later
+        if (message.event) {
+            if (entry.onEvent) {
+                entry.onEvent(message.event);
+            }
+            return;
+        }
+        this.pending.delete(message.id);
+        clearTimeout(entry.timer);
+
+        if (message.ok) {
+            entry.resolve(message.result);
+        } else {
+            entry.reject(new Error(message.error || 'Planner worker error'));
+        }
+    }
+
+    onPipeError(err) {
+        if (this.exited) {
+            return;
+        }
+        logger.error(`Planner worker ${this.pid} stopped reading requests: ${err.message}`);
+        this.ready = false;
+        for (const entry of this.pending.values()) {
+            clearTimeout(entry.timer);
+            entry.reject(new Error(`Planner worker ${this.pid} is not accepting requests: ${err.message}`));
+        }
+        this.pending.clear();
+        // The 'exit' that follows replaces the worker
+        this.process.kill('SIGKILL');
+    }
+
+    onExit(code, spawnError = null) {
+        if (this.exited) {
+            return;
+        }
+        this.exited = true;
+        this.ready = false;
+        for (const entry of this.pending.values()) {
+            clearTimeout(entry.timer);
+            entry.reject(new Error(`Planner worker exited with code ${code}`));
+        }
+        this.pending.clear();
+        this.pool.onWorkerExit(this, code, spawnError);
+    }
+
+    send(payload, timeoutMs, onEvent = null) {
+        const id = this.pool.nextId++;
+        return new Promise((resolve, reject) => {
+            const timer = setTimeout(() => {
+                this.pending.delete(id);
+                reject(new Error(`Planner worker ${this.pid} timed out after ${timeoutMs}ms`));
+                this.kill();
+            }, timeoutMs);
+            this.pending.set(id, { resolve, reject, timer, onEvent });
+            this.process.stdin.write(JSON.stringify({ ...payload, id }) + '\n');
+        });
+    }
+
+    // A worker plans one request at a time and cannot be interrupted, so cancelling
+    // its request kills it; the pool starts a replacement right away
+    cancel(reason) {
+        for (const entry of this.pending.values()) {
+            clearTimeout(entry.timer);
+            entry.reject(new Error(reason));
+        }
+        this.pending.clear();
+        this.kill();
+    }
+
+    retire() {
+        this.retiring = true;
+        this.ready = false;
+        this.process.stdin.end();
+    }
+
+    kill() {
+        this.retiring = true;
+        this.ready = false;
+        this.process.kill('SIGKILL');
+    }
+}
+
+class PlannerPool {
+    constructor({
+        size = toInt(process.env.PLANNER_POOL_SIZE, 2),
+        maxRequests = toInt(process.env.PLANNER_WORKER_MAX_REQUESTS, 50),
+        healthIntervalMs = toInt(process.env.PLANNER_HEALTH_INTERVAL_MS, 30000),
+        healthTimeoutMs = toInt(process.env.PLANNER_HEALTH_TIMEOUT_MS, 5000),
+        requestTimeoutMs = toInt(process.env.PLANNER_REQUEST_TIMEOUT_MS, 180000),
+        queueTimeoutMs = toInt(process.env.PLANNER_QUEUE_TIMEOUT_MS, 60000),
+        pythonBin = process.env.PYTHON_BIN || 'python3'
+    } = {}) {
+        this.size = Math.max(1, size);
+        this.maxRequests = maxRequests;
+        this.healthIntervalMs = healthIntervalMs;
+        this.healthTimeoutMs = healthTimeoutMs;
+        this.requestTimeoutMs = requestTimeoutMs;
+        this.queueTimeoutMs = queueTimeoutMs;
+        this.pythonBin = pythonBin;
+        this.restartDelayMs = RESTART_DELAY_MS;
+
+        this.workers = new Set();
+        this.queue = [];
+        this.nextId = 1;
+        this.started = false;
+        this.healthTimer = null;
+    }
+
+    start() {
+        if (this.started) {
+            return;
+        }
+        this.started = true;
+        logger.info(`Starting planner pool with ${this.size} worker(s)`);
+        for (let i = 0; i < this.size; i++) {
+            this.workers.add(new PlannerWorker(this));
+        }
+        if (this.healthIntervalMs > 0) {
+            this.healthTimer = setInterval(() => this.checkHealth(), this.healthIntervalMs);
+            this.healthTimer.unref();
+        }
+    }
+
+    // `signal` (an AbortSignal) cancels the request: a queued job is dropped, a running one
+    // stops its worker instead of keeping it busy for a caller that is gone
+    dispatch(payload, { onEvent = null, signal = null } = {}) {
+        this.start();
+        return new Promise((resolve, reject) => {
+            if (signal && signal.aborted) {
+                reject(new Error('Planner request was cancelled'));
+                return;
+            }
+            const job = { payload, onEvent, resolve, reject, timer: null, worker: null };
+            if (signal) {
+                signal.addEventListener('abort', () => this.cancel(job), { once: true });
+            }
+            // The request timeout only starts once a worker takes the job
+            if (this.queueTimeoutMs > 0) {
+                job.timer = setTimeout(() => {
+                    const index = this.queue.indexOf(job);
+                    if (index !== -1) {
+                        this.queue.splice(index, 1);
+                        reject(new Error(`No planner worker became available within ${this.queueTimeoutMs}ms`));
+                    }
+                }, this.queueTimeoutMs);
+            }
+            this.queue.push(job);
+            this.drain();
+        });
+    }
+
+    cancel(job) {
+        const index = this.queue.indexOf(job);
+        if (index !== -1) {
+            this.queue.splice(index, 1);
+            clearTimeout(job.timer);
+            job.reject(new Error('Planner request was cancelled'));
+        } else if (job.worker) {
+            logger.info(`Cancelling the request on planner worker ${job.worker.pid}`);
+            job.worker.cancel('Planner request was cancelled');
+        }
+    }
+
+    failQueue(err) {
+        for (const job of this.queue.splice(0)) {
+            clearTimeout(job.timer);
+            job.reject(err);
+        }
+    }
+
+    drain() {
+        for (const worker of this.workers) {
+            if (!this.queue.length) {
+                return;
+            }
+            if (!worker.ready || worker.busy || worker.retiring) {
+                continue;
+            }
+            const job = this.queue.shift();
+            clearTimeout(job.timer);
+            this.run(worker, job);
+        }
+    }
+
+    async run(worker, job) {
+        worker.busy = true;
+        job.worker = worker;
+        try {
+            job.resolve(await worker.send(job.payload, this.requestTimeoutMs, job.onEvent));
+        } catch (err) {
+            job.reject(err);
+        } finally {
+            job.worker = null;
+            worker.busy = false;
+            worker.served += 1;
+            if (this.maxRequests > 0 && worker.served >= this.maxRequests && !worker.retiring) {
+                logger.info(`Recycling planner worker ${worker.pid} after ${worker.served} requests`);
+                worker.retire();
+            }
+            this.drain();
+        }
+    }
+
+    async checkHealth() {
+        for (const worker of this.workers) {
+            if (!worker.ready || worker.busy || worker.retiring) {
+                continue;
+            }
+            worker.busy = true;
+            try {
+                await worker.send({ type: 'ping' }, this.healthTimeoutMs);
+            } catch (err) {
+                logger.warn(`Planner worker ${worker.pid} failed health check: ${err.message}`);
+                worker.kill();
+            } finally {
+                worker.busy = false;
+                this.drain();
+            }
+        }
+    }
+
+    // Idle workers are asked for fresh metrics; busy ones contribute their last answer
+    async collectMetrics() {
+        this.start();
+        await Promise.all([...this.workers].map(async (worker) => {
+            if (!worker.ready || worker.busy || worker.retiring) {
+                return;
+            }
+            worker.busy = true;
+            try {
+                worker.lastMetrics = await worker.send({ type: 'metrics' }, this.healthTimeoutMs);
+            } catch (err) {
+                logger.warn(`Planner worker ${worker.pid} did not return metrics: ${err.message}`);
+            } finally {
+                worker.busy = false;
+                this.drain();
+            }
+        }));
+        return mergeMetrics([...this.workers].map((worker) => worker.lastMetrics).filter(Boolean));
+    }
+
+    onWorkerExit(worker, code, spawnError = null) {
+        this.workers.delete(worker);
+        if (!this.started) {
+            return;
+        }
+        if (worker.retiring) {
+            this.workers.add(new PlannerWorker(this));
+            return;
+        }
+        if (spawnError) {
+            // No worker can start either, so queued requests fail now instead of waiting
+            if (![...this.workers].some((other) => other.ready)) {
+                this.failQueue(new Error(`Planner worker failed to start: ${spawnError.message}`));
+            }
+        } else {
+            logger.error(`Planner worker ${worker.pid} exited unexpectedly with code ${code}`);
+        }
+        // Back off so a worker that crashes on import (or cannot be spawned) does not spin
+        const delay = this.restartDelayMs;
+        this.restartDelayMs = Math.min(delay * 2, MAX_RESTART_DELAY_MS);
+        setTimeout(() => {
+            if (this.started) {
+                this.workers.add(new PlannerWorker(this));
+            }
+        }, delay).unref();
+    }
+
+    stop() {
+        this.started = false;
+        clearInterval(this.healthTimer);
+        for (const worker of this.workers) {
+            worker.retire();
+        }
+    }
+}
+
+const plannerPool = new PlannerPool();
+
+export default plannerPool;